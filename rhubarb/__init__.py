@@ -24,7 +24,9 @@ from .object_set import (
     UNSET,
     SqlBuilder,
     SqlType,
-    BUILTINS
+    BUILTINS,
+    batch,
 )
+from .pagination import Connection, Edge, PageInfo
 from .schema import Schema
 from strawberry import type, mutation
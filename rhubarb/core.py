@@ -2,8 +2,8 @@ import dataclasses
 import datetime
 import decimal
 import inspect
+import itertools
 import re
-import time
 import uuid
 from functools import total_ordering
 from typing import TypeVar, Protocol, ClassVar, Union, NewType
@@ -216,8 +216,11 @@ SmallInt = scalar(
 )
 
 
+_ref_ids = itertools.count(1)
+
+
 def new_ref_id() -> str:
-    return str(time.monotonic_ns())[-5:]
+    return str(next(_ref_ids))
 
 
 def get_conn(info: Info) -> AsyncConnection:
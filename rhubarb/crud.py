@@ -1,8 +1,6 @@
-import copy
 from typing import Type, Callable, Optional
 
-import psycopg.errors
-from psycopg import AsyncConnection, Rollback
+from psycopg import AsyncConnection
 from strawberry.types import Info
 
 from rhubarb.core import (
@@ -14,7 +12,7 @@ from rhubarb.core import (
 )
 from rhubarb.object_set import (
     InsertSet,
-    columns,
+    columns as model_columns,
     ModelSelector,
     Selector,
     ObjectSet,
@@ -25,8 +23,14 @@ from rhubarb.object_set import (
     DeleteSet,
     ModelUpdater,
     pk_selection,
-    default_function_to_python
+    default_function_to_python,
+    INSERT_METHODS,
+    pk_columns,
+    func,
+    Unnest,
+    PkIn,
 )
+from rhubarb.errors import RhubarbException
 
 
 def query(
@@ -87,6 +91,36 @@ def delete(
     )
 
 
+def delete_by_pks(
+    conn: AsyncConnection,
+    model: Type[T],
+    pks: list[SQLValue | tuple[SQLValue, ...]],
+    info: Info | None = None,
+    one: bool = False,
+    returning: Callable[[ModelSelector], Selector[bool] | bool] | None | bool = None,
+):
+    """Delete the rows with the given primary keys, bound as array parameters (see `PkIn`)."""
+    object_set = ObjectSet(model, conn=conn, info=info)
+    model_reference = object_set.model_reference
+    model_selector = object_set.model_selector
+    where_selector = PkIn(object_set.pk_selector, pks)
+    if hasattr(model, "__where__"):
+        where_selector &= call_with_maybe_info(model.__where__, model_selector, info)
+    returning_selector = None
+    if returning is not None:
+        if isinstance(returning, bool) and returning:
+            returning_selector = model_selector
+        else:
+            returning_selector = returning(model_selector)
+    return DeleteSet(
+        model_reference,
+        conn=conn,
+        where=where_selector,
+        returning=returning_selector,
+        one=one,
+    )
+
+
 def build_where_and_returning(model, model_selector, info, where, returning):
     where_selector = where(model_selector)
     if hasattr(model, "__where__"):
@@ -101,9 +135,17 @@ def build_where_and_returning(model, model_selector, info, where, returning):
 
 
 def build_update_set(
-    info, conn, model, model_reference, setters, where_selector, returning_selector, one
+    info,
+    conn,
+    model,
+    model_reference,
+    setters,
+    where_selector,
+    returning_selector,
+    one,
+    source=None,
 ):
-    for default_update in columns(model, update_default=True):
+    for default_update in model_columns(model, update_default=True):
         if default_update.column_name not in setters:
             setters[default_update.column_name] = default_function_to_python(
                 default_update.update_default
@@ -116,6 +158,7 @@ def build_update_set(
         where=where_selector,
         one=one,
         returning=returning_selector,
+        source=source,
     )
 
 
@@ -150,18 +193,103 @@ def update(
     )
 
 
+def update_objs(
+    conn: AsyncConnection,
+    model: Type[T],
+    objs: list[T],
+    columns: list[str] | None = None,
+    info: Info | None = None,
+    one=False,
+    returning: Callable[[ModelSelector], Selector[bool] | bool] | None | bool = None,
+):
+    """
+    Update many objects with a single `UPDATE ... FROM UNNEST(...)` matched on their primary keys.
+    Without `columns`, every column that is set on all the objects is updated.
+    """
+    object_set = ObjectSet(model, conn=conn, info=info)
+    model_reference = object_set.model_reference
+    model_selector = object_set.model_selector
+    pks = pk_columns(model)
+    if not isinstance(pks, tuple):
+        pks = (pks,)
+    if columns is None:
+        update_columns = [
+            col
+            for col in model_columns(model, virtual=False)
+            if col not in pks
+            and not any(isinstance(getattr(obj, col.name), Unset) for obj in objs)
+        ]
+    else:
+        concrete = {col.name: col for col in model_columns(model, virtual=False)}
+        fields = {field.name for field in model_columns(model)}
+        update_columns = []
+        for name in columns:
+            if name not in fields:
+                raise RhubarbException(f"{model.__name__} has no column {name}.")
+            col = concrete.get(name)
+            if col is None:
+                raise RhubarbException(f"Cannot update virtual column {name}.")
+            if col in pks:
+                raise RhubarbException(
+                    f"Cannot update {name}, objects are matched on their primary key."
+                )
+            update_columns.append(col)
+        for col in update_columns:
+            if any(isinstance(getattr(obj, col.name), Unset) for obj in objs):
+                raise RhubarbException(
+                    f"Cannot update {col.name}, it is not set on every object."
+                )
+    if not update_columns:
+        raise RhubarbException(f"No columns to update on {model.__name__}.")
+    source_columns = list(pks) + update_columns
+    source = Unnest(
+        f"{model_reference.alias()}_v",
+        source_columns,
+        [tuple(getattr(obj, col.name) for col in source_columns) for obj in objs],
+    )
+    setters = {col.column_name: source.column(col) for col in update_columns}
+    where_selector = func(
+        "", *[getattr(model_selector, pk.name) for pk in pks]
+    ) == func("", *[source.column(pk) for pk in pks])
+    if hasattr(model, "__where__"):
+        where_selector &= call_with_maybe_info(model.__where__, model_selector, info)
+    returning_selector = None
+    if returning is not None:
+        if isinstance(returning, bool) and returning:
+            returning_selector = model_selector
+        else:
+            returning_selector = returning(model_selector)
+    return build_update_set(
+        info,
+        conn,
+        model,
+        model_reference,
+        setters,
+        where_selector,
+        returning_selector,
+        one,
+        source=source,
+    )
+
+
 async def find_or_create(
     conn: AsyncConnection, obj: T, info: Info = None, **kwargs
 ) -> T:
+    """
+    Find the object matching `kwargs` or insert `obj`, in one statement. The insert is skipped when a row
+    matches and conflicts are ignored, so only a row inserted concurrently by another transaction is looked
+    up a second time.
+    """
     model = obj.__class__
-    if obj := await by_kw(model, info=info, **kwargs).one():
-        return obj
-    async with conn.transaction() as txn:
-        try:
-            return await save(obj, conn, info=info).execute()
-        except psycopg.errors.UniqueViolation:
-            raise Rollback(txn)
-    return await by_kw(model, info=info, **kwargs).one()
+    found = by_kw(conn, model, info=info, **kwargs)
+    insert = (
+        insert_objs(conn, model, [obj], skip_pks=empty_pk(obj), one=True)
+        .on_conflict(do_nothing=True)
+        .unless_exists(found)
+    )
+    if result := await found.from_mutation(insert, with_table=True).one():
+        return result
+    return await by_kw(conn, model, info=info, **kwargs).one()
 
 
 def empty_pk(obj: T):
@@ -188,7 +316,7 @@ def save(conn: AsyncConnection, obj: T, info: Info | None = None, insert_with_pk
         col_name: v
         for col_name, v in (
             (col.column_name, getattr(obj, col.name))
-            for col in columns(model)
+            for col in model_columns(model)
             if not col.virtual
         )
         if not isinstance(v, Unset)
@@ -246,6 +374,8 @@ def build_insert_set(
     values,
     returning,
     one,
+    method: INSERT_METHODS = "insert",
+    chunk_size: int | None = None,
 ):
     returning_selector = None
     if returning is not None:
@@ -253,13 +383,11 @@ def build_insert_set(
             returning_selector = model_selector
         else:
             returning_selector = returning(model_selector)
-    for default_insert in columns(model, insert_default=True):
-        if default_insert not in insert_columns:
-            insert_columns.append(default_insert)
-            val = default_function_to_python(default_insert.insert_default)()
-            new_values = copy.copy(values)
-            for xx, value in enumerate(new_values):
-                values[xx] = val + (val,)
+    defaults = {
+        default_insert: default_function_to_python(default_insert.insert_default)()
+        for default_insert in model_columns(model, insert_default=True)
+        if default_insert not in insert_columns
+    }
     return InsertSet(
         model_reference,
         conn=conn,
@@ -267,6 +395,9 @@ def build_insert_set(
         values=values,
         one=one,
         returning=returning_selector,
+        method=method,
+        defaults=defaults,
+        chunk_size=chunk_size,
     )
 
 
@@ -279,6 +410,8 @@ def insert_objs(
     info: Info | None = None,
     one=False,
     returning: Callable[[ModelSelector], Selector[bool] | bool] | None | bool = None,
+    method: INSERT_METHODS = "insert",
+    chunk_size: int | None = None,
 ):
     object_set = ObjectSet(model, conn=conn, info=info)
     model_reference = object_set.model_reference
@@ -287,7 +420,7 @@ def insert_objs(
     if skip_pks:
         exclude |= pk_column_names(model)
     insert_columns = [
-        col for col in columns(model, virtual=False) if col.name not in exclude
+        col for col in model_columns(model, virtual=False) if col.name not in exclude
     ]
     insert_values = []
     for row in values:
@@ -303,4 +436,38 @@ def insert_objs(
         insert_values,
         returning,
         one,
+        method,
+        chunk_size,
     )
+
+
+def upsert_objs(
+    conn: AsyncConnection,
+    model: Type[T],
+    values: list[T],
+    target: str
+    | Callable[[ModelSelector], Selector | tuple[Selector, ...]]
+    | None = None,
+    update_columns: list[str] | bool = True,
+    skip_pks=False,
+    info: Info | None = None,
+    one=False,
+    returning: Callable[[ModelSelector], Selector[bool] | bool] | None | bool = None,
+    method: INSERT_METHODS = "insert",
+    chunk_size: int | None = None,
+):
+    """
+    Insert the objects, updating the rows that conflict on `target` (see `InsertSet.on_conflict`).
+    With `update_columns=False` conflicting rows are left untouched.
+    """
+    return insert_objs(
+        conn,
+        model,
+        values,
+        skip_pks=skip_pks,
+        info=info,
+        one=one,
+        returning=returning,
+        method=method,
+        chunk_size=chunk_size,
+    ).on_conflict(target, do_update=update_columns, do_nothing=not update_columns)
@@ -1,12 +1,19 @@
+import asyncio
 import inspect
+from typing import Literal
 
 from graphql import GraphQLResolveInfo
 from psycopg import Rollback
+from psycopg.pq import TransactionStatus
 from strawberry.extensions import SchemaExtension
 from strawberry.field import StrawberryField
 from strawberry.types import Info
 from strawberry.types.graphql import OperationType
 
+from rhubarb.env import bool_env, int_env, str_env
+from rhubarb.operation_compiler import compile_operation
+from rhubarb.pagination import Connection
+from rhubarb.query_planner import plan_operation
 from rhubarb.pkg.postgres.connection import connection, override_conn
 from rhubarb.object_set import (
     pk_concrete,
@@ -17,26 +24,145 @@ from rhubarb.object_set import (
     UpdateSet,
     InsertSet,
     MutationSet,
+    UNSET,
+    load_pipelined,
 )
 
 
+COMPILE_OPERATIONS = bool_env("COMPILE_OPERATIONS", False)
+ROOT_FIELD_MODES = Literal["pipeline", "pool"]
+PARALLEL_ROOT_FIELDS: ROOT_FIELD_MODES | None = str_env("PARALLEL_ROOT_FIELDS", None)
+ROOT_FIELDS_FAN_OUT = int_env("ROOT_FIELDS_FAN_OUT", 4)
+
+
+class RootFieldLoader:
+    """
+    Loads the ObjectSets returned by sibling root fields of a query together. `pipeline` sends their
+    statements in one round trip on the operation's connection, `pool` runs them concurrently on up to
+    `fan_out` connections from the pool. Inside a transaction `pool` pipelines instead, since pooled
+    connections run in their own snapshots and wouldn't see its uncommitted writes.
+    """
+
+    def __init__(self, conn, mode: ROOT_FIELD_MODES, fan_out: int):
+        self.conn = conn
+        if mode == "pool" and conn.info.transaction_status != TransactionStatus.IDLE:
+            mode = "pipeline"
+        self.mode = mode
+        self.semaphore = asyncio.Semaphore(fan_out)
+        self.pending: list[tuple[ObjectSet, asyncio.Future]] = []
+        self.flush_task: asyncio.Task | None = None
+
+    async def load(self, object_set: ObjectSet):
+        if self.mode == "pool":
+            async with self.semaphore:
+                async with connection() as conn:
+                    shared_conn, object_set.conn = object_set.conn, conn
+                    try:
+                        await object_set.load_cache()
+                    finally:
+                        object_set.conn = shared_conn
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((object_set, future))
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush())
+        await future
+
+    async def flush(self):
+        # Root fields start resolving in the same loop iteration, give the siblings one to register.
+        await asyncio.sleep(0)
+        pending, self.pending, self.flush_task = self.pending, [], None
+        try:
+            await load_pipelined(self.conn, [object_set for object_set, _ in pending])
+        except Exception as e:
+            for _object_set, future in pending:
+                future.set_exception(e)
+        else:
+            for _object_set, future in pending:
+                future.set_result(None)
+
+
 class RhubarbExtension(SchemaExtension):
+    # Run queries as one statement that builds the JSON response when all of their fields can be compiled.
+    compile_operations: bool = COMPILE_OPERATIONS
+    # Load the ObjectSets of a query's root fields together instead of one after another.
+    parallel_root_fields: ROOT_FIELD_MODES | None = PARALLEL_ROOT_FIELDS
+    root_fields_fan_out: int = ROOT_FIELDS_FAN_OUT
+
     async def on_execute(self):
         self.execution_context.context["object_sets"] = {}
+        self.plan = {}
+        self.root_field_loader = None
+        self.resolved_roots = {}
         if "conn" not in self.execution_context.context:
             async with connection() as conn:
                 self.execution_context.context["conn"] = conn
+                await self.prepare_operation()
                 yield
         else:
+            await self.prepare_operation()
             yield
 
-    async def resolve(self, _next, root, info: GraphQLResolveInfo, *args, **kwargs):
-        prev_key = (
-            "|".join(v for v in info.path.prev.as_list() if isinstance(v, str))
-            if info.path.prev
-            else "|"
-        )
-        cur_key = "|".join(v for v in info.path.as_list() if isinstance(v, str))
+    async def prepare_operation(self):
+        operation_type = self.execution_context.operation_type
+        if (
+            self.compile_operations
+            and operation_type == OperationType.QUERY
+            and not self.other_resolve_hooks()
+        ):
+            self.execution_context.result = await compile_operation(
+                self.execution_context,
+                self.execution_context.context["conn"],
+                self.resolved_roots,
+            )
+        if not self.execution_context.result and operation_type in (
+            OperationType.QUERY,
+            OperationType.MUTATION,
+        ):
+            self.plan = plan_operation(self.execution_context) or {}
+        if self.parallel_root_fields and operation_type == OperationType.QUERY:
+            self.root_field_loader = RootFieldLoader(
+                self.execution_context.context["conn"],
+                self.parallel_root_fields,
+                self.root_fields_fan_out,
+            )
+
+    def other_resolve_hooks(self) -> bool:
+        # A compiled operation only resolves its root fields, and not through the resolve hooks.
+        for extension in self.execution_context.schema.get_extensions():
+            extension_type = (
+                extension if isinstance(extension, type) else type(extension)
+            )
+            if (
+                not issubclass(extension_type, RhubarbExtension)
+                and extension_type.resolve is not SchemaExtension.resolve
+            ):
+                return True
+        return False
+
+    def resolve(self, _next, root, info: GraphQLResolveInfo, *args, **kwargs):
+        plan = self.plan.get(id(info.field_nodes[0]))
+        if plan is not None and plan.python_name is not None:
+            # Hydrated together with its parent, unless the parent's selection didn't include it. Returned
+            # as is, so graphql-core completes the field without scheduling a coroutine for it.
+            value = getattr(root, plan.python_name, UNSET)
+            if value is not UNSET:
+                return value
+        return self.resolve_object_set(plan, _next, root, info, *args, **kwargs)
+
+    async def resolve_object_set(
+        self, plan, _next, root, info: GraphQLResolveInfo, *args, **kwargs
+    ):
+        if plan is not None and plan.cur_key is not None:
+            prev_key, cur_key = plan.prev_key, plan.cur_key
+        else:
+            prev_key = (
+                "|".join(v for v in info.path.prev.as_list() if isinstance(v, str))
+                if info.path.prev
+                else "|"
+            )
+            cur_key = "|".join(v for v in info.path.as_list() if isinstance(v, str))
         object_sets = self.execution_context.context["object_sets"]
 
         if prefetched := object_sets.get(cur_key, None):
@@ -80,11 +206,28 @@ class RhubarbExtension(SchemaExtension):
                 return await object_sets[cur_key].for_pk(pk_concrete(root))
             return result
         else:
-            result = _next(root, info, *args, **kwargs)
-            if inspect.isawaitable(result):
-                result = await result
+            if info.path.prev is None and info.path.key in self.resolved_roots:
+                # Already resolved while trying to compile the operation.
+                result = self.resolved_roots.pop(info.path.key)
+                if isinstance(result, Exception):
+                    raise result
+            else:
+                result = _next(root, info, *args, **kwargs)
+                if inspect.isawaitable(result):
+                    result = await result
             if isinstance(result, MutationSet):
                 result = await result.as_object_set(real_info)
+            if isinstance(result, Connection):
+                node_paths, node_selections = result.node_selections(
+                    selected_mapped[real_info.field_name].selections
+                )
+                result.page = result.page_set().select(
+                    lambda x: optimize_selection(node_selections, x)
+                )
+                # Fields of the nodes resolve against the page like fields of a list of models.
+                for node_path in node_paths:
+                    object_sets[f"{cur_key}|{node_path}"] = result.page
+                return result
             if isinstance(result, ObjectSet):
                 result = result.select(
                     lambda x: optimize_selection(
@@ -92,6 +235,8 @@ class RhubarbExtension(SchemaExtension):
                     )
                 )
                 object_sets[cur_key] = result
+                if self.root_field_loader is not None and info.path.prev is None:
+                    await self.root_field_loader.load(result)
                 return await result.resolve()
 
             return result
@@ -11,6 +11,8 @@ from rhubarb.object_set import (
     Value,
     RawSQL,
     UseSelector,
+    RelatedAggregate,
+    FieldSelector,
     func,
 )
 
@@ -54,6 +56,32 @@ def json_agg(model_selector: ModelSelector, column: Selector):
     return Aggregate(model_selector, args=[column], op="JSON_AGG", infixed=False)
 
 
+def count_related(relation: FieldSelector) -> RelatedAggregate[int]:
+    return RelatedAggregate(relation, "COUNT")
+
+
+def exists_related(relation: FieldSelector) -> RelatedAggregate[bool]:
+    return RelatedAggregate(relation, "EXISTS")
+
+
+def sum_related(
+    relation: FieldSelector, column: Callable[[ModelSelector], Selector]
+) -> RelatedAggregate:
+    return RelatedAggregate(relation, "SUM", column)
+
+
+def max_related(
+    relation: FieldSelector, column: Callable[[ModelSelector], Selector]
+) -> RelatedAggregate:
+    return RelatedAggregate(relation, "MAX", column)
+
+
+def min_related(
+    relation: FieldSelector, column: Callable[[ModelSelector], Selector]
+) -> RelatedAggregate:
+    return RelatedAggregate(relation, "MIN", column)
+
+
 def concat(*args: Selector[str] | str):
     return Computed(args=list(args), op="CONCAT", infixed=False)
 
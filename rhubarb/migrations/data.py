@@ -17,7 +17,8 @@ from rhubarb.object_set import (
     ObjectSet,
     References,
     ON_DELETE,
-    DEFAULT_SQL_FUNCTION
+    DEFAULT_SQL_FUNCTION,
+    write_single_or_tuple,
 )
 from rhubarb.object_set import table as table_decorator
 import dataclasses
@@ -479,7 +480,7 @@ class MigrationConstraint:
     @classmethod
     def from_constraint(cls, cst: Constraint):
         builder = SqlBuilder(dml_mode=True)
-        cst.check.__sql__(builder)
+        write_single_or_tuple(cst.check, builder)
         if builder.vars:
             raise RhubarbException(
                 f"Cannot use variables when defining Constraint {builder.q} {builder.vars}"
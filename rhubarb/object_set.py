@@ -1,16 +1,22 @@
 from __future__ import annotations
 
 import asyncio
+import base64
+import contextlib
 import copy
 import dataclasses
 import datetime
+import decimal
 import enum
 import functools
 import inspect
 import json
 import operator
+import re
+import time
 import uuid
 from collections import defaultdict
+from contextvars import ContextVar
 from typing import (
     TypeVar,
     Generic,
@@ -26,12 +32,15 @@ from typing import (
     Mapping,
     Union,
     Awaitable,
+    Hashable,
+    Iterable,
+    AsyncIterator,
 )
 
 import phonenumbers
 import strawberry
-from psycopg import AsyncConnection
-from psycopg.rows import dict_row
+from psycopg import AsyncConnection, AsyncCursor, Pipeline
+from psycopg.rows import dict_row, tuple_row
 from psycopg.types.json import Jsonb
 from strawberry.annotation import StrawberryAnnotation
 from strawberry.custom_scalar import ScalarWrapper
@@ -53,7 +62,9 @@ from rhubarb.core import (
     Binary,
     Serial, SmallIntType, SmallInt,
 )
+from rhubarb.env import int_env, bool_env
 from rhubarb.errors import RhubarbException
+from rhubarb.plan_cache import plan_cache, CompiledPlan
 from strawberry.field import StrawberryField
 from strawberry.types.types import TypeDefinition
 from strawberry.scalars import JSON, Base64, Base16, Base32
@@ -171,14 +182,19 @@ TYPE_BYTEA = SqlType(raw_sql="BYTEA")
 
 
 class SqlBuilder:
-    def __init__(self, dml_mode=False):
+    def __init__(self, dml_mode=False, json_rows=False):
         self.q = ""
         self.vars = []
         self.column_mappings: dict[str, str] = {}
+        self.columns: dict[str, int] = {}
         self.alias_count = 0
         self.wrote_alias = False
         self.writing_subquery = False
         self.dml_mode = dml_mode
+        self.json_rows = json_rows
+        self.wrote_python_value = False
+        # The tables written in the statement, shared with forks.
+        self.read_tables: set[str] = set()
 
     def write(self, s: str):
         self.q += s
@@ -187,6 +203,25 @@ class SqlBuilder:
         self.alias_count += 1
         return self.alias_count
 
+    def fork(self) -> SqlBuilder:
+        """A builder for SQL that is appended to this one later, sharing its aliases."""
+        forked = copy.copy(self)
+        forked.q = ""
+        forked.vars = []
+        return forked
+
+    def append(self, other: SqlBuilder):
+        self.write(other.q)
+        self.vars.extend(other.vars)
+        self.alias_count = max(self.alias_count, other.alias_count)
+        self.read_tables |= other.read_tables
+
+    def write_subquery(self, other: SqlBuilder):
+        """Write the SQL of a builder with aliases of its own."""
+        self.write(other.q)
+        self.vars.extend(other.vars)
+        self.read_tables |= other.read_tables
+
     def write_column(self, reference_alias: str, column_name: str):
         if self.dml_mode:
             self.write(f"{column_name}")
@@ -217,9 +252,15 @@ class SqlBuilder:
             alias = alias_base
         else:
             alias = f"{alias_base}_{self.next_alias()}".lower()
+            self.columns[alias] = len(self.columns)
         self.write(f" AS {alias}")
         return alias
 
+    def column_position(self, alias: str) -> int | None:
+        if self.writing_subquery:
+            return None
+        return self.columns.get(alias)
+
     def write_value(self, v: Any, sql_type=None):
         if hasattr(v, "__sql__"):
             v.__sql__(self)
@@ -228,13 +269,13 @@ class SqlBuilder:
                 self.write("NULL")
             elif isinstance(v, list):
                 self.write(f"'{v}'::{sql_type.sql}")
-            elif isinstance(v, int):
-                self.write(str(v))
-            elif isinstance(v, bool):
+            elif isinstance(v, bool) and self.dml_mode:
                 if v:
                     self.write("TRUE")
                 else:
                     self.write("FALSE")
+            elif isinstance(v, int) and self.dml_mode:
+                self.write(str(v))
             else:
                 sql_type = sql_type or SqlType.from_python(type(v))
                 if self.dml_mode:
@@ -281,6 +322,7 @@ def write_single_or_tuple(
 
 
 JOIN_TYPES = Literal["LEFT", "INNER"]
+RELATION_STRATEGIES = Literal["join", "lateral", "selectin"]
 
 
 @dataclasses.dataclass
@@ -290,6 +332,11 @@ class Join(Generic[T, J]):
     on: Selector[bool]
     object_set: ObjectSet[T, ModelSelector[T]] | None
     join_type: JOIN_TYPES
+    # Whether the join can match several rows for each parent row.
+    many: bool = False
+    # `object_set` filtered by the `on` clause, joined with `LATERAL (...) ON TRUE` so it only reads the rows
+    # of each parent.
+    pushed_down: ObjectSet[T, ModelSelector[T]] | None = None
 
     def __hash__(self):
         return self.id.__hash__()
@@ -298,11 +345,61 @@ class Join(Generic[T, J]):
         if self.object_set is None:
             self.model_reference.__sql__(builder)
         else:
-            builder.writing_subquery = True
-            builder.write("(")
-            self.object_set.__sql__(builder, join_fields)
-            builder.write(")")
-            builder.writing_subquery = False
+            self.write_subquery(builder, self.object_set, join_fields)
+
+    def write_subquery(
+        self, builder: SqlBuilder, object_set: ObjectSet, join_fields: set[str] = None
+    ):
+        column_mappings = builder.column_mappings
+        writing_subquery = builder.writing_subquery
+        builder.column_mappings = {}
+        builder.writing_subquery = True
+        builder.write("(")
+        object_set.__sql__(builder, join_fields)
+        builder.write(")")
+        builder.writing_subquery = writing_subquery
+        builder.column_mappings = column_mappings
+
+    def write_join(self, builder: SqlBuilder, join_fields: set[str] = None):
+        builder.write(f" {self.join_type} JOIN ")
+        if self.pushed_down is None:
+            self.__sql__(builder, join_fields)
+        else:
+            builder.write("LATERAL ")
+            self.write_subquery(builder, self.pushed_down, join_fields)
+        builder.write(" AS ")
+        builder.write(self.model_reference.alias())
+        builder.write(" ON ")
+        if self.pushed_down is None:
+            self.on.__sql__(builder)
+        else:
+            builder.write("TRUE")
+
+
+@dataclasses.dataclass
+class LateralJoin(Join[T, J]):
+    """
+    Aggregates the rows of `object_set` into one JSON array per parent row with
+    `LEFT JOIN LATERAL (SELECT json_agg(...) ...)`, `on` correlates `object_set` with the parent.
+    """
+
+    selector: LateralListSelector | None = None
+    parent_joins: list[tuple[str, Join, str]] = dataclasses.field(default_factory=list)
+    compiled: tuple[SqlBuilder, Extractor] | None = None
+
+    def compile(self) -> tuple[SqlBuilder, Extractor]:
+        if self.compiled is None:
+            sub_builder = SqlBuilder(json_rows=True)
+            object_set = self.object_set.select(lambda _: self.selector.inner_selector)
+            _pk_extractor, extractor = object_set.build_select_statement(sub_builder)
+            self.compiled = sub_builder, extractor
+        return self.compiled
+
+    def __sql__(self, builder: SqlBuilder, join_fields: set[str] = None):
+        sub_builder, _extractor = self.compile()
+        builder.write("LATERAL (SELECT COALESCE(json_agg(sub), '[]') AS rows FROM (")
+        builder.write_subquery(sub_builder)
+        builder.write(") AS sub)")
 
 
 @dataclasses.dataclass
@@ -328,23 +425,96 @@ class ModelReference(Generic[T]):
     def alias(self) -> str:
         return f"{self.id}"
 
+    def detached(self) -> ModelReference[T]:
+        return ModelReference(id=self.id, model=self.model, object_set=None)
+
     def __sql__(self, builder: SqlBuilder):
         schema_name = self.model.__schema__
         table_name = self.model.__table__
 
-        builder.write(f'"{schema_name}"."{table_name}"')
+        table = f'"{schema_name}"."{table_name}"'
+        builder.read_tables.add(table)
+        builder.write(table)
+
+
+Hydrator = tuple[Callable[[Any], V | Awaitable[V]], bool]
+
+
+class AwaitableResult(Exception):
+    """Raised by a sync hydrator whose `use` function returned an awaitable, see `Extractor.root_hydrator`."""
 
 
 class Extractor(Generic[V]):
     def __init__(self, model_reference: ModelReference, field: StrawberryField[V]):
         self.model_reference = model_reference
         self.field = field
+        self._hydrators: dict[bool, Hydrator] = {}
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.model_reference}, {self.field and self.field.name})"
 
     async def extract(self, row) -> V:
-        raise NotImplementedError
+        fn, is_async = self.root_hydrator()
+        value = fn(row)
+        if is_async or inspect.isawaitable(value):
+            return await value
+        return value
+
+    def compile(self, positional: bool) -> Hydrator:
+        """
+        Build a function that turns a row into a value, and whether that function returns an awaitable.
+        Positional hydrators read tuple rows by column position instead of dict rows by alias.
+        Extractors that only override `extract` are called through it.
+        """
+        if type(self).extract is Extractor.extract:
+            raise NotImplementedError
+        return self.extract, True
+
+    def hydrator(self, positional: bool = False) -> Hydrator:
+        if (hydrator := self._hydrators.get(positional)) is None:
+            hydrator = self._hydrators[positional] = self.compile(positional)
+        return hydrator
+
+    def root_hydrator(self, positional: bool = False) -> Hydrator:
+        """
+        The hydrator of a whole extractor tree. A sync `use` function can still return an awaitable, like a
+        lambda calling an async function. Then the tree is compiled again with that function async, and the
+        sync hydrator returns awaitables from then on, so callers also await values that are awaitable.
+        """
+        fn, is_async = self.hydrator(positional)
+
+        def recompile():
+            nonlocal fn, is_async
+            reset_hydrators(self)
+            fn, is_async = self.hydrator(positional)
+
+        async def extract_async(row):
+            while True:
+                try:
+                    value = fn(row)
+                    return (await value) if is_async else value
+                except AwaitableResult:
+                    recompile()
+
+        def extract(row):
+            if is_async:
+                return extract_async(row)
+            try:
+                return fn(row)
+            except AwaitableResult:
+                recompile()
+                return extract_async(row)
+
+        return (extract_async, True) if is_async else (extract, False)
+
+    def supports_positional(self) -> bool:
+        if type(self).compile is Extractor.compile:
+            return False
+        return all(
+            extractor.supports_positional()
+            for value in vars(self).values()
+            for extractor in child_extractors(value)
+        )
 
     def reset_cache(self):
         return {}
@@ -366,8 +536,8 @@ class ListExtractor(Extractor[list[V]]):
         self.inner_extractor = inner_extractor
         super().__init__(model_reference, field)
 
-    async def extract(self, row) -> list[V]:
-        return await self.inner_extractor.extract(row)
+    def compile(self, positional: bool) -> Hydrator:
+        return self.inner_extractor.hydrator(positional)
 
     def unwrap(self):
         return self.inner_extractor.unwrap()
@@ -379,25 +549,114 @@ class ListExtractor(Extractor[list[V]]):
         cache[k].append(v)
 
 
+class AggregatedListExtractor(ListExtractor[V]):
+    """Reads a list that was aggregated into a JSON array column by a `LateralJoin`."""
+
+    def __init__(
+        self,
+        alias: str,
+        inner_extractor: Extractor[V],
+        model_reference: ModelReference | None,
+        field: StrawberryField[V] | None,
+        position: int | None = None,
+    ):
+        self.alias = alias
+        self.position = position
+        super().__init__(inner_extractor, model_reference, field)
+
+    def supports_positional(self) -> bool:
+        return self.position is not None
+
+    def compile(self, positional: bool) -> Hydrator:
+        key = self.position if positional else self.alias
+        # Aggregated rows are JSON objects keyed by alias.
+        extract_item, item_is_async = self.inner_extractor.hydrator(False)
+        if item_is_async:
+
+            async def extract(row):
+                return [await extract_item(item) for item in row[key]]
+
+            return extract, True
+
+        def extract(row):
+            return [extract_item(item) for item in row[key]]
+
+        return extract, False
+
+    def child_rows(self, row, positional: bool) -> list[dict]:
+        return row[self.position if positional else self.alias]
+
+    def reset_cache(self):
+        return {}
+
+    def add_to_cache(self, cache, k, v):
+        cache[k] = v
+
+
+JSON_LOADERS = {
+    "UUID": uuid.UUID,
+    "TIMESTAMPTZ": datetime.datetime.fromisoformat,
+    "DATE": datetime.date.fromisoformat,
+    "BYTEA": lambda v: bytes.fromhex(v[2:]),
+}
+
+
+def json_loader(field: StrawberryField | None) -> Callable[[Any], Any] | None:
+    """Values in JSON aggregated rows come back as JSON types, load them like psycopg would have."""
+    if field is None:
+        return None
+    try:
+        sql_type = (
+            field.column_type
+            if isinstance(field, ColumnField)
+            else SqlType.from_python(field.type)
+        )
+    except RhubarbException:
+        return None
+    return JSON_LOADERS.get(sql_type.sql.upper())
+
+
 class SimpleExtractor(Extractor[V]):
     def __init__(
         self,
         alias: str,
         model_reference: ModelReference,
         field: StrawberryField[V] | None,
+        position: int | None = None,
+        json_rows: bool = False,
     ):
         self.alias = alias
+        self.position = position
+        self.json_rows = json_rows
         super().__init__(model_reference, field)
 
-    async def extract(self, row) -> V:
-        v = row[self.alias]
-        if v is not None and self.field is not None:
+    def supports_positional(self) -> bool:
+        return self.position is not None
+
+    def compile(self, positional: bool) -> Hydrator:
+        alias = self.position if positional else self.alias
+        parse_value = None
+        if self.field is not None:
             type_ = self.field.type
             if isinstance(type_, StrawberryOptional):
                 type_ = type_.of_type
             if isinstance(type_, ScalarWrapper):
-                v = type_._scalar_definition.parse_value(v)
-        return v
+                parse_value = type_._scalar_definition.parse_value
+        load_json = json_loader(self.field) if self.json_rows else None
+
+        if parse_value is None and load_json is None:
+            return operator.itemgetter(alias), False
+
+        def extract(row):
+            v = row[alias]
+            if v is not None:
+                if load_json is not None:
+                    v = load_json(v)
+                if parse_value is not None:
+                    v = parse_value(v)
+            return v
+
+        return extract, False
 
 
 class WrappedExtractor(Extractor[V]):
@@ -416,8 +675,8 @@ class WrappedExtractor(Extractor[V]):
     def add_to_cache(self, cache, k, v):
         return self.extractor.add_to_cache(cache, k, v)
 
-    async def extract(self, row) -> V:
-        return await self.extractor.extract(row)
+    def compile(self, positional: bool) -> Hydrator:
+        return self.extractor.hydrator(positional)
 
     def unwrap(self):
         return self.extractor.unwrap()
@@ -440,23 +699,97 @@ class ModelExtractor(Extractor[V]):
             v._cached_pk = k
         return super().add_to_cache(cache, k, v)
 
-    async def extract(self, row) -> V:
-        field_names = {f.name for f in dataclasses.fields(self.model) if f.init}
-        kwargs = {
-            k: await selector.extract(row)
-            for k, (col_field, selector) in self.field_aliases.items()
-            if k in field_names
+    def compile(self, positional: bool) -> Hydrator:
+        hydration = model_hydration(self.model)
+        hydrators = {
+            k: extractor.hydrator(positional)
+            for k, (col_field, extractor) in self.field_aliases.items()
+            if k in hydration.init_fields
         }
-        for k in field_names:
-            if k not in kwargs:
-                kwargs[k] = UNSET
-        return self.model(**kwargs)
+        construct = hydration.constructor(hydrators.keys())
+        if any(is_async for _fn, is_async in hydrators.values()):
+            async_fields = compile_async_items(hydrators)
+
+            async def extract(row):
+                return construct(await async_fields(row))
+
+            return extract, True
+
+        fields = [(k, fn) for k, (fn, _is_async) in hydrators.items()]
+
+        def extract(row):
+            return construct({k: fn(row) for k, fn in fields})
+
+        return extract, False
 
     def sub_extractor(self, fn: str) -> Optional[Extractor]:
         if field := self.field_aliases.get(fn):
             return field[1]
 
 
+@dataclasses.dataclass(slots=True)
+class ModelHydration:
+    model: Type
+    init_fields: frozenset[str]
+    defaults: dict[str, Any]
+    default_factories: dict[str, Callable[[], Any]]
+    trusted: bool
+
+    @classmethod
+    def of(cls, model: Type) -> ModelHydration:
+        init_fields, defaults, default_factories = set(), {}, {}
+        for f in dataclasses.fields(model):
+            if f.init:
+                init_fields.add(f.name)
+            elif f.default is not dataclasses.MISSING:
+                defaults[f.name] = f.default
+            elif f.default_factory is not dataclasses.MISSING:
+                default_factories[f.name] = f.default_factory
+        init_code = getattr(model.__init__, "__code__", None)
+        # Rows from the DB can skip `__init__` as long as it is the one generated by dataclasses.
+        trusted = (
+            model.__dictoffset__ != 0
+            and not hasattr(model, "__post_init__")
+            and init_code is not None
+            and init_code.co_filename == "<string>"
+        )
+        return cls(
+            model=model,
+            init_fields=frozenset(init_fields),
+            defaults=defaults,
+            default_factories=default_factories,
+            trusted=trusted,
+        )
+
+    def constructor(self, set_fields: Iterable[str]) -> Callable[[dict[str, Any]], Any]:
+        model = self.model
+        unset = {k: UNSET for k in self.init_fields.difference(set_fields)}
+        if not self.trusted:
+            return lambda kwargs: model(**kwargs, **unset)
+
+        template = unset | self.defaults
+        default_factories = list(self.default_factories.items())
+        new = object.__new__
+
+        def construct(kwargs):
+            obj = new(model)
+            attrs = obj.__dict__
+            attrs.update(template)
+            attrs.update(kwargs)
+            for k, factory in default_factories:
+                attrs[k] = factory()
+            return obj
+
+        return construct
+
+
+def model_hydration(model: Type) -> ModelHydration:
+    if (hydration := model.__dict__.get("__hydration__")) is None:
+        hydration = ModelHydration.of(model)
+        model.__hydration__ = hydration
+    return hydration
+
+
 class ModelWrapper:
     def __init__(self, model, set_fields):
         self._model = model
@@ -482,8 +815,17 @@ class DictExtractor(Extractor[V]):
         self.key_aliases = key_aliases
         super().__init__(model_reference, field)
 
-    async def extract(self, row) -> dict[str, SQLValue]:
-        return {k: await v.extract(row) for k, v in self.key_aliases.items()}
+    def compile(self, positional: bool) -> Hydrator:
+        hydrators = {k: v.hydrator(positional) for k, v in self.key_aliases.items()}
+        if any(is_async for _fn, is_async in hydrators.values()):
+            return compile_async_items(hydrators), True
+
+        fields = [(k, fn) for k, (fn, _is_async) in hydrators.items()]
+
+        def extract(row):
+            return {k: fn(row) for k, fn in fields}
+
+        return extract, False
 
 
 class TupleExtractor(Extractor[V]):
@@ -496,8 +838,70 @@ class TupleExtractor(Extractor[V]):
         self.tuple_aliases = tuple_aliases
         super().__init__(model_reference, field)
 
-    async def extract(self, row) -> tuple[SQLValue, ...]:
-        return tuple(await v.extract(row) for v in self.tuple_aliases)
+    def compile(self, positional: bool) -> Hydrator:
+        hydrators = {
+            i: v.hydrator(positional) for i, v in enumerate(self.tuple_aliases)
+        }
+        if any(is_async for _fn, is_async in hydrators.values()):
+            async_items = compile_async_items(hydrators)
+
+            async def extract(row):
+                return tuple((await async_items(row)).values())
+
+            return extract, True
+
+        fns = [fn for fn, _is_async in hydrators.values()]
+
+        def extract(row):
+            return tuple(fn(row) for fn in fns)
+
+        return extract, False
+
+
+def compile_async_items(hydrators: dict[Any, Hydrator]):
+    items = list((k, fn, is_async) for k, (fn, is_async) in hydrators.items())
+
+    async def extract(row):
+        result = {}
+        for k, fn, is_async in items:
+            v = fn(row)
+            if is_async:
+                v = await v
+            result[k] = v
+        return result
+
+    return extract
+
+
+def detach_extractor(extractor: Extractor):
+    """
+    Drop the references an extractor tree keeps to the ObjectSets it was built from
+    so a cached plan doesn't keep a request's rows alive.
+    """
+    for attr, value in list(vars(extractor).items()):
+        if isinstance(value, ModelReference):
+            setattr(extractor, attr, value.detached())
+        else:
+            for child in child_extractors(value):
+                detach_extractor(child)
+
+
+def reset_hydrators(extractor: Extractor):
+    extractor._hydrators.clear()
+    for value in vars(extractor).values():
+        for child in child_extractors(value):
+            reset_hydrators(child)
+
+
+def child_extractors(value) -> Iterator[Extractor]:
+    if isinstance(value, Extractor):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from child_extractors(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from child_extractors(v)
 
 
 class Selector(Generic[V]):
@@ -511,7 +915,9 @@ class Selector(Generic[V]):
         builder.start_selection()
         self.__sql__(builder)
         alias = builder.write_alias(alias_name)
-        return SimpleExtractor(alias, None, None)
+        return SimpleExtractor(
+            alias, None, None, builder.column_position(alias), builder.json_rows
+        )
 
     def __model_reference__(self) -> Optional[ModelReference]:
         return None
@@ -522,6 +928,9 @@ class Selector(Generic[V]):
     def __inner_selector__(self) -> Selector:
         return self
 
+    def __cache_key__(self) -> Hashable | None:
+        return None
+
     def __infix(self, other, op, reverse_args=False):
         return Computed(
             args=[other, self] if reverse_args else [self, other],
@@ -630,6 +1039,16 @@ class WrappedSelector(Selector[V]):
     def __inner_selector__(self) -> Selector:
         return self._selector.__inner_selector__()
 
+    def __cache_key__(self) -> Hashable | None:
+        if (inner_key := cache_key(self._selector)) is None:
+            return None
+        return (
+            "wrapped",
+            inner_key,
+            self._model_reference.id,
+            self._field and self._field.name,
+        )
+
     def __getattribute__(self, item):
         if item.startswith("_"):
             return object.__getattribute__(self, item)
@@ -672,6 +1091,11 @@ class Computed(Selector[V]):
             if hasattr(arg, "__joins__"):
                 yield from arg.__joins__(seen)
 
+    def __cache_key__(self) -> Hashable | None:
+        if (args_key := cache_key(tuple(self._args))) is None:
+            return None
+        return "computed", self._op, self._infixed, self._sep, args_key
+
 
 class Case(Selector[V]):
     def __init__(
@@ -701,6 +1125,13 @@ class Case(Selector[V]):
         if self.default:
             yield from joins(self.default, seen=seen)
 
+    def __cache_key__(self) -> Hashable | None:
+        whens_key = cache_key(tuple(self.whens))
+        default_key = cache_key(self.default)
+        if whens_key is None or default_key is None:
+            return None
+        return "case", whens_key, default_key
+
 
 class Value(Selector[V]):
     def __init__(self, val: V, sql_type=None):
@@ -714,6 +1145,11 @@ class Value(Selector[V]):
         if hasattr(self.val, "__joins__"):
             yield from self.val.__joins__(seen)
 
+    def __cache_key__(self) -> Hashable | None:
+        if (val_key := cache_key(self.val)) is None:
+            return None
+        return "value", val_key
+
 
 class RawSQL(Selector[V]):
     def __init__(self, sql: str):
@@ -725,6 +1161,189 @@ class RawSQL(Selector[V]):
     def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
         return iter(())
 
+    def __cache_key__(self) -> Hashable | None:
+        return "raw", self.sql
+
+
+class AllColumns(Selector):
+    """`alias.*`, used to return whole rows from a mutation that is read in a `WITH` query."""
+
+    def __init__(self, model_reference: ModelReference):
+        self.model_reference = model_reference
+
+    def __sql__(self, builder: SqlBuilder):
+        builder.write(f"{self.model_reference.alias()}.*")
+
+    def __extractor__(self, builder: SqlBuilder, alias_name: str = None) -> None:
+        self.__sql__(builder)
+
+
+class Unnest(Selector):
+    """One array parameter per column, unnested into rows under `alias`. Used as a FROM item."""
+
+    def __init__(self, alias: str, columns: list[ColumnField], rows: list[tuple]):
+        self.alias = alias
+        self.columns = columns
+        self.rows = rows
+
+    def __sql__(self, builder: SqlBuilder):
+        builder.write("UNNEST(")
+        for i, column_field in enumerate(self.columns):
+            if i:
+                builder.write(", ")
+            column_type = column_field.column_type
+            builder.write(f"%s::{array_type(column_type)}")
+            builder.vars.append([bulk_value(row[i], column_type) for row in self.rows])
+        column_names = ", ".join(f'"{col.column_name}"' for col in self.columns)
+        builder.write(f") AS {self.alias}({column_names})")
+
+    def column(self, column_field: ColumnField) -> RawSQL:
+        return RawSQL(f'{self.alias}."{column_field.column_name}"')
+
+
+class PkIn(Selector[bool]):
+    """
+    Match rows whose primary key is in `pks` with array parameters, so the SQL text stays the same for any
+    number of keys: `pk = ANY(%s)`, or `(a, b) IN (SELECT * FROM UNNEST(%s, %s))` for composite keys.
+    """
+
+    def __init__(
+        self,
+        pk_selector: ColumnSelector | tuple[ColumnSelector, ...],
+        pks: Iterable[SQLValue | tuple[SQLValue, ...]],
+    ):
+        self.pk_selector = pk_selector
+        self.pks = list(pks)
+
+    def __sql__(self, builder: SqlBuilder):
+        if not isinstance(self.pk_selector, tuple):
+            column_type = self.pk_selector.__field__().column_type
+            builder.write_value(self.pk_selector)
+            builder.write(f" = ANY(%s::{array_type(column_type)})")
+            builder.vars.append([bulk_value(pk, column_type) for pk in self.pks])
+            return
+
+        builder.write("(")
+        for i, selector in enumerate(self.pk_selector):
+            if i:
+                builder.write(", ")
+            builder.write_value(selector)
+        builder.write(") IN (SELECT * FROM UNNEST(")
+        for i, selector in enumerate(self.pk_selector):
+            if i:
+                builder.write(", ")
+            column_type = selector.__field__().column_type
+            builder.write(f"%s::{array_type(column_type)}")
+            builder.vars.append([bulk_value(pk[i], column_type) for pk in self.pks])
+        builder.write("))")
+
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        selectors = self.pk_selector
+        for selector in selectors if isinstance(selectors, tuple) else (selectors,):
+            yield from joins(selector, seen)
+
+
+class Seek(Selector[bool]):
+    """
+    Match rows that sort after the `values` of a cursor, or before them with `before`. When every key sorts
+    in the same direction this is a row value comparison `(a, b) > (%s, %s)` that an index on `(a, b)` can
+    serve, otherwise it expands to `a > %s OR (a = %s AND b < %s)`. Nullable keys are expanded too, with
+    NULL sorting after every value like Postgres' default `NULLS LAST` / `DESC NULLS FIRST`.
+    """
+
+    def __init__(
+        self,
+        keys: list[tuple[ColumnSelector, bool]],
+        values: list[SQLValue],
+        before: bool = False,
+    ):
+        self.keys = keys
+        self.values = values
+        self.before = before
+
+    def write_param(self, builder: SqlBuilder, i: int):
+        column_type = self.keys[i][0].__field__().column_type
+        builder.write(f"%s::{scalar_type(column_type)}")
+        builder.vars.append(self.values[i])
+
+    def op(self, descending: bool) -> str:
+        return "<" if descending != self.before else ">"
+
+    def nullable(self, i: int) -> bool:
+        return (
+            self.keys[i][0].__field__().column_type.optional or self.values[i] is None
+        )
+
+    def write_equal(self, builder: SqlBuilder, i: int):
+        builder.write_value(self.keys[i][0])
+        if self.values[i] is None:
+            builder.write(" IS NULL")
+        else:
+            builder.write(" = ")
+            self.write_param(builder, i)
+
+    def write_compare(self, builder: SqlBuilder, i: int, op: str):
+        # Postgres sorts NULL after every value ascending and before them descending.
+        selector = self.keys[i][0]
+        if self.values[i] is None:
+            if op == ">":
+                builder.write("FALSE")
+            else:
+                builder.write_value(selector)
+                builder.write(" IS NOT NULL")
+            return
+        nulls_follow = op == ">" and self.nullable(i)
+        if nulls_follow:
+            builder.write("(")
+        builder.write_value(selector)
+        builder.write(f" {op} ")
+        self.write_param(builder, i)
+        if nulls_follow:
+            builder.write(" OR ")
+            builder.write_value(selector)
+            builder.write(" IS NULL)")
+
+    def __sql__(self, builder: SqlBuilder):
+        if len({descending for _, descending in self.keys}) == 1 and not any(
+            self.nullable(i) for i in range(len(self.keys))
+        ):
+            builder.write("(")
+            for i, (selector, _) in enumerate(self.keys):
+                if i:
+                    builder.write(", ")
+                builder.write_value(selector)
+            builder.write(f") {self.op(self.keys[0][1])} (")
+            for i in range(len(self.keys)):
+                if i:
+                    builder.write(", ")
+                self.write_param(builder, i)
+            builder.write(")")
+            return
+
+        builder.write("(")
+        for i, (_, descending) in enumerate(self.keys):
+            if i:
+                builder.write(" OR ")
+            builder.write("(")
+            for j in range(i):
+                self.write_equal(builder, j)
+                builder.write(" AND ")
+            self.write_compare(builder, i, self.op(descending))
+            builder.write(")")
+        builder.write(")")
+
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        for selector, _ in self.keys:
+            yield from joins(selector, seen)
+
+    def __cache_key__(self) -> Hashable | None:
+        keys_key = cache_key(tuple(selector for selector, _ in self.keys))
+        values_key = cache_key(tuple(self.values))
+        if keys_key is None or values_key is None:
+            return None
+        directions = tuple(descending for _, descending in self.keys)
+        return "seek", keys_key, directions, values_key, self.before
+
 
 class PythonValueExtractor(Extractor[V]):
     def __init__(
@@ -736,8 +1355,9 @@ class PythonValueExtractor(Extractor[V]):
         self.value = value
         super().__init__(model_reference, field)
 
-    async def extract(self, row) -> V:
-        return self.value
+    def compile(self, positional: bool) -> Hydrator:
+        value = self.value
+        return lambda row: value, False
 
 
 class PythonOnlyValue(Selector[V]):
@@ -748,12 +1368,18 @@ class PythonOnlyValue(Selector[V]):
         pass
 
     def __extractor__(self, builder: SqlBuilder, alias_name: str = None) -> Extractor:
+        builder.wrote_python_value = True
         return PythonValueExtractor(self.val, None, None)
 
     def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
         if hasattr(self.val, "__joins__"):
             yield from self.val.__joins__(seen)
 
+    def __cache_key__(self) -> Hashable | None:
+        if (val_key := cache_key(self.val)) is None:
+            return None
+        return "python", val_key
+
 
 class UseExtractor(Extractor[V]):
     def __init__(
@@ -767,17 +1393,45 @@ class UseExtractor(Extractor[V]):
         self.fn = fn
         self.dependencies = dependencies
         self.kw_dependencies = kw_dependencies
+        self.returns_awaitable = inspect.iscoroutinefunction(fn)
         super().__init__(model_reference, field)
 
-    async def extract(self, row) -> V:
-        dependencies = [await dep.extract(row) for dep in self.dependencies]
+    def compile(self, positional: bool) -> Hydrator:
+        fn = self.fn
+        dependencies = {
+            i: dep.hydrator(positional) for i, dep in enumerate(self.dependencies)
+        }
         kw_dependencies = {
-            k: await dep.extract(row) for k, dep in self.kw_dependencies.items()
+            k: dep.hydrator(positional) for k, dep in self.kw_dependencies.items()
         }
-        result = self.fn(*dependencies, **kw_dependencies)
-        if inspect.isawaitable(result):
-            result = await result
-        return result
+        hydrators = list(dependencies.values()) + list(kw_dependencies.values())
+        if self.returns_awaitable or any(is_async for _fn, is_async in hydrators):
+            async_args = compile_async_items(dependencies)
+            async_kwargs = compile_async_items(kw_dependencies)
+
+            async def extract(row):
+                args = (await async_args(row)).values()
+                result = fn(*args, **await async_kwargs(row))
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
+
+            return extract, True
+
+        args = [dep_fn for dep_fn, _is_async in dependencies.values()]
+        kwargs = [(k, dep_fn) for k, (dep_fn, _is_async) in kw_dependencies.items()]
+
+        def extract(row):
+            result = fn(*[f(row) for f in args], **{k: f(row) for k, f in kwargs})
+            if inspect.isawaitable(result):
+                # The function is called again once the tree is compiled async.
+                if inspect.iscoroutine(result):
+                    result.close()
+                self.returns_awaitable = True
+                raise AwaitableResult()
+            return result
+
+        return extract, False
 
 
 class UseSelector(Selector[V]):
@@ -816,6 +1470,17 @@ class Aggregate(Computed[V]):
         super().__init__(*args, **kwargs)
         self._model_selector = model_selector
 
+    def __cache_key__(self) -> Hashable | None:
+        if (computed_key := super().__cache_key__()) is None:
+            return None
+        join = self._model_selector._join
+        return (
+            "aggregate",
+            self._model_selector._model_reference.id,
+            join and join.id,
+            computed_key,
+        )
+
 
 class ColumnSelector(Selector[V]):
     def __init__(
@@ -844,7 +1509,13 @@ class ColumnSelector(Selector[V]):
 
     def __extractor__(self, builder: SqlBuilder, alias: str = None) -> Extractor:
         alias = builder.extract_column(self._model_reference, self._field, alias=alias)
-        return SimpleExtractor(alias, self._model_reference, self._field)
+        return SimpleExtractor(
+            alias,
+            self._model_reference,
+            self._field,
+            builder.column_position(alias),
+            builder.json_rows,
+        )
 
     def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
         for join_id, join in self._model_reference.object_set.joins.items():
@@ -858,6 +1529,14 @@ class ColumnSelector(Selector[V]):
                 seen.add((self._join.id, self._field.name))
                 yield self._join.id, self._join, self._field.name
 
+    def __cache_key__(self) -> Hashable | None:
+        return (
+            "column",
+            self._model_reference.id,
+            self._field.column_name,
+            self._join and self._join.id,
+        )
+
 
 class FieldSelector(Selector[V]):
     def __init__(
@@ -883,11 +1562,33 @@ class FieldSelector(Selector[V]):
         builder.start_selection()
         self.__sql__(builder)
         alias = builder.write_alias(alias_name or self._field.name)
-        return SimpleExtractor(alias, self._model_reference, self._field)
+        return SimpleExtractor(
+            alias,
+            self._model_reference,
+            self._field,
+            builder.column_position(alias),
+            builder.json_rows,
+        )
 
     def __field__(self) -> Optional[StrawberryField]:
         return self._field
 
+    def __cache_key__(self) -> Hashable | None:
+        if not field_is_plan_cacheable(self._field):
+            return None
+        selection_key = selection_cache_key(
+            unwrap_field_type(self._field), self._selected_fields
+        )
+        if selection_key is None:
+            return None
+        return (
+            "field",
+            self._model_reference.id,
+            self._field.name,
+            self._join and self._join.id,
+            selection_key,
+        )
+
     def __call__(self, *args, **kwargs):
         source = self._model_selector
         field = self._field
@@ -947,6 +1648,19 @@ class ModelSelector(Selector[T]):
     def __model_reference__(self) -> Optional[ModelReference]:
         return self._model_reference
 
+    def __cache_key__(self) -> Hashable | None:
+        model = self._model_reference.model
+        selection_key = selection_cache_key(model, self._selected_fields)
+        if selection_key is None:
+            return None
+        return (
+            "model",
+            model,
+            self._model_reference.id,
+            self._join and self._join.id,
+            selection_key,
+        )
+
     def _selector_for_field(self, column_field: StrawberryField, unwrap=False):
         if isinstance(column_field, ColumnField) and not column_field.virtual:
             selector = ColumnSelector(self._model_reference, column_field, self._join)
@@ -1048,6 +1762,17 @@ class DataclassSelector(Selector[T]):
             selector = self._prefilled_selectors[name]
             yield from joins(selector, seen)
 
+    def __cache_key__(self) -> Hashable | None:
+        prefilled_key = cache_key(
+            tuple(
+                (name, self._prefilled_selectors[name])
+                for name in sorted(self._selection_names)
+            )
+        )
+        if prefilled_key is None:
+            return None
+        return "dataclass", self._dataclass, prefilled_key
+
     def __sql__(self, builder: SqlBuilder):
         builder.write("(")
         wrote_val = False
@@ -1066,7 +1791,7 @@ class DataclassSelector(Selector[T]):
             if not isinstance(selector, Selector):
                 selector = PythonOnlyValue(selector)
             extractor = selector.__extractor__(builder)
-            field_aliases[name] = (selector, extractor)
+            field_aliases[name] = (None, extractor)
         return ModelExtractor(self._dataclass, field_aliases, None, None)
 
     def __getattribute__(self, item):
@@ -1089,6 +1814,11 @@ class ListSelector(Selector[V]):
     def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, str)]:
         yield from self.inner_selector.__joins__(seen)
 
+    def __cache_key__(self) -> Hashable | None:
+        if (inner_key := cache_key(self.inner_selector)) is None:
+            return None
+        return "list", inner_key
+
     def __sql__(self, builder: SqlBuilder):
         self.inner_selector.__sql__(builder)
 
@@ -1097,6 +1827,16 @@ class ListSelector(Selector[V]):
             self.inner_selector.__extractor__(builder, alias), None, None
         )
 
+    def __getattr__(self, item):
+        # Filters read the fields of a joined list relation's rows, `book.ratings().rating > 3`.
+        if item.startswith("_"):
+            raise AttributeError(item)
+        if type(self) is not ListSelector:
+            raise AttributeError(
+                f"Only list relations loaded with a join can be filtered on, not {item}"
+            )
+        return getattr(self.inner_selector, item)
+
     def select(
         self, selection_fn: Callable[[V, Info], R], info: Info | None = None
     ) -> ListSelector[R]:
@@ -1106,45 +1846,314 @@ class ListSelector(Selector[V]):
         return new_selector
 
 
-class AscDesc:
-    direction: Literal["ASC", "DESC"]
+class LateralListSelector(ListSelector[V]):
+    def __init__(self, inner_selector: Selector[V], join: LateralJoin):
+        self.join = join
+        super().__init__(inner_selector)
 
-    def __init__(self, selector):
-        self.selector = selector
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        # Joins of the child rows are written inside the lateral subquery.
+        for join_id, join, join_field in self.join.parent_joins:
+            if (join_id, join_field) not in seen:
+                seen.add((join_id, join_field))
+                yield join_id, join, join_field
+        if (self.join.id, "rows") not in seen:
+            seen.add((self.join.id, "rows"))
+            yield self.join.id, self.join, "rows"
+
+    def __cache_key__(self) -> Hashable | None:
+        if (inner_key := cache_key(self.inner_selector)) is None:
+            return None
+        return "lateral", self.join.id, inner_key
 
     def __sql__(self, builder: SqlBuilder):
-        self.selector.__sql__(builder)
-        builder.write(f" {self.direction}")
+        builder.write(f"{self.join.model_reference.alias()}.rows")
+
+    def __extractor__(self, builder: SqlBuilder, alias: str = None) -> Extractor:
+        _sub_builder, inner_extractor = self.join.compile()
+        builder.start_selection()
+        self.__sql__(builder)
+        alias = builder.write_alias(alias or "rows")
+        return AggregatedListExtractor(
+            alias, inner_extractor, None, None, builder.column_position(alias)
+        )
 
 
-class Asc(AscDesc):
+class SelectInListSelector(ListSelector[V]):
     """
-    Sort the selection Ascending.
+    A list relation loaded by a second query, `child.key = ANY(%s)`, with the keys of the parent rows instead
+    of a join. In the parent query it only selects the parent's key.
     """
 
-    direction = "ASC"
+    def __init__(
+        self,
+        inner_selector: Selector[V],
+        object_set: ObjectSet,
+        parent_key: ColumnSelector,
+        child_key: ColumnSelector,
+    ):
+        self.object_set = object_set
+        self.parent_key = parent_key
+        self.child_key = child_key
+        super().__init__(inner_selector)
 
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        yield from joins(self.parent_key, seen)
 
-class Desc(AscDesc):
-    """
-    Sort the selection Descending.
-    """
+    def __cache_key__(self) -> Hashable | None:
+        if (inner_key := cache_key(self.inner_selector)) is None:
+            return None
+        return "selectin", cache_key(self.parent_key), inner_key
 
-    direction = "DESC"
+    def __sql__(self, builder: SqlBuilder):
+        self.parent_key.__sql__(builder)
 
+    def __extractor__(self, builder: SqlBuilder, alias: str = None) -> Extractor:
+        return self.parent_key.__extractor__(builder, alias)
 
-S = TypeVar("S", bound=Selector)
-R = TypeVar("R", Selector, dataclasses.dataclass)
-OrderBySelector = TypeVar(
-    "OrderBySelector",
-    Selector,
-    tuple[Selector],
-    AscDesc,
-    tuple[AscDesc, ...],
-)
-WhereSelector = TypeVar("WhereSelector", Selector[bool], bool)
-NewWhereSelector = TypeVar("NewWhereSelector", Selector[bool], bool)
-PkValue = int | uuid.UUID | str
+
+class JsonObject(Selector[dict]):
+    """`json_build_object('key', value, ...)`, or NULL when `present` is NULL."""
+
+    def __init__(self, items: dict[str, Selector], present: Selector | None = None):
+        self.items = items
+        self.present = present
+
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        for value in self.items.values():
+            yield from joins(value, seen)
+        if self.present is not None:
+            yield from joins(self.present, seen)
+
+    def __sql__(self, builder: SqlBuilder):
+        if self.present is not None:
+            builder.write("CASE WHEN ")
+            builder.write_value(self.present)
+            builder.write(" IS NULL THEN NULL ELSE ")
+        builder.write("json_build_object(")
+        for i, (key, value) in enumerate(self.items.items()):
+            if i:
+                builder.write(", ")
+            builder.write(f"'{key}', ")
+            builder.write_value(value)
+        builder.write(")")
+        if self.present is not None:
+            builder.write(" END")
+
+
+class JsonList(Selector[list]):
+    """
+    Aggregates the `JsonObject` selected by `object_set` into a JSON array with a correlated subquery,
+    or its first object with `one`.
+    """
+
+    def __init__(
+        self,
+        object_set: ObjectSet,
+        parent_joins: list[tuple[str, Join, str]] = (),
+        one: bool = False,
+    ):
+        self.object_set = object_set
+        self.parent_joins = parent_joins
+        self.one = one
+
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        for join_id, join, join_field in self.parent_joins:
+            if (join_id, join_field) not in seen:
+                seen.add((join_id, join_field))
+                yield join_id, join, join_field
+
+    def __sql__(self, builder: SqlBuilder):
+        sub_builder = SqlBuilder()
+        _pk_extractor, extractor = self.object_set.build_select_statement(sub_builder)
+        if self.one:
+            builder.write(f"(SELECT sub.{extractor.alias} FROM (")
+        else:
+            builder.write(
+                f"(SELECT COALESCE(json_agg(sub.{extractor.alias}), '[]') FROM ("
+            )
+        builder.write_subquery(sub_builder)
+        builder.write(") AS sub")
+        builder.write(" LIMIT 1)" if self.one else ")")
+
+
+class RelatedAggregate(Selector[V]):
+    """
+    Aggregates the rows of a relation for each parent row without loading them, as a correlated subquery with
+    the relation's `on` clause: `(SELECT COUNT(*) FROM child WHERE child.parent_id = parent.id)`.
+    """
+
+    def __init__(
+        self,
+        relation: FieldSelector,
+        op: str,
+        column: Callable[[ModelSelector], Selector] | None = None,
+    ):
+        field = relation.__field__()
+        if not isinstance(field, RelationField):
+            raise RhubarbException(f"{field and field.name} is not a relation")
+        parent = relation._model_selector
+        parent_set = parent._model_reference.object_set
+        # Named after the parent and the relation, so the SQL is the same for every request.
+        object_set = ObjectSet(
+            field.related_model(),
+            conn=parent_set.conn,
+            info=parent_set.info,
+            reference_id=f"{parent._model_reference.id}_{op.lower()}_{field.name}",
+        )
+        on_clause = field.on(parent, object_set.model_selector)
+        if object_set.where_clause is not None:
+            object_set.where_clause &= on_clause
+        else:
+            object_set.where_clause = on_clause
+        object_set.order_by_clause = None
+        object_set.pk_selector = None
+        if op == "EXISTS":
+            selection = RawSQL("1")
+        elif column is None:
+            selection = RawSQL(f"{op}(*)")
+        else:
+            selected_column = column(object_set.model_selector)
+            selection = Computed([selected_column], op, infixed=False)
+        self.object_set = object_set.select(lambda _: selection)
+        self.op = op
+        self.relation_name = field.name
+        self.parent_joins = [
+            (join_id, join, join_field)
+            for join_id, join, join_field in joins(on_clause)
+            if join_id not in object_set.joins
+        ]
+
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        for join_id, join, join_field in self.parent_joins:
+            if (join_id, join_field) not in seen:
+                seen.add((join_id, join_field))
+                yield join_id, join, join_field
+
+    def __cache_key__(self) -> Hashable | None:
+        selection_key = cache_key(self.object_set.selection)
+        where_key = cache_key(self.object_set.where_clause)
+        if selection_key is None or where_key is None:
+            return None
+        return (
+            "related_aggregate",
+            self.object_set.model_reference.id,
+            self.relation_name,
+            self.op,
+            selection_key,
+            where_key,
+        )
+
+    def __sql__(self, builder: SqlBuilder):
+        sub_builder = SqlBuilder()
+        self.object_set.build_select_statement(sub_builder)
+        builder.write("EXISTS (" if self.op == "EXISTS" else "(")
+        builder.write_subquery(sub_builder)
+        builder.write(")")
+
+
+class SemiJoin(Selector[bool]):
+    """
+    Filters parent rows on the rows of a list relation with `EXISTS (SELECT 1 FROM child WHERE on AND ...)`,
+    a join would repeat each parent once per matching child.
+    """
+
+    def __init__(
+        self,
+        join: Join,
+        predicates: list[Selector[bool]],
+        filter_joins: dict[str, Join],
+    ):
+        self.join = join
+        self.predicates = predicates
+        # The relation's join and the joins made from its rows are written inside the subquery.
+        self.inner_joins = {join.id: join}
+        for join_id, other in filter_joins.items():
+            if join_id not in self.inner_joins and any(
+                on_join_id in self.inner_joins for on_join_id, _, _ in joins(other.on)
+            ):
+                self.inner_joins[join_id] = other
+        self.join_fields: defaultdict[str, set[str]] = defaultdict(set)
+        self.parent_joins = []
+        seen = set()
+        for clause in (join.on, *predicates):
+            for join_id, other, join_field in joins(clause, seen):
+                if join_id in self.inner_joins:
+                    self.join_fields[join_id].add(join_field)
+                else:
+                    self.parent_joins.append((join_id, other, join_field))
+
+    def __joins__(self, seen: set[tuple[str, str]]) -> Iterator[(str, Join, str)]:
+        for join_id, join, join_field in self.parent_joins:
+            if (join_id, join_field) not in seen:
+                seen.add((join_id, join_field))
+                yield join_id, join, join_field
+
+    def __sql__(self, builder: SqlBuilder):
+        builder.write("EXISTS (SELECT 1 FROM ")
+        for i, (join_id, join) in enumerate(self.inner_joins.items()):
+            if i:
+                builder.write(f" {join.join_type} JOIN ")
+            join.__sql__(builder, self.join_fields[join_id])
+            builder.write(" AS ")
+            builder.write(join.model_reference.alias())
+            if i:
+                builder.write(" ON ")
+                join.on.__sql__(builder)
+        builder.write(" WHERE ")
+        self.join.on.__sql__(builder)
+        for predicate in self.predicates:
+            builder.write(" AND ")
+            builder.write_value(predicate)
+        builder.write(")")
+
+    def __cache_key__(self) -> Hashable | None:
+        if (on_key := cache_key(self.join.on)) is None:
+            return None
+        if (predicates_key := cache_key(tuple(self.predicates))) is None:
+            return None
+        return "semi_join", tuple(self.inner_joins), on_key, predicates_key
+
+
+class AscDesc:
+    direction: Literal["ASC", "DESC"]
+
+    def __init__(self, selector):
+        self.selector = selector
+
+    def __sql__(self, builder: SqlBuilder):
+        self.selector.__sql__(builder)
+        builder.write(f" {self.direction}")
+
+
+class Asc(AscDesc):
+    """
+    Sort the selection Ascending.
+    """
+
+    direction = "ASC"
+
+
+class Desc(AscDesc):
+    """
+    Sort the selection Descending.
+    """
+
+    direction = "DESC"
+
+
+S = TypeVar("S", bound=Selector)
+R = TypeVar("R", Selector, dataclasses.dataclass)
+OrderBySelector = TypeVar(
+    "OrderBySelector",
+    Selector,
+    tuple[Selector],
+    AscDesc,
+    tuple[AscDesc, ...],
+)
+WhereSelector = TypeVar("WhereSelector", Selector[bool], bool)
+NewWhereSelector = TypeVar("NewWhereSelector", Selector[bool], bool)
+PkValue = int | uuid.UUID | str
 
 
 class ObjectSet(Generic[T, S]):
@@ -1155,11 +2164,14 @@ class ObjectSet(Generic[T, S]):
         info: Info = None,
         fields: SelectedFields = None,
         one=False,
+        reference_id: str = "0",
     ):
         self.model = model
         self.list_select = False
         self.conn = conn
-        self.model_reference = ModelReference.new(model, self)
+        self.model_reference = ModelReference.new(
+            model, self, reference_id=reference_id
+        )
         self.model_selector = ModelSelector(
             self.model_reference, selected_fields=fields
         )
@@ -1172,15 +2184,21 @@ class ObjectSet(Generic[T, S]):
         self.seen_join_fields: set[(str, str)] = set()
         self.lock = asyncio.Lock()
         self.row_cache = None
+        self.positional_rows = False
         self.cache = None
         self.cache_main_extractor = None
         self.cache_pk_extractor = None
+        self.selectin_keys: dict[PkValue, SQLValue] | None = None
         self.order_by_clause: OrderBySelector | None = None
         self.where_clause: Selector[bool] | None = None
         self.group_by_clause: Selector[V] | None = None
         self.offset_clause: Selector[int] | None = None
         self.limit_clause: Selector[int] | None = Value(1) if one else None
         self.info: Info | None = info
+        self.prepare_statement: bool | None = None
+        self.mutation_source: MutationSource | None = None
+        self.relation_strategies: dict[str, RELATION_STRATEGIES] = {}
+        self.reverse_rows = False
         self._one = one
         self.post_init(info)
 
@@ -1216,6 +2234,7 @@ class ObjectSet(Generic[T, S]):
         new_self.cache = None
         new_self.cache_main_extractor = None
         new_self.cache_pk_extractor = None
+        new_self.selectin_keys = None
         new_self.joins = copy.copy(self.joins)
         new_self.join_fields = copy.copy(self.join_fields)
         new_self.seen_join_fields = copy.copy(self.seen_join_fields)
@@ -1223,7 +2242,8 @@ class ObjectSet(Generic[T, S]):
 
     def select(self, selection: Callable[[S], R]) -> ObjectSet[T, R]:
         new_self = self.clone()
-        selection = selection(new_self.selection)
+        with loading_relations(new_self.relation_strategies):
+            selection = selection(new_self.selection)
         if dataclasses.is_dataclass(selection):
             selection = DataclassSelector(
                 selection.__class__,
@@ -1325,28 +2345,89 @@ class ObjectSet(Generic[T, S]):
                 model_ref = self.model_reference
                 pk_extractor = self.cache_pk_extractor
 
+            positional = self.positional_rows
+            row_cache = self.row_cache
+            aggregated = self.cache_main_extractor
+            while isinstance(aggregated, WrappedExtractor):
+                aggregated = aggregated.extractor
+            if isinstance(aggregated, AggregatedListExtractor):
+                # Children of a lateral list relation are read from its JSON rows.
+                row_cache = [
+                    (None, child_row)
+                    for _pk, row in row_cache
+                    for child_row in aggregated.child_rows(row, positional)
+                ]
+                positional = False
+
+            selectin = unwrap_selector(selection)
+            if isinstance(selectin, SelectInListSelector):
+                # Gather the keys from the parent rows so `load_data` doesn't query the parent again.
+                if (
+                    not isinstance(parent_selector, ModelSelector)
+                    or selectin.parent_key._model_reference.id
+                    != parent_selector._model_reference.id
+                ):
+                    return
+                key_extractor = self.cache_main_extractor.unwrap().sub_extractor(
+                    selectin.parent_key._field.name
+                )
+                if key_extractor is None:
+                    return
+                extract_pk, pk_is_async = pk_extractor.hydrator(positional)
+                extract_key, key_is_async = key_extractor.hydrator(positional)
+                parent_keys = {}
+                for _pk, row in row_cache:
+                    pk = extract_pk(row)
+                    if pk_is_async:
+                        pk = await pk
+                    key = extract_key(row)
+                    if key_is_async:
+                        key = await key
+                    parent_keys[pk] = key
+                new_self.model_reference = model_ref
+                new_self.selectin_keys = parent_keys
+                return
+
             sub_extractor = self.cache_main_extractor.unwrap().sub_extractor(field.name)
             if sub_extractor is None:
                 return
 
             new_self.cache_main_extractor = sub_extractor
             new_self.cache_pk_extractor = pk_extractor
-            new_self.row_cache = self.row_cache.copy()
+            new_self.row_cache = row_cache.copy()
+            new_self.positional_rows = positional
             new_self.cache = sub_extractor.reset_cache()
             new_self.model_reference = model_ref
 
+            extract_pk, pk_is_async = pk_extractor.hydrator(positional)
+            extract_value, value_is_async = sub_extractor.root_hydrator(positional)
             for _pk, row in new_self.row_cache:
-                pk = await pk_extractor.extract(row)
-                value = await sub_extractor.extract(row)
+                pk = extract_pk(row)
+                if pk_is_async:
+                    pk = await pk
+                value = extract_value(row)
+                if value_is_async or inspect.isawaitable(value):
+                    value = await value
                 sub_extractor.add_to_cache(new_self.cache, pk, value)
 
     def where(self, where: Callable[[S], NewWhereSelector]) -> ObjectSet[T, S]:
         new_self = self.clone()
-        new_self.where_clause = where(new_self.selection)
+        with loading_relations(new_self.relation_strategies):
+            where_clause = where(new_self.selection)
+        new_self.where_clause = semi_joins(where_clause, new_self.joins)
         new_self.sync_joins(new_self.where_clause)
 
         return new_self
 
+    def for_pks(self, pks: Iterable[SQLValue | tuple[SQLValue, ...]]) -> Self:
+        new_self = self.clone()
+        where_clause = PkIn(new_self.pk_selector, pks)
+        if new_self.where_clause is not None:
+            where_clause = new_self.where_clause & where_clause
+        new_self.where_clause = where_clause
+        new_self.sync_joins(new_self.where_clause)
+        return new_self
+
     def kw_where(self, **kwargs) -> ObjectSet[T, S]:
         new_self = self.clone()
         where_clause = new_self.where_clause
@@ -1385,7 +2466,8 @@ class ObjectSet(Generic[T, S]):
 
     def order_by(self, order_by: Callable[[S], OrderBySelector]) -> Self:
         new_self = self.clone()
-        new_self.order_by_clause = order_by(new_self.selection)
+        with loading_relations(new_self.relation_strategies):
+            new_self.order_by_clause = order_by(new_self.selection)
         new_self.sync_joins(new_self.order_by_clause)
 
         return new_self
@@ -1410,6 +2492,109 @@ class ObjectSet(Generic[T, S]):
 
         return new_self
 
+    def seek_keys(self) -> list[tuple[ColumnSelector, bool]]:
+        """The columns of `order_by_clause` with whether they descend, followed by the pk as a tiebreaker."""
+        order_by = self.order_by_clause
+        if order_by is None:
+            order_by = ()
+        elif not isinstance(order_by, tuple):
+            order_by = (order_by,)
+        keys = []
+        for clause in order_by:
+            descending = isinstance(clause, Desc)
+            selector = clause.selector if isinstance(clause, AscDesc) else clause
+            if not isinstance(selector, ColumnSelector):
+                raise RhubarbException(
+                    f"Cursors can only be made from columns, not {selector}"
+                )
+            keys.append((selector, descending))
+
+        pk = self.pk_selector
+        seen = {(s._model_reference.id, s._field.name) for s, _ in keys}
+        for selector in pk if isinstance(pk, tuple) else (pk,):
+            if (selector._model_reference.id, selector._field.name) not in seen:
+                keys.append((selector, False))
+        return keys
+
+    def cursor(self, obj: T) -> str:
+        """An opaque cursor for `obj`, a row of this ObjectSet, to pass to `after` or `before`."""
+        values = []
+        for selector, _ in self.seek_keys():
+            if selector._model_reference is not self.model_reference:
+                raise RhubarbException(
+                    f"Cursors can only be made from columns of {self.model.__name__}"
+                )
+            value = getattr(obj, selector._field.name)
+            if isinstance(value, Unset):
+                raise RhubarbException(
+                    f"{selector._field.name} must be selected to make a cursor"
+                )
+            values.append(
+                dump_cursor_value(bulk_value(value, selector._field.column_type))
+            )
+        encoded = json.dumps(values).encode()
+        return base64.urlsafe_b64encode(encoded).decode()
+
+    def after(self, cursor: str) -> Self:
+        """Rows that sort after `cursor` in the current order, without the cost of `OFFSET`."""
+        return self.seek(cursor, before=False)
+
+    def before(self, cursor: str) -> Self:
+        """
+        Rows that sort before `cursor` in the current order. They are read walking back from the cursor,
+        so `limit` keeps the rows closest to it.
+        """
+        return self.seek(cursor, before=True).read_backward()
+
+    def read_backward(self) -> Self:
+        """
+        Read the rows from the end of the current order, so `limit` keeps the last ones. They are still
+        returned in the current order.
+        """
+        new_self = self.clone()
+        new_self.order_by_clause = tuple(
+            selector if descending else Desc(selector)
+            for selector, descending in new_self.seek_keys()
+        )
+        new_self.reverse_rows = not self.reverse_rows
+        return new_self
+
+    def seek(self, cursor: str, before: bool) -> Self:
+        new_self = self.clone()
+        keys = new_self.seek_keys()
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(keys):
+                raise ValueError(cursor)
+            values = [load_cursor_value(v) for v in values]
+        except (ValueError, TypeError, KeyError):
+            raise RhubarbException(f"Invalid cursor {cursor}")
+
+        # Order by the pk too, so rows with equal sort keys come back in the order the cursor assumes.
+        new_self.order_by_clause = tuple(
+            Desc(selector) if descending else selector for selector, descending in keys
+        )
+        # Rows read backward sort in the opposite order of the one their cursors were made in.
+        where_clause = Seek(keys, values, before=before != self.reverse_rows)
+        if new_self.where_clause is not None:
+            where_clause = new_self.where_clause & where_clause
+        new_self.where_clause = where_clause
+        new_self.sync_joins(new_self.where_clause)
+        return new_self
+
+    def prepared(self, prepare: bool | None = True) -> Self:
+        new_self = self.clone()
+        new_self.prepare_statement = prepare
+        return new_self
+
+    def load_relations(self, **strategies: RELATION_STRATEGIES) -> Self:
+        """
+        Override the strategy of the named list relations for this query, e.g. `load_relations(books="selectin")`.
+        """
+        new_self = self.clone()
+        new_self.relation_strategies = self.relation_strategies | strategies
+        return new_self
+
     def join(
         self,
         other_model: Type[J],
@@ -1417,11 +2602,28 @@ class ObjectSet(Generic[T, S]):
         info: Info,
         as_list: bool = False,
         reference_id: str | None = None,
-        join_type: JOIN_TYPES = "INNER",
+        join_type: JOIN_TYPES = "LEFT",
+        strategy: RELATION_STRATEGIES = "join",
+        order_by: Callable[[Selector[J]], OrderBySelector] | None = None,
+        limit: int | None = None,
     ) -> Self:
         new_self = self.clone()
+        reference_id = reference_id or f"j{len(new_self.joins)}"
+        if as_list and (order_by is not None or limit is not None):
+            # Ordering and limiting the children of each parent needs a subquery per parent.
+            strategy = "lateral"
+        if as_list and strategy == "lateral":
+            return new_self.join_lateral(
+                other_model, on, info, reference_id, order_by, limit
+            )
+        if as_list and strategy == "selectin":
+            if selectin := new_self.join_selectin(other_model, on, info, reference_id):
+                return selectin
+
         join_reference = ModelReference.new(
-            other_model, new_self, reference_id=reference_id
+            other_model,
+            new_self,
+            reference_id=reference_id,
         )
         join_name = f"joins_{join_reference.id}"
 
@@ -1431,7 +2633,13 @@ class ObjectSet(Generic[T, S]):
             or hasattr(other_model, "__group_by__")
             or hasattr(other_model, "__order_by__")
         ):
-            object_set = ObjectSet(model=other_model, conn=new_self.conn, info=info)
+            # Its own alias, the subquery can be correlated with a parent of the same model once pushed down.
+            object_set = ObjectSet(
+                model=other_model,
+                conn=new_self.conn,
+                info=info,
+                reference_id=f"{reference_id}_sub",
+            )
             if group_by := object_set.group_by_clause:
                 object_set.pk_selector = group_by
             else:
@@ -1449,6 +2657,7 @@ class ObjectSet(Generic[T, S]):
                 on=Value(False),  # Lazily build the onclause later...
                 object_set=object_set,
                 join_type=join_type,
+                many=as_list,
             )
 
             join_selection = ModelSelector(join_reference, join=join)
@@ -1461,8 +2670,18 @@ class ObjectSet(Generic[T, S]):
             on_clause = on(real_selector, join_selection)
 
             join.on = on_clause
-            new_self.joins[join_name] = join
-            new_self.sync_joins(on_clause)
+            if object_set is not None:
+                join.pushed_down = push_down(
+                    join, on(real_selector, object_set.model_selector)
+                )
+            if equivalent := new_self.equivalent_join(join):
+                # Another relation already joins the same rows, read them from its alias.
+                join_selection = ModelSelector(
+                    equivalent.model_reference, join=equivalent
+                )
+            else:
+                new_self.joins[join_name] = join
+                new_self.sync_joins(on_clause)
 
         if as_list:
             new_self.selection = ListSelector(join_selection)
@@ -1471,26 +2690,223 @@ class ObjectSet(Generic[T, S]):
         # self.sync_cache(new_self)
         return new_self
 
+    def equivalent_join(self, join: Join) -> Join | None:
+        if (signature := join_signature(join)) is None:
+            return None
+        for other in self.joins.values():
+            if join_signature(other) == signature:
+                return other
+
+    def join_lateral(
+        self,
+        other_model: Type[J],
+        on: Callable[[Selector[T], Selector[J]], Selector[bool] | bool],
+        info: Info,
+        reference_id: str,
+        order_by: Callable[[Selector[J]], OrderBySelector] | None = None,
+        limit: int | None = None,
+    ) -> Self:
+        object_set = ObjectSet(
+            model=other_model, conn=self.conn, info=info, reference_id=reference_id
+        )
+        join_name = f"joins_{object_set.model_reference.id}"
+        if isinstance(join := self.joins.get(join_name), LateralJoin):
+            self.selection = join.selector
+            return self
+        if order_by is not None:
+            object_set.order_by_clause = order_by(object_set.model_selector)
+            object_set.sync_joins(object_set.order_by_clause)
+        if limit is not None:
+            if object_set.order_by_clause is None:
+                # Without an order the limit would keep different rows from one query to the next.
+                object_set.order_by_clause = pk_selection(object_set.model_selector)
+            object_set.limit_clause = Value(limit)
+
+        if isinstance(self.selection, ListSelector):
+            real_selector = self.selection.inner_selector
+        else:
+            real_selector = self.selection
+        on_clause = on(real_selector, object_set.model_selector)
+        if object_set.where_clause is not None:
+            object_set.where_clause &= on_clause
+        else:
+            object_set.where_clause = on_clause
+
+        join = LateralJoin(
+            id=join_name,
+            model_reference=object_set.model_reference,
+            on=RawSQL("TRUE"),
+            object_set=object_set,
+            join_type="LEFT",
+            parent_joins=[
+                (join_id, parent_join, join_field)
+                for join_id, parent_join, join_field in joins(on_clause)
+                if join_id not in object_set.joins
+            ],
+        )
+        join.selector = LateralListSelector(object_set.model_selector, join)
+        self.joins[join_name] = join
+        self.selection = join.selector
+        return self
+
+    def join_selectin(
+        self,
+        other_model: Type[J],
+        on: Callable[[Selector[T], Selector[J]], Selector[bool] | bool],
+        info: Info,
+        reference_id: str,
+    ) -> Self | None:
+        object_set = ObjectSet(
+            model=other_model, conn=self.conn, info=info, reference_id=reference_id
+        )
+        if isinstance(self.selection, ListSelector):
+            real_selector = self.selection.inner_selector
+        else:
+            real_selector = self.selection
+        on_clause = on(real_selector, object_set.model_selector)
+        # Only a column equality can be turned into `child.key = ANY(%s)`, anything else is joined.
+        if not (
+            isinstance(on_clause, Computed)
+            and on_clause._op == "="
+            and len(on_clause._args) == 2
+            and all(isinstance(arg, ColumnSelector) for arg in on_clause._args)
+        ):
+            return None
+        parent_key, child_key = on_clause._args
+        if parent_key._model_reference is object_set.model_reference:
+            parent_key, child_key = child_key, parent_key
+        if (
+            child_key._model_reference is not object_set.model_reference
+            or parent_key._model_reference is object_set.model_reference
+        ):
+            return None
+        self.selection = SelectInListSelector(
+            object_set.model_selector, object_set, parent_key, child_key
+        )
+        self.sync_joins(parent_key)
+        return self
+
+    async def load_selectin(
+        self, selector: SelectInListSelector, parent_keys: dict[PkValue, SQLValue]
+    ):
+        """Load the children of every parent in `parent_keys` (parent pk -> key) in one query."""
+        children = selector.object_set.select(
+            lambda _: ListSelector(selector.inner_selector)
+        )
+        children.pk_selector = selector.child_key
+        keys_clause = PkIn(
+            selector.child_key, {key for key in parent_keys.values() if key is not None}
+        )
+        if children.where_clause is not None:
+            children.where_clause &= keys_clause
+        else:
+            children.where_clause = keys_clause
+        await children.load_cache()
+
+        self.row_cache = children.row_cache
+        self.positional_rows = children.positional_rows
+        self.cache_main_extractor = children.cache_main_extractor
+        self.cache_pk_extractor = children.cache_pk_extractor
+        self.cache = {
+            pk: children.cache.get(key, []) for pk, key in parent_keys.items()
+        }
+
     def __sql__(self, builder: SqlBuilder, join_fields: set[str] = None):
         return self.build_select_statement(builder, join_fields)
 
-    def build_select_statement(self, builder: SqlBuilder, join_fields: set[str] = None):
-        builder.write("SELECT ")
-        builder.wrote_alias = False
+    def plan_key(self) -> Hashable | None:
+        pk_key = cache_key(self.pk_selector)
+        selection_key = cache_key(self.selection)
+        if pk_key is None or selection_key is None:
+            return None
+        return self.model, self.model_reference.id, pk_key, selection_key
+
+    def build_pk_extractor(self, builder: SqlBuilder) -> Extractor | None:
         if pk_selections := self.pk_selector:
             if isinstance(pk_selections, tuple):
                 pk_extractors = []
                 for selection in pk_selections:  # type: ColumnSelector
                     pk_extractors.append(selection.__extractor__(builder))
-                pk_extractors = TupleExtractor(pk_extractors, None, None)
-            else:
-                pk_extractors = pk_selections.__extractor__(builder)
-        else:
-            pk_extractors = None
+                return TupleExtractor(pk_extractors, None, None)
+            return pk_selections.__extractor__(builder)
+
+    def build_cached_selection(
+        self, builder: SqlBuilder
+    ) -> tuple[Extractor, Extractor]:
+        key = self.plan_key()
+        if (plan := plan_cache.get(key)) and not plan.rebind:
+            builder.write(plan.sql)
+            builder.vars.extend(plan.vars)
+            builder.alias_count += plan.alias_count
+            builder.column_mappings |= plan.column_mappings
+            builder.columns |= plan.columns
+            builder.read_tables |= plan.read_tables
+            builder.wrote_alias = True
+            return plan.pk_extractor, plan.main_extractor
+
+        start_ns = time.perf_counter_ns()
+        start_q, start_vars, start_aliases = (
+            len(builder.q),
+            len(builder.vars),
+            builder.alias_count,
+        )
+        wrote_python_value, builder.wrote_python_value = (
+            builder.wrote_python_value,
+            False,
+        )
+        read_tables, builder.read_tables = builder.read_tables, set()
+        pk_extractor = self.build_pk_extractor(builder)
+        main_extractor = self.selection.__extractor__(builder)
+        if builder.wrote_python_value:
+            # Extractors of Python values return them as is, they'd be stale on the next request.
+            key = None
+        builder.wrote_python_value |= wrote_python_value
+        plan_tables, builder.read_tables = builder.read_tables, read_tables
+        read_tables |= plan_tables
+        if plan is not None and plan.sql == builder.q[start_q:]:
+            # Only the bound values changed, the extractors and their compiled hydrators are reused.
+            return plan.pk_extractor, plan.main_extractor
+        if key is not None:
+            detach_extractor(main_extractor)
+            if pk_extractor is not None:
+                detach_extractor(pk_extractor)
+        plan_cache.put(
+            key,
+            CompiledPlan(
+                sql=builder.q[start_q:],
+                vars=builder.vars[start_vars:],
+                pk_extractor=pk_extractor,
+                main_extractor=main_extractor,
+                alias_count=builder.alias_count - start_aliases,
+                column_mappings=dict(builder.column_mappings),
+                columns=dict(builder.columns),
+                read_tables=frozenset(plan_tables),
+                compile_ns=time.perf_counter_ns() - start_ns,
+                rebind=len(builder.vars) > start_vars,
+            ),
+        )
+        return pk_extractor, main_extractor
 
+    def build_select_statement(self, builder: SqlBuilder, join_fields: set[str] = None):
+        source = self.mutation_source
+        with_mutation = source is not None and source.pks is None
+        if with_mutation:
+            alias = self.model_reference.alias()
+            builder.write(f"WITH {alias}_changed AS (")
+            source.mutation.build_cte_statement(builder)
+            builder.write(") ")
+            if source.with_table:
+                builder.write(f", {alias}_found AS (SELECT * FROM ")
+                self.model_reference.__sql__(builder)
+                builder.write(f" UNION ALL SELECT * FROM {alias}_changed) ")
+            builder.read_tables = set()
+        statement_start = len(builder.q)
+        builder.write("SELECT ")
+        builder.wrote_alias = False
         if join_fields is None:
-            main_extractor = self.selection.__extractor__(builder)
+            pk_extractors, main_extractor = self.build_cached_selection(builder)
         else:
+            pk_extractors = self.build_pk_extractor(builder)
             main_extractor = TupleExtractor(
                 [
                     selection.__extractor__(builder)
@@ -1502,40 +2918,92 @@ class ObjectSet(Generic[T, S]):
 
         builder.write(" FROM ")
 
-        self.model_reference.__sql__(builder)
-        builder.write(" AS ")
-        builder.write(self.model_reference.alias())
-
-        for join_id, join in self.joins.items():
-            builder.write(" LEFT JOIN ")
-            join.__sql__(builder, self.join_fields[join_id])
-            builder.write(" AS ")
-            builder.write(join.model_reference.alias())
-            builder.write(" ON ")
-            join.on.__sql__(builder)
+        if with_mutation:
+            suffix = "found" if source.with_table else "changed"
+            builder.write(f"{self.model_reference.alias()}_{suffix}")
+            builder.write(f" AS {self.model_reference.alias()}")
+        elif source is not None and source.rows is not None:
+            Unnest(
+                self.model_reference.alias(),
+                list(columns(self.model, virtual=False)),
+                source.rows,
+            ).__sql__(builder)
+        else:
+            self.model_reference.__sql__(builder)
+            builder.write(f" AS {self.model_reference.alias()}")
 
-        if self.where_clause is not None:
-            builder.write(" WHERE ")
-            self.where_clause.__sql__(builder)
+        # The rest of the statement is written first, to know which joins it uses.
+        tail = builder.fork()
+        where_clause = self.where_clause
+        if (
+            source is not None
+            and not with_mutation
+            and not source.with_table
+            and source.rows is None
+        ):
+            pks_clause = PkIn(pk_selection(self.model_selector), source.pks)
+            if where_clause is not None:
+                where_clause &= pks_clause
+            else:
+                where_clause = pks_clause
+        if where_clause is not None:
+            tail.write(" WHERE ")
+            where_clause.__sql__(tail)
 
         if self.group_by_clause is not None:
-            builder.write(" GROUP BY ")
-            write_single_or_tuple(self.group_by_clause, builder)
+            tail.write(" GROUP BY ")
+            write_single_or_tuple(self.group_by_clause, tail)
 
         if self.order_by_clause is not None:
-            builder.write(" ORDER BY ")
-            write_single_or_tuple(self.order_by_clause, builder)
+            tail.write(" ORDER BY ")
+            write_single_or_tuple(self.order_by_clause, tail)
 
         if self.offset_clause is not None:
-            builder.write(" OFFSET ")
-            write_single_or_tuple(self.offset_clause, builder)
+            tail.write(" OFFSET ")
+            write_single_or_tuple(self.offset_clause, tail)
 
         if self.limit_clause is not None:
-            builder.write(" LIMIT ")
-            write_single_or_tuple(self.limit_clause, builder)
+            tail.write(" LIMIT ")
+            write_single_or_tuple(self.limit_clause, tail)
 
+        builder.alias_count = tail.alias_count
+        join_builders = {}
+        for join_id, join in self.joins.items():
+            join_builder = join_builders[join_id] = builder.fork()
+            join.write_join(join_builder, self.join_fields[join_id])
+
+        used = self.used_joins(
+            builder.q[statement_start:] + tail.q,
+            {join_id: b.q for join_id, b in join_builders.items()},
+        )
+        for join_id, join_builder in join_builders.items():
+            if join_id in used:
+                builder.append(join_builder)
+        builder.append(tail)
         return pk_extractors, main_extractor
 
+    def used_joins(self, sql: str, join_sql: dict[str, str]) -> set[str]:
+        """
+        Prune the joins nothing reads from. A join is kept when `sql`, or the SQL of a kept join, references its
+        alias, or when it changes the rows of the statement: inner joins, and joins that can match several rows
+        per parent row.
+        """
+        used = set()
+        pending = [sql]
+        while pending:
+            referencing = pending.pop()
+            for join_id, join in self.joins.items():
+                if join_id in used:
+                    continue
+                if (
+                    join.many
+                    or join.join_type == "INNER"
+                    or references_alias(referencing, join.model_reference.alias())
+                ):
+                    used.add(join_id)
+                    pending.append(join_sql[join_id])
+        return used
+
     async def as_list(self) -> list[V]:
         await self.load_cache()
         return list(self.cache.values())
@@ -1554,13 +3022,111 @@ class ObjectSet(Generic[T, S]):
 
         return aiter(f())
 
+    async def stream(self, batch_size: int = 1000) -> AsyncIterator[V]:
+        """
+        Iterate over the results with a server side cursor, fetching and hydrating `batch_size` rows at a time
+        without filling the ObjectSet's caches. The cursor's transaction stays open until the iteration ends,
+        so close the generator when breaking out early, e.g. with `contextlib.aclosing`.
+        """
+        if self.row_cache is not None:
+            for elem in self.cache.values():
+                yield elem
+            return
+        if self.reverse_rows:
+            raise RhubarbException(
+                "Rows read backward can't be streamed, use `as_list` or reverse the `order_by`"
+            )
+
+        await self.run_mutation_source()
+        object_set = self
+        if self.pk_selector is not None and any(
+            join.many for join in self.joins.values()
+        ):
+            # Rows sharing a pk are only merged when they are adjacent, which list joins don't guarantee.
+            object_set = self.clone()
+            order_by = self.order_by_clause
+            if order_by is None:
+                order_by = ()
+            elif not isinstance(order_by, tuple):
+                order_by = (order_by,)
+            pk = self.pk_selector
+            object_set.order_by_clause = order_by + (
+                pk if isinstance(pk, tuple) else (pk,)
+            )
+        builder = SqlBuilder()
+        pk_extractor, main_extractor = object_set.build_select_statement(builder)
+        positional = (
+            pk_extractor.supports_positional() and main_extractor.supports_positional()
+        )
+        extract_pk, pk_is_async = pk_extractor.hydrator(positional)
+        extract_value, value_is_async = main_extractor.root_hydrator(positional)
+        async with self.conn.transaction():
+            async with self.conn.cursor(
+                name=f"stream_{new_ref_id()}",
+                row_factory=tuple_row if positional else dict_row,
+            ) as cur:
+                cur.itersize = batch_size
+                await cur.execute(builder.q, builder.vars)
+                group, group_pk = None, None
+                async for row in cur:
+                    pk = extract_pk(row)
+                    if pk_is_async:
+                        pk = await pk
+                    value = extract_value(row)
+                    if value_is_async or inspect.isawaitable(value):
+                        value = await value
+                    if group is not None and pk != group_pk:
+                        for elem in group.values():
+                            yield elem
+                        group = None
+                    if group is None:
+                        group, group_pk = main_extractor.reset_cache(), pk
+                    main_extractor.add_to_cache(group, pk, value)
+                if group is not None:
+                    for elem in group.values():
+                        yield elem
+
     async def count(self) -> int:
+        await self.run_mutation_source()
         new_self = self.clone()
+        new_self.order_by_clause = None
         raw = RawSQL("COUNT(*)")
         new_self.pk_selector = raw
         return await new_self.select(lambda x: raw).one()
 
+    async def estimated_count(self) -> int:
+        """
+        The planner's estimate of `count()` without reading the rows: `pg_class.reltuples` for a whole table,
+        otherwise the rows `EXPLAIN` expects the query to return.
+        """
+        if self.mutation_source is not None:
+            return await self.count()
+        async with self.conn.cursor(row_factory=tuple_row) as cur:
+            if (
+                self.where_clause is None
+                and self.group_by_clause is None
+                and self.limit_clause is None
+                and self.offset_clause is None
+            ):
+                builder = SqlBuilder()
+                self.model_reference.__sql__(builder)
+                await cur.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [builder.q],
+                )
+                # -1 until the table has been vacuumed or analyzed.
+                if (row := await cur.fetchone()) and row[0] >= 0:
+                    return row[0]
+
+            builder = SqlBuilder()
+            builder.write("EXPLAIN (FORMAT JSON) ")
+            self.build_select_statement(builder)
+            await cur.execute(builder.q, builder.vars)
+            (plan,) = await cur.fetchone()
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     async def exists(self) -> bool:
+        await self.run_mutation_source()
         new_self = self.clone()
         raw = RawSQL("TRUE")
         new_self.pk_selector = raw
@@ -1581,21 +3147,302 @@ class ObjectSet(Generic[T, S]):
             if self.row_cache is None:
                 await self.load_data()
 
+    def from_mutation(self, mutation: MutationSet, with_table=False) -> Self:
+        """
+        Read the rows changed by `mutation`. It runs at most once for this ObjectSet and its clones, in a
+        `WITH` query together with the selection when it can. With `with_table` the rows already in the table
+        are read too, as if `mutation` (an insert) had run before the selection.
+        """
+        new_self = self.clone()
+        new_self.mutation_source = MutationSource(mutation, with_table)
+        return new_self
+
+    def reads_mutated_table(self, builder: SqlBuilder) -> bool:
+        # Data-modifying `WITH` queries run against the snapshot taken before the statement, so joins and
+        # correlated subqueries reading the mutated table would miss its changes.
+        mutated = SqlBuilder()
+        self.mutation_source.mutation.model_reference.__sql__(mutated)
+        return mutated.q in builder.read_tables
+
+    async def run_mutation_source(self):
+        source = self.mutation_source
+        if source is not None and source.pks is None:
+            if source.mutation.removes_rows:
+                # Removed rows can't be selected by pk afterwards, they're read from what RETURNING gave back.
+                removed = await source.mutation.returning_objects()
+                source.rows = [
+                    tuple(
+                        getattr(obj, col.name)
+                        for col in columns(self.model, virtual=False)
+                    )
+                    for obj in removed
+                ]
+                source.pks = [pk_concrete(obj) for obj in removed]
+            else:
+                source.pks = await source.mutation.returning_pks()
+
     async def load_data(self):
+        selectin = unwrap_selector(self.selection)
+        if (
+            isinstance(selectin, SelectInListSelector)
+            and self.selectin_keys is not None
+        ):
+            await self.load_selectin(selectin, self.selectin_keys)
+            return
+
+        source = self.mutation_source
+        if source is not None and source.pks is None:
+            if (
+                hasattr(self.model, "__group_by__")
+                or not source.mutation.supports_cte()
+            ):
+                await self.run_mutation_source()
+
         builder = SqlBuilder()
         pk_extractor, main_extractor = self.build_select_statement(builder)
-        async with self.conn.cursor(row_factory=dict_row) as cur:
-            await cur.execute(builder.q, builder.vars)
-            self.row_cache = []
-            self.cache = main_extractor.reset_cache()
-            self.cache_main_extractor = main_extractor
-            self.cache_pk_extractor = pk_extractor
-            async for row in cur:
-                pk = await pk_extractor.extract(row)
+        if source is not None and source.pks is None:
+            if self.reads_mutated_table(builder):
+                await self.run_mutation_source()
+                builder = SqlBuilder()
+                pk_extractor, main_extractor = self.build_select_statement(builder)
+        positional = (
+            pk_extractor.supports_positional() and main_extractor.supports_positional()
+        )
+        row_factory = tuple_row if positional else dict_row
+        async with self.conn.cursor(row_factory=row_factory) as cur:
+            await cur.execute(builder.q, builder.vars, prepare=self.prepare_statement)
+            await self.fill_cache(cur, pk_extractor, main_extractor, positional)
+            if source is not None and source.pks is None:
+                source.pks = [pk for pk, _ in self.row_cache]
+
+        if isinstance(selectin, SelectInListSelector):
+            # The rows were the parents' keys, now load the children for them.
+            await self.load_selectin(selectin, dict(self.cache))
+
+    async def fill_cache(
+        self,
+        cur: AsyncCursor,
+        pk_extractor: Extractor,
+        main_extractor: Extractor,
+        positional: bool,
+    ):
+        self.row_cache = []
+        self.positional_rows = positional
+        self.cache = main_extractor.reset_cache()
+        self.cache_main_extractor = main_extractor
+        self.cache_pk_extractor = pk_extractor
+        extract_pk, pk_is_async = pk_extractor.hydrator(positional)
+        extract_value, value_is_async = main_extractor.root_hydrator(positional)
+        async for row in cur:
+            pk = extract_pk(row)
+            if pk_is_async:
+                pk = await pk
+
+            self.row_cache.append((pk, row))
+        if self.reverse_rows:
+            self.row_cache = reverse_row_groups(self.row_cache)
+        for pk, row in self.row_cache:
+            value = extract_value(row)
+            if value_is_async or inspect.isawaitable(value):
+                value = await value
+            main_extractor.add_to_cache(self.cache, pk, value)
+
+
+async def load_pipelined(conn: AsyncConnection, object_sets: list[ObjectSet]):
+    """
+    Load ObjectSets in one round trip with psycopg's pipeline mode. ObjectSets that need more than one
+    statement, to run a mutation or the second query of a selectin relation, are loaded on their own.
+    """
+    pipelined, separate = [], []
+    for object_set in object_sets:
+        if object_set.row_cache is not None:
+            continue
+        if object_set.mutation_source is not None or isinstance(
+            unwrap_selector(object_set.selection), SelectInListSelector
+        ):
+            separate.append(object_set)
+        else:
+            pipelined.append(object_set)
+    if len(pipelined) < 2 or not Pipeline.is_supported():
+        separate.extend(pipelined)
+        pipelined = []
+
+    if pipelined:
+        async with conn.pipeline():
+            loads = []
+            for object_set in pipelined:
+                builder = SqlBuilder()
+                pk_extractor, main_extractor = object_set.build_select_statement(
+                    builder
+                )
+                positional = (
+                    pk_extractor.supports_positional()
+                    and main_extractor.supports_positional()
+                )
+                cur = conn.cursor(row_factory=tuple_row if positional else dict_row)
+                await cur.execute(
+                    builder.q, builder.vars, prepare=object_set.prepare_statement
+                )
+                loads.append(
+                    (object_set, cur, pk_extractor, main_extractor, positional)
+                )
+
+            for object_set, cur, pk_extractor, main_extractor, positional in loads:
+                async with cur:
+                    await object_set.fill_cache(
+                        cur, pk_extractor, main_extractor, positional
+                    )
+
+    for object_set in separate:
+        await object_set.load_cache()
+
+
+def pipeline(conn: AsyncConnection):
+    if Pipeline.is_supported():
+        return conn.pipeline()
+    return contextlib.nullcontext()
+
+
+class MutationBatch:
+    """
+    Queues the statements of mutations on one connection and sends them together in psycopg's pipeline
+    mode. Calls that are queued in the same turn of the event loop share a round trip and an implicit
+    transaction, so if one statement fails every call in the flush raises. Errors that weren't retrieved, by
+    awaiting the call or its future, are raised again when the `batch` block exits, so mutations that were
+    queued and never awaited can't fail silently.
+    """
+
+    def __init__(self, conn: AsyncConnection):
+        self.conn = conn
+        self.pending: list[tuple[MutationSet, list, Any, asyncio.Future]] = []
+        self.flush_task: asyncio.Task | None = None
+        self.lock = asyncio.Lock()
+        self.failed: list[asyncio.Future] = []
+
+    def add(self, mutation_set: MutationSet, one=None) -> asyncio.Future:
+        """Queue `mutation_set` without waiting, the future resolves to what `execute` would return."""
+        if mutation_set.conn is not self.conn:
+            raise RhubarbException("Batched mutations must use the batch's connection.")
+        return self.enqueue(mutation_set, mutation_set.statements(), one)
+
+    def enqueue(
+        self, mutation_set: MutationSet, statements: list, one
+    ) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((mutation_set, statements, one, future))
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_soon())
+        return future
+
+    async def flush_soon(self):
+        # Let mutations queued by concurrent tasks join this flush.
+        await asyncio.sleep(0)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            pending, self.pending = self.pending, []
+            if not pending:
+                return
+            results = []
+            try:
+                async with pipeline(self.conn):
+                    sent = [
+                        (mutation_set, await mutation_set.send_statements(statements))
+                        for mutation_set, statements, _, _ in pending
+                    ]
+                    for (mutation_set, cursors), (_, _, one, _) in zip(sent, pending):
+                        results.append(
+                            await mutation_set.fetch_statements(cursors, one)
+                        )
+            except Exception as e:
+                for *_, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                        self.failed.append(future)
+                return
+            for (*_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def unretrieved_error(self) -> Exception | None:
+        """The first error of a failed future that nobody awaited, retrieving them so asyncio doesn't warn."""
+        error = None
+        for future in self.failed:
+            # Set by asyncio until the exception is retrieved with `await`, `result()` or `exception()`.
+            if future._log_traceback:
+                error = error or future.exception()
+        return error
+
+    def discard(self):
+        pending, self.pending = self.pending, []
+        for *_, future in pending:
+            future.cancel()
+
+
+# The strategies of the ObjectSet whose selection is being built, relations read them when they're resolved.
+relation_strategies: ContextVar[dict[str, RELATION_STRATEGIES] | None] = ContextVar(
+    "relation_strategies", default=None
+)
+
+
+@contextlib.contextmanager
+def loading_relations(strategies: dict[str, RELATION_STRATEGIES]):
+    token = relation_strategies.set(strategies)
+    try:
+        yield
+    finally:
+        relation_strategies.reset(token)
+
+
+mutation_batch: ContextVar[MutationBatch | None] = ContextVar(
+    "mutation_batch", default=None
+)
+
+
+def current_batch(conn: AsyncConnection) -> MutationBatch | None:
+    active = mutation_batch.get()
+    if active is not None and active.conn is conn:
+        return active
+    return None
 
-                self.row_cache.append((pk, row))
-                value = await main_extractor.extract(row)
-                main_extractor.add_to_cache(self.cache, pk, value)
+
+@contextlib.asynccontextmanager
+async def batch(conn: AsyncConnection) -> AsyncIterator[MutationBatch]:
+    """
+    Send the mutations executed on `conn` inside the block in pipeline mode. Concurrent `execute` calls, and
+    mutations queued with `add`, go out in one round trip. Whatever is still queued is sent when the block
+    exits, and the first error that no awaited call or future retrieved is raised then.
+    Nested blocks on the same connection join the outer batch.
+    """
+    if (active := current_batch(conn)) is not None:
+        yield active
+        return
+    new_batch = MutationBatch(conn)
+    token = mutation_batch.set(new_batch)
+    try:
+        yield new_batch
+    except BaseException:
+        new_batch.discard()
+        raise
+    finally:
+        mutation_batch.reset(token)
+        await new_batch.flush()
+        if new_batch.flush_task is not None:
+            await new_batch.flush_task
+        error = new_batch.unretrieved_error()
+    if error is not None:
+        raise error
+
+
+class MutationSource:
+    def __init__(self, mutation: MutationSet, with_table=False):
+        self.mutation = mutation
+        self.with_table = with_table
+        self.pks: list | None = None
+        # The rows returned by mutations that remove them.
+        self.rows: list[tuple] | None = None
 
 
 class MutationSet:
@@ -1603,38 +3450,135 @@ class MutationSet:
     model: Type[SqlModel]
     conn: AsyncConnection
     _one: bool
+    prepare_statement: bool | None = None
+    # Whether the changed rows are gone after the mutation, so they can't be selected again.
+    removes_rows = False
+
+    def prepared(self, prepare: bool | None = True) -> Self:
+        new_self = copy.copy(self)
+        new_self.prepare_statement = prepare
+        return new_self
 
     async def as_object_set(self, info):
-        self.returning = ModelSelector(
-            self.model_reference,
-            selected_fields=[
-                SelectedField(name=n, arguments={}, directives={}, selections=[])
-                for n in pk_column_names(self.model)
-            ],
+        object_set = ObjectSet(self.model, self.conn, info, one=self._one).prepared(
+            self.prepare_statement
         )
-        objects = await self.execute()
-        if self._one:
-            pks = [pk_concrete(objects)]
-        else:
-            pks = [pk_concrete(obj) for obj in objects]
-        return ObjectSet(self.model, self.conn, info, one=self._one).where(
-            lambda obj: func("IN", pk_selection(obj), func("", *pks), infixed=True)
+        object_set = object_set.from_mutation(self)
+        if not MUTATION_CTE:
+            await object_set.run_mutation_source()
+        return object_set
+
+    def with_returning(self, returning: Selector) -> Self:
+        new_self = copy.copy(self)
+        new_self.returning = returning
+        return new_self
+
+    async def returning_objects(self) -> list:
+        mutation = self.with_returning(ModelSelector(self.model_reference))
+        return await mutation.execute(one=False)
+
+    async def returning_pks(self) -> list:
+        mutation = self.with_returning(
+            ModelSelector(
+                self.model_reference,
+                selected_fields=[
+                    SelectedField(name=n, arguments={}, directives={}, selections=[])
+                    for n in pk_column_names(self.model)
+                ],
+            )
         )
+        objects = await mutation.execute(one=False)
+        return [pk_concrete(obj) for obj in objects]
+
+    def supports_cte(self) -> bool:
+        return True
+
+    def build_cte_statement(self, builder: SqlBuilder):
+        """Write the mutation as a single statement returning whole rows, to be read from a `WITH` query."""
+        self.with_returning(AllColumns(self.model_reference)).build_statement(builder)
 
     async def do_execute(self, builder, returning_extractor, one):
         if returning_extractor is not None:
-            async with self.conn.cursor(row_factory=dict_row) as cur:
-                await cur.execute(builder.q, builder.vars)
+            positional = returning_extractor.supports_positional()
+            row_factory = tuple_row if positional else dict_row
+            async with self.conn.cursor(row_factory=row_factory) as cur:
+                await cur.execute(
+                    builder.q, builder.vars, prepare=self.prepare_statement
+                )
                 return_rows = []
-                async for row in cur:
-                    value = await returning_extractor.extract(row)
-                    if one or one is None and self._one:
-                        return value
-                    return_rows.append(value)
+                if await self.fetch_returning(
+                    cur, returning_extractor, positional, one, return_rows
+                ):
+                    return return_rows[0]
                 return return_rows
         else:
-            await self.conn.execute(builder.q, builder.vars)
+            await self.conn.execute(
+                builder.q, builder.vars, prepare=self.prepare_statement
+            )
+
+    async def fetch_returning(
+        self, cur, returning_extractor, positional, one, return_rows: list
+    ) -> bool:
+        """Hydrate the rows of `cur` into `return_rows`, returns True once the single requested row is found."""
+        extract_value, value_is_async = returning_extractor.root_hydrator(positional)
+        async for row in cur:
+            value = extract_value(row)
+            if value_is_async or inspect.isawaitable(value):
+                value = await value
+            return_rows.append(value)
+            if one or one is None and self._one:
+                return True
+        return False
+
+    async def execute_statements(
+        self, statements: list[tuple[SqlBuilder, Extractor | None]], one
+    ):
+        """Run several statements in one pipeline and concatenate what they return."""
+        if (mutation_batch := current_batch(self.conn)) is not None:
+            return await mutation_batch.enqueue(self, statements, one)
+        if len(statements) == 1:
+            return await self.do_execute(*statements[0], one)
+
+        # A transaction, so the statements of a chunked insert apply all together or not at all.
+        async with pipeline(self.conn), self.conn.transaction():
+            cursors = await self.send_statements(statements)
+            return await self.fetch_statements(cursors, one)
+
+    def input_order(self, results: list) -> list:
+        """Put the rows returned by several statements back in the order of the mutation's input."""
+        return results
+
+    async def send_statements(
+        self, statements: list[tuple[SqlBuilder, Extractor | None]]
+    ) -> list[tuple[AsyncCursor, Extractor | None, bool]]:
+        cursors = []
+        for builder, returning_extractor in statements:
+            positional = (
+                returning_extractor is not None
+                and returning_extractor.supports_positional()
+            )
+            cur = self.conn.cursor(row_factory=tuple_row if positional else dict_row)
+            await cur.execute(builder.q, builder.vars, prepare=self.prepare_statement)
+            cursors.append((cur, returning_extractor, positional))
+        return cursors
 
+    async def fetch_statements(
+        self, cursors: list[tuple[AsyncCursor, Extractor | None, bool]], one
+    ):
+        results = []
+        for cur, returning_extractor, positional in cursors:
+            async with cur:
+                if returning_extractor is not None:
+                    await self.fetch_returning(
+                        cur, returning_extractor, positional, False, results
+                    )
+
+        if cursors[0][1] is None:
+            return None
+        results = self.input_order(results)
+        if one or one is None and self._one:
+            return results[0] if results else results
+        return results
 
     @overload
     async def execute(self) -> list[V]:
@@ -1645,14 +3589,137 @@ class MutationSet:
         ...
 
     async def execute(self, one=None):
+        return await self.execute_statements(self.statements(), one)
+
+    def statements(self) -> list[tuple[SqlBuilder, Extractor | None]]:
         builder = SqlBuilder()
-        returning_extractor = self.build_statement(builder)
-        return await self.do_execute(builder, returning_extractor, one)
+        return [(builder, self.build_statement(builder))]
 
     def build_statement(self, builder: SqlBuilder) -> Extractor:
         raise NotImplementedError
 
 
+MUTATION_CTE = bool_env("MUTATION_CTE", True)
+INSERT_METHODS = Literal["insert", "unnest", "copy"]
+# Inserts are only split into several statements when a chunk size is set.
+INSERT_CHUNK_SIZE = int_env("INSERT_CHUNK_SIZE")
+COPY_TYPE_NAMES = {"float": "float8", "serial": "int4"}
+COPY_POSITION = "rhubarb_copy_position"
+SCALAR_TYPE_NAMES = {
+    "SERIAL": "INTEGER",
+    "BIGSERIAL": "BIGINT",
+    "SMALLSERIAL": "SMALLINT",
+}
+
+
+def scalar_type(sql_type: SqlType) -> str:
+    return SCALAR_TYPE_NAMES.get(sql_type.sql.upper(), sql_type.sql)
+
+
+def array_type(sql_type: SqlType) -> str:
+    return f"{scalar_type(sql_type)}[]"
+
+
+CURSOR_TYPES = {
+    "datetime": (
+        datetime.datetime,
+        datetime.datetime.isoformat,
+        datetime.datetime.fromisoformat,
+    ),
+    "date": (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    "time": (datetime.time, datetime.time.isoformat, datetime.time.fromisoformat),
+    "timedelta": (
+        datetime.timedelta,
+        lambda v: [v.days, v.seconds, v.microseconds],
+        lambda v: datetime.timedelta(*v),
+    ),
+    "decimal": (decimal.Decimal, str, decimal.Decimal),
+    "uuid": (uuid.UUID, str, uuid.UUID),
+    "bytes": (
+        bytes,
+        lambda v: base64.urlsafe_b64encode(v).decode(),
+        lambda v: base64.urlsafe_b64decode(v.encode()),
+    ),
+}
+
+
+def dump_cursor_value(v: Any) -> Any:
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    # `datetime` is a `date`, so the first matching type wins.
+    for tag, (cls, dump, _load) in CURSOR_TYPES.items():
+        if isinstance(v, cls):
+            return {"t": tag, "v": dump(v)}
+    raise RhubarbException(f"Can't make a cursor from {type(v).__name__} values")
+
+
+def load_cursor_value(v: Any) -> Any:
+    if isinstance(v, dict):
+        _cls, _dump, load = CURSOR_TYPES[v["t"]]
+        return load(v["v"])
+    return v
+
+
+def reverse_row_groups(rows: list[tuple[Any, Any]]) -> list[tuple[Any, Any]]:
+    # Rows sharing a pk come from joined list relations, keep their order.
+    groups = []
+    for pk, row in rows:
+        if groups and groups[-1][0][0] == pk:
+            groups[-1].append((pk, row))
+        else:
+            groups.append([(pk, row)])
+    return [row for group in reversed(groups) for row in group]
+
+
+def bulk_value(
+    v: Any, sql_type: SqlType, timezone: datetime.tzinfo | None = None
+) -> Any:
+    if isinstance(v, (dict, list)):
+        return Jsonb(v, dumps=uuid_dumps)
+    elif isinstance(v, datetime.datetime) and v.tzinfo is None:
+        # Binary COPY needs aware datetimes, naive ones are in `timezone`, the session's like with INSERT.
+        if timezone is not None and sql_type.sql.upper() == "TIMESTAMPTZ":
+            return v.replace(tzinfo=timezone)
+    elif isinstance(v, phonenumbers.PhoneNumber):
+        return str(v)
+    elif hasattr(v, "__sql_value__"):
+        return v.__sql_value__()
+    return v
+
+
+@dataclasses.dataclass
+class OnConflict:
+    target: str | list[str] | None
+    update_columns: list[str]
+
+    def __sql__(self, builder: SqlBuilder):
+        builder.write(" ON CONFLICT")
+        if isinstance(self.target, str):
+            builder.write(f" ON CONSTRAINT {self.target}")
+        elif self.target:
+            builder.write(f" ({', '.join(self.target)})")
+        if self.update_columns:
+            builder.write(" DO UPDATE SET ")
+            builder.write(
+                ", ".join(f"{col} = EXCLUDED.{col}" for col in self.update_columns)
+            )
+        else:
+            builder.write(" DO NOTHING")
+
+
+def selector_column_names(selectors) -> list[str]:
+    if not isinstance(selectors, (tuple, list)):
+        selectors = (selectors,)
+    column_names = []
+    for selector in selectors:
+        if not isinstance(selector, ColumnSelector) or selector._field.virtual:
+            raise RhubarbException(
+                f"Conflict targets must be non-virtual columns. Got {selector}"
+            )
+        column_names.append(selector._field.column_name)
+    return column_names
+
+
 class InsertSet(MutationSet, Generic[T, V]):
     def __init__(
         self,
@@ -1662,6 +3729,9 @@ class InsertSet(MutationSet, Generic[T, V]):
         values: list[tuple[V, ...]],
         one=False,
         returning: Selector[V] | None = None,
+        method: INSERT_METHODS = "insert",
+        defaults: dict[ColumnField, Any] | None = None,
+        chunk_size: int | None = None,
     ):
         if not values:
             raise RhubarbException(f"Nothing to insert.")
@@ -1672,24 +3742,331 @@ class InsertSet(MutationSet, Generic[T, V]):
         self.columns = columns
         self.values = values
         self.returning = returning
+        self.method = method
+        self.defaults = defaults or {}
+        self.chunk_size = chunk_size or INSERT_CHUNK_SIZE
+        self.conflict: OnConflict | None = None
+        self.guard: ObjectSet | None = None
         self._one = one
 
-    def start_sql_statement(self, builder: SqlBuilder):
+    def unless_exists(self, object_set: "ObjectSet") -> Self:
+        """
+        Insert nothing when `object_set` has rows, checked in the same statement with `INSERT ... SELECT ...
+        WHERE NOT EXISTS`. Only single row inserts with the "insert" method can be guarded.
+        """
+        if len(self.values) != 1 or self.method != "insert":
+            raise RhubarbException(
+                "Only single row inserts with the insert method can be guarded."
+            )
+        raw = RawSQL("TRUE")
+        guard = object_set.clone()
+        guard.pk_selector = raw
+        self.guard = guard.select(lambda x: raw)
+        return self
+
+    def on_conflict(
+        self,
+        target: str
+        | Callable[[ModelSelector], Selector | tuple[Selector, ...]]
+        | None = None,
+        do_update: Iterable[str] | bool = False,
+        do_nothing: bool = False,
+    ) -> Self:
+        """
+        Add an `ON CONFLICT` clause. `target` is the name of a unique constraint from `__constraints__` (or the
+        `{table}_pk` constraint), a function selecting the conflicting columns, or None for the primary key.
+        `do_update` lists the fields to overwrite from `EXCLUDED`, True overwrites every inserted column
+        except the conflict columns.
+        """
+        if bool(do_update) == do_nothing:
+            raise RhubarbException(
+                "on_conflict needs exactly one of do_update or do_nothing."
+            )
+        model_selector = ModelSelector(self.model_reference)
+        pks = pk_columns(self.model)
+        pk_names = [
+            pk.column_name for pk in (pks if isinstance(pks, tuple) else (pks,))
+        ]
+        target_columns = pk_names
+        if isinstance(target, str):
+            if target != f"{self.model.__table__}_pk":
+                constraints = {}
+                if hasattr(self.model, "__constraints__"):
+                    constraints = self.model.__constraints__(model_selector)
+                constraint = constraints.get(target)
+                if constraint is None or not constraint.unique:
+                    raise RhubarbException(
+                        f"{target} is not a unique constraint of {self.model}"
+                    )
+                try:
+                    target_columns = selector_column_names(constraint.check)
+                except RhubarbException:
+                    if do_update:
+                        raise RhubarbException(
+                            f"Can't update on conflict with {target}, its check is not a column or a "
+                            f"tuple of columns."
+                        )
+            conflict_target = target
+        elif target is not None:
+            target_columns = conflict_target = selector_column_names(
+                target(model_selector)
+            )
+        elif do_update:
+            conflict_target = target_columns
+        else:
+            conflict_target = None
+
+        insert_columns = [col for col in self.columns if not col.virtual]
+        insert_columns += list(self.defaults)
+        if do_update is True:
+            update_columns = [
+                col.column_name
+                for col in insert_columns
+                if col.column_name not in target_columns
+                and col.column_name not in pk_names
+            ]
+        elif do_update:
+            update_columns = [
+                get_column(self.model, name).column_name for name in do_update
+            ]
+            inserted = {col.column_name for col in insert_columns}
+            for column_name in update_columns:
+                if column_name not in inserted:
+                    raise RhubarbException(
+                        f"Cannot update {column_name} on conflict, it is not inserted."
+                    )
+        else:
+            update_columns = []
+        if do_update and not update_columns:
+            raise RhubarbException("No columns to update on conflict.")
+        self.conflict = OnConflict(conflict_target, update_columns)
+        return self
+
+    async def execute(self, one=None):
+        if self.method == "copy":
+            return await self.execute_copy(one)
+        return await self.execute_statements(self.statements(), one)
+
+    def statements(self) -> list[tuple[SqlBuilder, Extractor | None]]:
+        if self.method == "copy":
+            raise RhubarbException("Inserts with COPY can't be sent in a batch.")
+        statements = []
+        if self.method == "unnest":
+            for set_idxs, rows in self.row_groups().items():
+                columns = [self.columns[i] for i in set_idxs]
+                for chunk in self.chunks(rows):
+                    builder = SqlBuilder()
+                    extractor = self.build_unnest_statement(builder, columns, chunk)
+                    statements.append((builder, extractor))
+        else:
+            for chunk in self.chunks(self.values):
+                builder = SqlBuilder()
+                extractor = self.build_statement(builder, chunk)
+                statements.append((builder, extractor))
+        return statements
+
+    def supports_cte(self) -> bool:
+        if self.chunk_size and len(self.values) > self.chunk_size:
+            return False
+        if self.method == "unnest":
+            return len(self.row_groups()) == 1
+        return self.method == "insert"
+
+    def build_cte_statement(self, builder: SqlBuilder):
+        mutation = self.with_returning(AllColumns(self.model_reference))
+        if self.method == "unnest":
+            [(set_idxs, rows)] = self.row_groups().items()
+            columns = [self.columns[i] for i in set_idxs]
+            mutation.build_unnest_statement(builder, columns, rows)
+        else:
+            mutation.build_statement(builder)
+
+    def chunks(self, rows: list[tuple]) -> Iterator[list[tuple]]:
+        if not self.chunk_size:
+            yield rows
+            return
+        for i in range(0, len(rows), self.chunk_size):
+            yield rows[i : i + self.chunk_size]
+
+    def position_groups(self) -> dict[tuple[int, ...], list[int]]:
+        """
+        Group the positions of the rows by the indexes of the columns they set, so UNSET columns can be left
+        out and get their defaults.
+        """
+        groups: defaultdict[tuple[int, ...], list[int]] = defaultdict(list)
+        for position, row in enumerate(self.values):
+            set_idxs = tuple(i for i, v in enumerate(row) if not isinstance(v, Unset))
+            groups[set_idxs].append(position)
+        return groups
+
+    def row_groups(
+        self, timezone: datetime.tzinfo | None = None
+    ) -> dict[tuple[int, ...], list[tuple]]:
+        """The rows of `position_groups`, converted to what bulk loads can send for their column types."""
+        column_types = [col.column_type for col in self.columns]
+        return {
+            set_idxs: [
+                tuple(
+                    bulk_value(self.values[position][i], column_types[i], timezone)
+                    for i in set_idxs
+                )
+                for position in positions
+            ]
+            for set_idxs, positions in self.position_groups().items()
+        }
+
+    def input_order(self, results: list) -> list:
+        if self.method != "unnest":
+            return results
+        positions = [p for group in self.position_groups().values() for p in group]
+        if len(results) != len(positions):
+            # Rows skipped on conflict can't be matched to their position.
+            return results
+        ordered = [None] * len(results)
+        for position, result in zip(positions, results):
+            ordered[position] = result
+        return ordered
+
+    def write_insert_into(self, builder: SqlBuilder, columns: list[ColumnField]):
         builder.write("INSERT INTO ")
         self.model_reference.__sql__(builder)
         builder.write(" AS ")
         builder.write(self.model_reference.alias())
-        wrote_val = False
-        builder.write(" (")
-        for column_field in self.columns:
-            if not column_field.virtual:
-                if wrote_val:
-                    builder.write(", ")
-                wrote_val = True
-                builder.write(column_field.column_name)
-        builder.write(") VALUES ")
+        column_names = [col.column_name for col in columns if not col.virtual]
+        column_names += [col.column_name for col in self.defaults]
+        builder.write(f" ({', '.join(column_names)})")
+
+    def write_returning(self, builder: SqlBuilder) -> Extractor | None:
+        if self.conflict is not None:
+            self.conflict.__sql__(builder)
+        if self.returning is not None:
+            builder.write(" RETURNING ")
+            return self.returning.__extractor__(builder)
+
+    def build_unnest_statement(
+        self, builder: SqlBuilder, columns: list[ColumnField], rows: list[tuple]
+    ) -> Extractor | None:
+        self.write_insert_into(builder, columns)
+        builder.write(" SELECT *")
+        for column_field, v in self.defaults.items():
+            builder.write(", ")
+            builder.write_value(v, column_field.column_type)
+        builder.write(" FROM UNNEST(")
+        for i, column_field in enumerate(columns):
+            if i:
+                builder.write(", ")
+            builder.write(f"%s::{array_type(column_field.column_type)}")
+            builder.vars.append([row[i] for row in rows])
+        builder.write(")")
+        return self.write_returning(builder)
+
+    async def execute_copy(self, one=None):
+        """
+        Load the rows with `COPY ... FROM STDIN`. With `returning` or `on_conflict`, rows are copied to a temp
+        table first and moved over with `INSERT ... SELECT ... RETURNING`.
+        """
+        builder = SqlBuilder()
+        self.model_reference.__sql__(builder)
+        table = builder.q
+        columns = [col for col in self.columns if not col.virtual]
+        columns += list(self.defaults)
+        groups: dict[tuple[int, ...], list[tuple]] = {}
+        if (mutation_batch := current_batch(self.conn)) is not None:
+            # COPY can't run in pipeline mode, send what is queued before it first.
+            await mutation_batch.flush()
+        staged = self.returning is not None or self.conflict is not None
+        timezone = self.conn.info.timezone
+        default_idxs = tuple(range(len(self.columns), len(columns)))
+        default_values = tuple(
+            bulk_value(v, col.column_type, timezone) for col, v in self.defaults.items()
+        )
+        positions = self.position_groups()
+        for set_idxs, rows in self.row_groups(timezone).items():
+            rows = [row + default_values for row in rows]
+            if staged:
+                rows = [row + (p,) for row, p in zip(rows, positions[set_idxs])]
+            groups[set_idxs + default_idxs] = rows
+
+        if not staged:
+            async with self.conn.transaction():
+                await self.copy_groups(table, columns, groups)
+            return None
+
+        staging = f"{self.model_reference.alias()}_copy_{new_ref_id()}"
+        async with self.conn.transaction():
+            await self.conn.execute(
+                f"CREATE TEMP TABLE {staging} "
+                f"(LIKE {table} INCLUDING DEFAULTS, {COPY_POSITION} BIGINT)"
+            )
+            await self.copy_groups(staging, columns, groups, positioned=True)
+            column_names = ", ".join(col.column_name for col in columns)
+            builder = SqlBuilder()
+            builder.write(f"INSERT INTO {table} AS {self.model_reference.alias()} ")
+            builder.write(f"({column_names}) SELECT {column_names} FROM {staging}")
+            # Rows are inserted, and returned, in the order of the input.
+            builder.write(f" ORDER BY {COPY_POSITION}")
+            returning_extractor = self.write_returning(builder)
+            result = await self.do_execute(builder, returning_extractor, one)
+            await self.conn.execute(f"DROP TABLE {staging}")
+        return result
+
+    async def copy_groups(
+        self,
+        table: str,
+        columns: list[ColumnField],
+        groups: dict[tuple[int, ...], list[tuple]],
+        positioned=False,
+    ):
+        """Copy each group of rows. With `positioned` the rows end with their position in the input."""
+        types = self.conn.adapters.types
+        async with self.conn.cursor() as cur:
+            for set_idxs, rows in groups.items():
+                group_columns = [columns[i] for i in set_idxs]
+                column_names = [col.column_name for col in group_columns]
+                type_names = [col.column_type.sql.lower() for col in group_columns]
+                if positioned:
+                    column_names.append(COPY_POSITION)
+                    type_names.append("int8")
+                type_infos = [
+                    types.get(COPY_TYPE_NAMES.get(type_name, type_name))
+                    for type_name in type_names
+                ]
+                binary = all(type_infos)
+                format_sql = " (FORMAT BINARY)" if binary else ""
+                async with cur.copy(
+                    f"COPY {table} ({', '.join(column_names)}) FROM STDIN{format_sql}"
+                ) as copy:
+                    if binary:
+                        copy.set_types([info.oid for info in type_infos])
+                    for row in rows:
+                        await copy.write_row(row)
+
+    def start_guarded_statement(self, builder: SqlBuilder):
+        # `DEFAULT` can't be selected, so UNSET columns are left out to get their defaults.
+        [row] = self.values
+        set_idxs = [i for i, v in enumerate(row) if not isinstance(v, Unset)]
+        self.write_insert_into(builder, [self.columns[i] for i in set_idxs])
+        builder.write(" SELECT ")
+        values = [(row[i], self.columns[i]) for i in set_idxs]
+        values += [(v, column_field) for column_field, v in self.defaults.items()]
+        for i, (v, column_field) in enumerate(values):
+            if i:
+                builder.write(", ")
+            builder.write_value(v, column_field.column_type)
+        builder.write(" WHERE NOT EXISTS (")
+        # A builder of its own, so the subquery's columns don't shift the positions of the selection.
+        guard_builder = SqlBuilder()
+        self.guard.build_select_statement(guard_builder)
+        builder.write_subquery(guard_builder)
+        builder.write(")")
+
+    def start_sql_statement(self, builder: SqlBuilder, values=None):
+        if self.guard is not None:
+            return self.start_guarded_statement(builder)
+        self.write_insert_into(builder, self.columns)
+        builder.write(" VALUES ")
         wrote_row = False
-        for row in self.values:
+        for row in self.values if values is None else values:
             if wrote_row:
                 builder.write(", ")
             wrote_row = True
@@ -1700,14 +4077,14 @@ class InsertSet(MutationSet, Generic[T, V]):
                     builder.write(", ")
                 wrote_v = True
                 builder.write_value(v, column_field.column_type)
+            for column_field, v in self.defaults.items():
+                builder.write(", ")
+                builder.write_value(v, column_field.column_type)
             builder.write(")")
 
-    def build_statement(self, builder: SqlBuilder):
-        self.start_sql_statement(builder)
-
-        if self.returning is not None:
-            builder.write(" RETURNING ")
-            return self.returning.__extractor__(builder)
+    def build_statement(self, builder: SqlBuilder, values=None):
+        self.start_sql_statement(builder, values)
+        return self.write_returning(builder)
 
 
 class ModelUpdater(MutationSet, Generic[T]):
@@ -1737,6 +4114,7 @@ class UpdateDeleteSet(MutationSet):
     joins: dict[str, Join]
     join_fields: defaultdict[str, set[str]]
     seen_join_fields: set[(str, str)]
+    source: Selector | None = None
 
     def sync_joins(self, clause):
         for join_id, join, join_field in joins(clause, seen=self.seen_join_fields):
@@ -1751,10 +4129,13 @@ class UpdateDeleteSet(MutationSet):
 
         wrote_join = False
         where_clause = self.where_clause
+        if self.source is not None:
+            builder.write(" FROM ")
+            self.source.__sql__(builder)
         for join_id, join in self.joins.items():
             if not wrote_join:
                 wrote_join = True
-                builder.write(" FROM ")
+                builder.write(", " if self.source is not None else " FROM ")
                 join.__sql__(builder, self.join_fields[join_id])
                 builder.write(" AS ")
                 builder.write(join.model_reference.alias())
@@ -1763,7 +4144,7 @@ class UpdateDeleteSet(MutationSet):
                 else:
                     where_clause = join.on
             else:
-                builder.write(" LEFT JOIN ")
+                builder.write(f" {join.join_type} JOIN ")
                 join.__sql__(builder, self.join_fields[join_id])
                 builder.write(" AS ")
                 builder.write(join.model_reference.alias())
@@ -1788,10 +4169,12 @@ class UpdateSet(UpdateDeleteSet, Generic[T, V]):
         where: Selector[bool],
         one: bool = False,
         returning: Selector[V] | None = None,
+        source: Selector | None = None,
     ):
         if not setters:
             raise RhubarbException(f"Nothing to update.")
 
+        self.source = source
         self.where_clause = where
         self.model = model_reference.model
         self.model_reference = model_reference
@@ -1826,6 +4209,12 @@ class UpdateSet(UpdateDeleteSet, Generic[T, V]):
 
 
 class DeleteSet(UpdateDeleteSet, Generic[T, V]):
+    removes_rows = True
+
+    def supports_cte(self) -> bool:
+        # Every clone of the ObjectSet reads the deleted rows the same way, from what RETURNING gave back.
+        return False
+
     def __init__(
         self,
         model_reference: ModelReference[T],
@@ -1925,6 +4314,7 @@ def columns(
             if (
                 inlinable
                 and not field.force_inline
+                and field.strategy != "lateral"
                 and isinstance(field.type, (StrawberryList, list))
             ):
                 continue
@@ -1957,6 +4347,73 @@ def pk_columns(model: Type[T]) -> tuple[ColumnField, ...] | ColumnField:
     return get_column(model, model.__pk__)
 
 
+def cache_key(v: Any) -> Hashable | None:
+    if hasattr(v, "__cache_key__"):
+        return v.__cache_key__()
+    if isinstance(v, (tuple, list)):
+        keys = tuple(cache_key(x) for x in v)
+        if any(k is None for k in keys):
+            return None
+        return "tuple", keys
+    try:
+        hash(v)
+    except TypeError:
+        return None
+    return "v", type(v), v
+
+
+def freeze_cache_value(v: Any) -> Hashable:
+    if isinstance(v, dict):
+        return tuple(sorted((k, freeze_cache_value(x)) for k, x in v.items()))
+    if isinstance(v, (list, tuple)):
+        return tuple(freeze_cache_value(x) for x in v)
+    hash(v)
+    return v
+
+
+def unwrap_field_type(field: StrawberryField):
+    field_type = field.type
+    while isinstance(field_type, (StrawberryOptional, StrawberryList)):
+        field_type = field_type.of_type
+    return field_type
+
+
+def field_is_plan_cacheable(field: StrawberryField) -> bool:
+    # Resolvers that read `info` may build different SQL for each request. Relations
+    # only use it to build their join, which is compiled for every request anyway.
+    if isinstance(field, RelationField) or field.base_resolver is None:
+        return True
+    return field.base_resolver.info_parameter is None
+
+
+def selection_cache_key(
+    type_: Any, selected_fields: SelectedFields | None
+) -> Hashable | None:
+    if selected_fields is None:
+        return "*"
+    type_def: TypeDefinition | None = getattr(type_, "_type_definition", None)
+    keys = []
+    for selected in selected_fields:
+        name = getattr(selected, "name", None)
+        field_type = type_
+        if isinstance(selected, SelectedField) and type_def:
+            field = type_def.get_field(name) or type_def.get_field(camel_to_snake(name))
+            if field is not None:
+                if not field_is_plan_cacheable(field):
+                    return None
+                field_type = unwrap_field_type(field)
+        sub_key = selection_cache_key(field_type, selected.selections)
+        if sub_key is None:
+            return None
+        try:
+            arguments = freeze_cache_value(getattr(selected, "arguments", None))
+            directives = freeze_cache_value(selected.directives)
+        except TypeError:
+            return None
+        keys.append((type(selected), name, arguments, directives, sub_key))
+    return tuple(keys)
+
+
 def joins(selector: Selector, seen=None) -> Iterator[(str, Join, str)]:
     seen = seen or set()
     if not hasattr(selector, "__joins__"):
@@ -1965,6 +4422,144 @@ def joins(selector: Selector, seen=None) -> Iterator[(str, Join, str)]:
         yield join_id, join, field_name
 
 
+def conjuncts(clause: Selector[bool]) -> Iterator[Selector[bool]]:
+    if isinstance(clause, Computed) and clause._op == "AND" and len(clause._args) == 2:
+        for arg in clause._args:
+            yield from conjuncts(arg)
+    else:
+        yield clause
+
+
+NULL_REJECTING_OPS = ("=", "<>", "<", "<=", ">", ">=")
+
+
+def rejects_missing_rows(conjunct: Selector[bool], join_id: str) -> bool:
+    # A LEFT JOIN gives parents without children one row of NULLs, comparing a column of the child
+    # is NULL for it, so those parents are filtered out like with `EXISTS`.
+    if not (
+        isinstance(conjunct, Computed)
+        and conjunct._infixed
+        and conjunct._op in NULL_REJECTING_OPS
+        and len(conjunct._args) == 2
+    ):
+        return False
+    return any(
+        isinstance(unwrap_selector(arg), ColumnSelector)
+        and any(arg_join_id == join_id for arg_join_id, _, _ in joins(arg))
+        for arg in conjunct._args
+    )
+
+
+def semi_joins(clause: Selector[bool], joined: dict[str, Join]) -> Selector[bool]:
+    """
+    Rewrite the conjuncts of a where clause that read the rows of a list relation into `EXISTS` subqueries,
+    when the relation isn't already part of `joined`. Only comparisons of the child's columns are moved, a
+    relation also used in `OR`, `NOT` or other expressions, or together with another list relation, stays
+    joined since parents without children can match them.
+    """
+    filter_joins = {
+        join_id: join for join_id, join, _ in joins(clause) if join_id not in joined
+    }
+    if not any(type(join) is Join and join.many for join in filter_joins.values()):
+        return clause
+
+    rewritten = []
+    predicates = defaultdict(list)
+    kept_joined = set()
+    for conjunct in conjuncts(clause):
+        list_joins = {
+            join_id
+            for join_id, join, _ in joins(conjunct)
+            if join_id in filter_joins and type(join) is Join and join.many
+        }
+        if len(list_joins) == 1 and rejects_missing_rows(
+            conjunct, join_id := next(iter(list_joins))
+        ):
+            predicates[join_id].append(conjunct)
+        else:
+            kept_joined |= list_joins
+            rewritten.append(conjunct)
+    for join_id, join_predicates in predicates.items():
+        if join_id in kept_joined:
+            rewritten.extend(join_predicates)
+        else:
+            rewritten.append(
+                SemiJoin(filter_joins[join_id], join_predicates, filter_joins)
+            )
+    return functools.reduce(lambda a, b: Computed([a, b], "AND"), rewritten)
+
+
+def push_down(join: Join, pushed_on: Selector[bool]) -> ObjectSet | None:
+    """
+    The subquery of `join` filtered by `pushed_on`, its `on` clause written with the subquery's own columns,
+    so `__where__` and `__group_by__` only read the rows of the parent instead of the whole table. None when
+    `on` reads columns computed by the grouping, which can't be filtered before it, or when the model only
+    has `__order_by__`, which joining the subquery doesn't keep anyway.
+    """
+    object_set = join.object_set
+    if not hasattr(object_set.model, "__where__") and not hasattr(
+        object_set.model, "__group_by__"
+    ):
+        return None
+    if (group_by := object_set.group_by_clause) is not None:
+        keys = {
+            field.name
+            for key in (group_by if isinstance(group_by, tuple) else (group_by,))
+            if (field := key.__field__()) is not None
+        }
+        for join_id, _join, field_name in joins(join.on):
+            if join_id == join.id and field_name not in keys:
+                return None
+    pushed_down = object_set.clone()
+    if pushed_down.where_clause is not None:
+        pushed_down.where_clause &= pushed_on
+    else:
+        pushed_down.where_clause = pushed_on
+    # The parent's joins stay outside, the subquery only needs the ones of its own relations.
+    outer = {join_id for join_id, _join, _field in joins(join.on)}
+    for join_id, sub_join, join_field in joins(pushed_on):
+        if join_id not in outer:
+            pushed_down.joins.setdefault(join_id, sub_join)
+            pushed_down.join_fields[join_id].add(join_field)
+    return pushed_down
+
+
+def references_alias(sql: str, alias: str) -> bool:
+    return re.search(rf'(?<![\w."]){re.escape(alias)}\.', sql) is not None
+
+
+def replace_ids(key: Hashable, ids: dict[str, str]) -> Hashable:
+    if isinstance(key, tuple):
+        return tuple(replace_ids(k, ids) for k in key)
+    if isinstance(key, str):
+        return ids.get(key, key)
+    return key
+
+
+def join_signature(join: Join) -> Hashable | None:
+    """
+    The table a join reads and its `on` clause with the join's own ids left out, two joins with the same
+    signature match the same rows under different aliases.
+    """
+    if type(join) is not Join or join.object_set is not None:
+        return None
+    if (on_key := cache_key(join.on)) is None:
+        return None
+    own_ids = {join.id: "", join.model_reference.id: ""}
+    return (
+        join.model_reference.model,
+        join.join_type,
+        join.many,
+        replace_ids(on_key, own_ids),
+    )
+
+
+def unwrap_selector(selector: Selector) -> Selector:
+    while isinstance(selector, WrappedSelector):
+        selector = selector._selector
+    return selector
+
+
 @dataclasses.dataclass
 class References:
     table_name: str | Callable[[], str] | None
@@ -2172,6 +4767,7 @@ def table(
         set_real_table_name(registry, real_cls)
         if not skip_registry and not hasattr(real_cls, "__group_by__"):
             registry.add_entry(real_cls)
+        model_hydration(real_cls)
         return real_cls
     else:
         type_maker = strawberry.type(
@@ -2182,7 +4778,9 @@ def table(
             set_real_table_name(registry, real_cls)
             if not skip_registry and not hasattr(real_cls, "__group_by__"):
                 registry.add_entry(real_cls)
-            return type_maker(real_cls)
+            real_cls = type_maker(real_cls)
+            model_hydration(real_cls)
+            return real_cls
 
         return wrapper
 
@@ -2200,11 +4798,23 @@ def set_real_table_name(registry, cls):
 class RelationField(StrawberryField[J]):
     virtual = True
 
-    def __init__(self, other_table_annotation, force_inline: bool = False, **kwargs):
+    def __init__(
+        self,
+        other_table_annotation,
+        force_inline: bool = False,
+        strategy: RELATION_STRATEGIES = "join",
+        on: ReferenceFn = None,
+        **kwargs,
+    ):
         self.other = other_table_annotation
         self.force_inline = force_inline
+        self.strategy = strategy
+        self.on = on
         super().__init__(**kwargs)
 
+    def related_model(self) -> Type[J]:
+        return get_relation_annotation(inspect.get_annotations(self.on, eval_str=True))
+
 
 class RelationAnnotation(StrawberryAnnotation):
     def __init__(self, lazy_resolver: Type[J] | Callable[[], J]):
@@ -2245,14 +4855,29 @@ def relation(
     directives: Sequence[object] = (),
     extensions: List[FieldExtension] = (),  # type: ignore
     graphql_type: Optional[Any] = None,
-    join_type: JOIN_TYPES = "INNER",
+    join_type: JOIN_TYPES = "LEFT",
+    strategy: RELATION_STRATEGIES = "join",
+    order_by: Callable[[ModelSelector[J]], OrderBySelector] | None = None,
+    paginate: bool = False,
 ) -> Callable[[], J] | Callable[[ReferenceFn], Callable[[], J]]:
+    """
+    With `order_by` the rows of a list relation are ordered, and with `paginate` the field takes a `first`
+    argument that limits the rows of each parent, ordered by primary key without `order_by` or `__order_by__`.
+    Both load the relation with a lateral subquery.
+    An `INNER` `join_type` leaves out the parents without a related row.
+    """
+
     def wrap(passed_resolver) -> Callable[[], J]:
-        reference_id = new_ref_id()
+        reference_id = f"r{new_ref_id()}"
+        field_name = python_name or passed_resolver.__name__
 
-        def real_resolver(root: ModelSelector, info: Info):
+        def real_resolver(root: ModelSelector, info: Info, first: int | None = None):
+            if first is not None and first < 0:
+                raise RhubarbException(f"`first` of {field_name} can't be negative")
             model_ref_id = root._model_reference.id
             full_reference_id = f"{model_ref_id}_{reference_id}"
+            if first is not None:
+                full_reference_id = f"{full_reference_id}_first{first}"
             resolved_annotations = inspect.get_annotations(
                 passed_resolver, eval_str=True
             )
@@ -2262,15 +4887,32 @@ def relation(
                 and hasattr(graphql_type, "__origin__")
                 and issubclass(getattr(graphql_type, "__origin__"), list)
             )
-            return root._model_reference.object_set.join(
+            object_set = root._model_reference.object_set
+            strategies = relation_strategies.get()
+            if strategies is None:
+                strategies = object_set.relation_strategies
+            return object_set.join(
                 other_table,
                 on=passed_resolver,
                 reference_id=full_reference_id,
                 info=info,
                 join_type=join_type,
                 as_list=as_list,
+                strategy=strategies.get(field_name, strategy),
+                order_by=order_by,
+                limit=first,
             ).selection
 
+        if paginate:
+
+            def resolver(root: ModelSelector, info: Info, first: Optional[int] = None):
+                return real_resolver(root, info, first)
+
+        else:
+
+            def resolver(root: ModelSelector, info: Info):
+                return real_resolver(root, info)
+
         try:
             annotations = inspect.get_annotations(passed_resolver)
             other_table_annotation = get_relation_annotation(annotations)
@@ -2288,7 +4930,9 @@ def relation(
         return RelationField(
             other_table_annotation=other_table_annotation,
             force_inline=force_inline,
-            base_resolver=StrawberryResolver(real_resolver),
+            strategy=strategy,
+            on=passed_resolver,
+            base_resolver=StrawberryResolver(resolver),
             python_name=python_name,
             graphql_name=graphql_name,
             type_annotation=type_annotation,
@@ -2338,11 +4982,17 @@ def python_field(
         sig = inspect.signature(fn)
 
         def real_fn(root: ModelSelector, info: Info):
-            async def wrapped_fn(*args, **kwargs):
-                result = get_result(wrapped_field, root, info, list(args), kwargs)
-                if inspect.isawaitable(result):
-                    result = await result
-                return result
+            if wrapped_field.base_resolver.is_async:
+
+                async def wrapped_fn(*args, **kwargs):
+                    return await get_result(
+                        wrapped_field, root, info, list(args), kwargs
+                    )
+
+            else:
+
+                def wrapped_fn(*args, **kwargs):
+                    return get_result(wrapped_field, root, info, list(args), kwargs)
 
             depends = depends_on(root)
             if isinstance(depends, dict):
@@ -2390,7 +5040,8 @@ class Index:
 
 @dataclasses.dataclass(kw_only=True)
 class Constraint:
-    check: Selector[bool]
+    # Unique constraints can check a tuple of columns.
+    check: Selector[bool] | tuple[Selector, ...]
     unique: bool = False
 
 
@@ -2436,4 +5087,4 @@ def default_function_to_python(f: DEFAULT_SQL_FUNCTION) -> Callable[[], Any]:
                 return lambda: other
             raise RhubarbException(
                 f"Invalid default function to use for column {other}. Available: {DEFAULT_SQL_FUNCTION}"
-            )
\ No newline at end of file
+            )
@@ -0,0 +1,312 @@
+import datetime
+import inspect
+import uuid
+
+from typing import Any
+
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    GraphQLFloat,
+    GraphQLInt,
+    GraphQLObjectType,
+    GraphQLSchema,
+    get_named_type,
+    is_list_type,
+    is_non_null_type,
+)
+from graphql.execution import ExecutionContext as GraphQLExecutionContext
+from graphql.execution.collect_fields import collect_fields
+from graphql.execution.values import get_argument_values
+from graphql.language import FieldNode
+from graphql.pyutils import Path
+from psycopg import AsyncConnection, Error
+from psycopg.rows import tuple_row
+from strawberry.field import StrawberryField
+from strawberry.type import StrawberryList, StrawberryOptional
+from strawberry.types import ExecutionContext, Info
+
+from rhubarb.errors import RhubarbException
+from rhubarb.object_set import (
+    ColumnField,
+    ColumnSelector,
+    Computed,
+    JsonList,
+    JsonObject,
+    LateralListSelector,
+    ModelSelector,
+    ObjectSet,
+    RawSQL,
+    RelatedAggregate,
+    RelationField,
+    Selector,
+    SqlBuilder,
+    Value,
+    WrappedSelector,
+    loading_relations,
+    pk_selection,
+)
+from rhubarb.query_planner import graphql_context, strawberry_definition
+
+JSON_SCALARS = (str, int, float, bool, uuid.UUID, datetime.date)
+# json_build_object takes at most 100 arguments.
+MAX_JSON_OBJECT_KEYS = 50
+
+
+class NotCompilable(RhubarbException):
+    pass
+
+
+def json_compatible(type_) -> bool:
+    # Types that Postgres writes to JSON exactly like GraphQL serializes them.
+    if isinstance(type_, StrawberryOptional):
+        type_ = type_.of_type
+    if isinstance(type_, StrawberryList):
+        return json_compatible(type_.of_type)
+    return type_ in JSON_SCALARS
+
+
+def sql_only(selector) -> bool:
+    if isinstance(selector, WrappedSelector):
+        return sql_only(selector._selector)
+    if isinstance(selector, Computed):
+        return all(sql_only(arg) for arg in selector._args)
+    if isinstance(selector, (ColumnSelector, Value, RawSQL, RelatedAggregate)):
+        return True
+    return not isinstance(selector, Selector)
+
+
+class OperationCompiler:
+    """
+    Compiles a query operation whose root fields return ObjectSets into one statement that returns
+    the response as JSON, so rows are neither hydrated nor resolved field by field.
+    """
+
+    def __init__(self, schema: GraphQLSchema, context: GraphQLExecutionContext):
+        self.schema = schema
+        self.context = context
+        # What the root resolvers returned or raised, reused when the operation is executed normally.
+        self.resolved: dict[str, Any] = {}
+
+    def root_field(self, response_key: str, field_nodes: list[FieldNode]):
+        field_def = self.schema.query_type.fields.get(field_nodes[0].name.value)
+        if field_def is None or not isinstance(
+            get_named_type(field_def.type), GraphQLObjectType
+        ):
+            raise NotCompilable(f"{response_key} doesn't return a model")
+        return field_def
+
+    def resolve_info(self, field_def, response_key: str, field_nodes: list[FieldNode]):
+        root_type = self.schema.query_type
+        return self.context.build_resolve_info(
+            field_def, field_nodes, root_type, Path(None, response_key, root_type.name)
+        )
+
+    def check_root(self, response_key: str, field_nodes: list[FieldNode]):
+        """Compile the selection against the root's model before any resolver runs."""
+        field_def = self.root_field(response_key, field_nodes)
+        object_type = get_named_type(field_def.type)
+        type_def = strawberry_definition(object_type)
+        model = type_def and type_def.origin
+        if not hasattr(model, "__table__"):
+            raise NotCompilable(f"{response_key} doesn't return a model")
+        info = Info(
+            _raw_info=self.resolve_info(field_def, response_key, field_nodes),
+            _field=strawberry_definition(field_def),
+        )
+        probe = ObjectSet(model, conn=None, info=info)
+        self.compile_object(probe.model_selector, object_type, field_nodes)
+
+    async def compile_root(
+        self, response_key: str, field_nodes: list[FieldNode]
+    ) -> JsonList:
+        field_def = self.root_field(response_key, field_nodes)
+        info = self.resolve_info(field_def, response_key, field_nodes)
+        try:
+            args = get_argument_values(
+                field_def, field_nodes[0], self.context.variable_values
+            )
+            result = field_def.resolve(self.context.root_value, info, **args)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            # Raised again by the normal execution, which reports it as an error of the field.
+            self.resolved[response_key] = e
+            raise NotCompilable(f"{response_key} raised") from e
+        self.resolved[response_key] = result
+        if not isinstance(result, ObjectSet) or not isinstance(
+            result.selection, ModelSelector
+        ):
+            raise NotCompilable(f"{response_key} doesn't return an ObjectSet")
+        if result.reverse_rows:
+            raise NotCompilable(f"{response_key} is read backward")
+
+        json_object = self.compile_object(
+            result.selection, get_named_type(field_def.type), field_nodes
+        )
+        return JsonList(result.select(lambda _: json_object), one=result._one)
+
+    def completes(self, value, type_, field_nodes: list[FieldNode]) -> bool:
+        """
+        Whether graphql-core would complete the value without an error. Postgres doesn't know which fields are
+        non-null, writes bigints outside of the 32 bits of `Int` and NaN or Infinity as strings.
+        """
+        if is_non_null_type(type_):
+            if value is None:
+                return False
+            type_ = type_.of_type
+        if value is None:
+            return True
+        if is_list_type(type_):
+            return all(
+                self.completes(item, type_.of_type, field_nodes) for item in value
+            )
+        if isinstance(type_, GraphQLObjectType):
+            for response_key, nodes in self.context.collect_subfields(
+                type_, field_nodes
+            ).items():
+                name = nodes[0].name.value
+                if name != "__typename" and not self.completes(
+                    value.get(response_key), type_.fields[name].type, nodes
+                ):
+                    return False
+            return True
+        if type_ in (GraphQLInt, GraphQLFloat):
+            try:
+                type_.serialize(value)
+            except GraphQLError:
+                return False
+        return True
+
+    def compile_object(
+        self,
+        selector: ModelSelector,
+        object_type: GraphQLObjectType,
+        field_nodes: list[FieldNode],
+    ) -> JsonObject:
+        model = selector._model_reference.model
+        type_def = strawberry_definition(object_type)
+        if type_def is None or type_def.origin is not model:
+            raise NotCompilable(f"{object_type.name} isn't the type of {model}")
+        if hasattr(model, "__group_by__"):
+            raise NotCompilable(f"{model} is grouped")
+
+        items = {}
+        for response_key, nodes in self.context.collect_subfields(
+            object_type, field_nodes
+        ).items():
+            name = nodes[0].name.value
+            if name == "__typename":
+                items[response_key] = Value(object_type.name)
+                continue
+            field_def = object_type.fields[name]
+            field: StrawberryField = strawberry_definition(field_def)
+            if nodes[0].arguments or field.permission_classes or field.extensions:
+                raise NotCompilable(f"{name} needs to be resolved")
+            items[response_key] = self.compile_field(selector, field, field_def, nodes)
+
+        if len(items) > MAX_JSON_OBJECT_KEYS:
+            raise NotCompilable(f"Too many fields selected on {object_type.name}")
+        return JsonObject(items)
+
+    def compile_field(
+        self,
+        selector: ModelSelector,
+        field: StrawberryField,
+        field_def,
+        field_nodes: list[FieldNode],
+    ) -> Selector:
+        object_set = selector._model_reference.object_set
+        if isinstance(field, RelationField):
+            strategies = object_set.relation_strategies
+            if isinstance(field.type, (StrawberryList, list)):
+                # List relations are aggregated in a correlated subquery built from their lateral join.
+                strategies = strategies | {field.name: "lateral"}
+            with loading_relations(strategies):
+                related = getattr(selector, field.name)(info=object_set.info)._selector
+            object_type = get_named_type(field_def.type)
+            if isinstance(related, LateralListSelector):
+                join = related.join
+                json_object = self.compile_object(
+                    join.object_set.model_selector, object_type, field_nodes
+                )
+                return JsonList(
+                    join.object_set.select(lambda _: json_object), join.parent_joins
+                )
+            if isinstance(related, ModelSelector) and related._join is not None:
+                json_object = self.compile_object(related, object_type, field_nodes)
+                present = pk_selection(related)
+                json_object.present = (
+                    present[0] if isinstance(present, tuple) else present
+                )
+                return json_object
+            raise NotCompilable(f"Relation {field.name} can't be compiled")
+
+        if not isinstance(field, ColumnField) or not json_compatible(field.type):
+            raise NotCompilable(f"{field.name} needs to be serialized in Python")
+        if not field.virtual:
+            return getattr(selector, field.name)
+        value = getattr(selector, field.name)(info=object_set.info)
+        if not sql_only(value):
+            raise NotCompilable(f"{field.name} is computed in Python")
+        return value
+
+
+async def compile_operation(
+    execution_context: ExecutionContext,
+    conn: AsyncConnection,
+    resolved: dict[str, Any],
+) -> ExecutionResult | None:
+    """
+    Run a query operation as one statement that builds the response with `json_build_object` and `json_agg`.
+    Returns None when any field needs Python, the operation should then be executed normally. Root resolvers
+    that already ran leave their results or exceptions in `resolved` for the normal execution to reuse.
+    """
+    schema = execution_context.schema._schema
+    if (context := graphql_context(execution_context)) is None:
+        return None
+
+    compiler = OperationCompiler(schema, context)
+    fields = collect_fields(
+        schema,
+        context.fragments,
+        context.variable_values,
+        schema.query_type,
+        context.operation.selection_set,
+    )
+    roots = {}
+    try:
+        for response_key, field_nodes in fields.items():
+            compiler.check_root(response_key, field_nodes)
+        for response_key, field_nodes in fields.items():
+            roots[response_key] = await compiler.compile_root(response_key, field_nodes)
+    except NotCompilable:
+        resolved.update(compiler.resolved)
+        return None
+
+    builder = SqlBuilder()
+    builder.write("SELECT ")
+    for i, (response_key, root) in enumerate(roots.items()):
+        if i:
+            builder.write(", ")
+        root.__sql__(builder)
+        builder.write(f' AS "{response_key}"')
+
+    try:
+        # A savepoint, so the normal execution can still use the connection after an error.
+        async with conn.transaction():
+            async with conn.cursor(row_factory=tuple_row) as cur:
+                await cur.execute(builder.q, builder.vars)
+                row = await cur.fetchone()
+    except Error:
+        resolved.update(compiler.resolved)
+        return None
+
+    data = dict(zip(roots, row))
+    for response_key, field_nodes in fields.items():
+        field_def = schema.query_type.fields[field_nodes[0].name.value]
+        if not compiler.completes(data[response_key], field_def.type, field_nodes):
+            # Let the normal execution report the invalid value.
+            resolved.update(compiler.resolved)
+            return None
+    return ExecutionResult(data=data)
@@ -0,0 +1,147 @@
+from typing import Any, Generic, Literal, Optional, TypeVar
+
+import strawberry
+from strawberry.types.nodes import SelectedField
+
+from rhubarb.env import str_env
+from rhubarb.errors import RhubarbException
+from rhubarb.object_set import Desc, ObjectSet, pk_concrete
+
+T = TypeVar("T")
+COUNT_MODES = Literal["exact", "estimated"]
+CONNECTION_COUNT_MODE: COUNT_MODES = str_env("CONNECTION_COUNT_MODE", "exact")
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    has_previous_page: bool
+    start_cursor: Optional[str]
+    end_cursor: Optional[str]
+
+
+@strawberry.type
+class Edge(Generic[T]):
+    cursor: str
+    node: T
+    # Read by `pk_concrete`, so the extension can find the node in the ObjectSet it loaded the page with.
+    _cached_pk: strawberry.Private[Any] = None
+
+
+@strawberry.type
+class Connection(Generic[T]):
+    """
+    A Relay connection over an ObjectSet. Pages are read with `after` / `before` cursors instead of `OFFSET`,
+    and `totalCount` is only counted when it is selected, exactly or from the planner's estimate.
+    """
+
+    object_set: strawberry.Private[ObjectSet]
+    first: strawberry.Private[Optional[int]] = None
+    after: strawberry.Private[Optional[str]] = None
+    last: strawberry.Private[Optional[int]] = None
+    before: strawberry.Private[Optional[str]] = None
+    count_mode: strawberry.Private[COUNT_MODES] = CONNECTION_COUNT_MODE
+    # Set by RhubarbExtension to the page restricted to the selected fields of `edges.node`.
+    page: strawberry.Private[Optional[ObjectSet]] = None
+
+    def __post_init__(self):
+        if any(n is not None and n < 0 for n in (self.first, self.last)):
+            raise RhubarbException("`first` and `last` can't be negative")
+
+    @property
+    def backward(self) -> bool:
+        return self.first is None and self.last is not None
+
+    def page_set(self) -> ObjectSet:
+        # Break ties on the pk like the cursors do, or the first page could differ from the one they seek past.
+        object_set = self.object_set.order_by(
+            lambda _: tuple(
+                Desc(selector) if descending else selector
+                for selector, descending in self.object_set.seek_keys()
+            )
+        )
+        if self.after is not None:
+            object_set = object_set.after(self.after)
+        if self.before is not None:
+            object_set = object_set.seek(self.before, before=True)
+        limit = self.first
+        if self.backward:
+            # Read the last rows by walking the order in reverse from `before`.
+            limit = self.last
+            object_set = object_set.read_backward()
+        if limit is not None:
+            # One more row than requested tells if there is another page.
+            object_set = object_set.limit(limit + 1)
+        return object_set
+
+    def node_selections(self, selections: list) -> tuple[list[str], list]:
+        """
+        The response paths of `edges.node` under the connection, and the fields selected on them together with
+        the columns needed to make cursors.
+        """
+        paths, fields = [], []
+        for edges in selections:
+            if not isinstance(edges, SelectedField) or edges.name != "edges":
+                continue
+            for node in edges.selections:
+                if isinstance(node, SelectedField) and node.name == "node":
+                    edges_key = edges.alias or edges.name
+                    paths.append(f"{edges_key}|{node.alias or node.name}")
+                    fields.extend(node.selections)
+        for selector, _ in self.object_set.seek_keys():
+            fields.append(
+                SelectedField(
+                    name=selector._field.name,
+                    arguments={},
+                    directives={},
+                    selections=[],
+                )
+            )
+        return paths, fields
+
+    async def rows(self) -> tuple[list, bool]:
+        if self.page is None:
+            self.page = self.page_set()
+        rows = await self.page.as_list()
+        limit = self.last if self.backward else self.first
+        has_more = limit is not None and len(rows) > limit
+        if self.backward:
+            # Rows read backward come back in order, with the extra row first.
+            rows = rows[len(rows) - limit :] if has_more else rows
+        else:
+            rows = rows[:limit]
+            if self.last is not None:
+                rows = rows[-self.last :] if self.last else []
+        return rows, has_more
+
+    @strawberry.field
+    async def edges(self) -> list[Edge[T]]:
+        rows, _has_more = await self.rows()
+        return [
+            Edge(
+                cursor=self.object_set.cursor(row),
+                node=row,
+                _cached_pk=pk_concrete(row),
+            )
+            for row in rows
+        ]
+
+    @strawberry.field
+    async def page_info(self) -> PageInfo:
+        rows, has_more = await self.rows()
+        if self.backward:
+            has_next_page, has_previous_page = self.before is not None, has_more
+        else:
+            has_next_page, has_previous_page = has_more, self.after is not None
+        return PageInfo(
+            has_next_page=has_next_page,
+            has_previous_page=has_previous_page,
+            start_cursor=self.object_set.cursor(rows[0]) if rows else None,
+            end_cursor=self.object_set.cursor(rows[-1]) if rows else None,
+        )
+
+    @strawberry.field
+    async def total_count(self) -> int:
+        if self.count_mode == "estimated":
+            return await self.object_set.estimated_count()
+        return await self.object_set.count()
@@ -24,6 +24,9 @@ class PasswordHash(object):
     def __sql_type__():
         return SqlType.from_python(bytes)
 
+    def __sql_value__(self):
+        return self.hash
+
     def __eq__(self, candidate):
         if isinstance(candidate, str):
             candidate = candidate.encode()
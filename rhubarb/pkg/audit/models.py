@@ -20,7 +20,7 @@ from rhubarb.config import config
 from rhubarb.pkg.postgres.connection import connection
 from rhubarb.pkg.redis.cache import local_only_cache
 from rhubarb.core import SqlModel
-from rhubarb.crud import by_pk
+from rhubarb.crud import find_or_create
 from rhubarb.object_set import BUILTINS
 
 
@@ -77,14 +77,9 @@ class AuditEvent(BaseModel):
 async def do_get_or_create_gql_query(
     conn, raw_query: str, hash_digest: bytes = ...
 ) -> GqlQuery:
-    gql_query = await by_pk(conn, GqlQuery, hash_digest).one()
-    if not gql_query:
-        gql_query = await save(
-            conn,
-            GqlQuery(sha_hash=hash_digest, raw_query=raw_query),
-            insert_with_pk=True,
-        ).execute()
-    return gql_query
+    return await find_or_create(
+        conn, GqlQuery(sha_hash=hash_digest, raw_query=raw_query), sha_hash=hash_digest
+    )
 
 
 async def get_or_create_gql_query(conn, raw_query: str) -> GqlQuery:
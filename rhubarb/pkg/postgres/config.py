@@ -2,9 +2,10 @@ import asyncio
 import dataclasses
 from urllib.parse import urlparse
 
+from psycopg import AsyncConnection
 from psycopg_pool import AsyncConnectionPool
 
-from rhubarb.env import str_env, int_env
+from rhubarb.env import str_env, int_env, bool_env
 from .connection_base import AsyncConnectionWithStats
 
 
@@ -21,6 +22,13 @@ class PostgresConfig:
     dbname: str = str_env("PG_DBNAME", "postgres")
     min_size: int = int_env("PG_POOL_MIN_SIZE", 4)
     max_size: int | None = int_env("PG_POOL_MAX_SIZE")
+    prepare: bool = bool_env("PG_PREPARE", True)
+    prepare_threshold: int = int_env("PG_PREPARE_THRESHOLD", 5)
+    prepared_max: int = int_env("PG_PREPARED_MAX", 100)
+
+    async def configure_connection(self, conn: AsyncConnection):
+        conn.prepare_threshold = self.prepare_threshold if self.prepare else None
+        conn.prepared_max = self.prepared_max
 
     async def get_pool(self) -> AsyncConnectionPool:
         if self in pools:
@@ -29,11 +37,14 @@ class PostgresConfig:
             kwargs = dataclasses.asdict(self)
             min_size = kwargs.pop("min_size")
             max_size = kwargs.pop("max_size")
+            for key in ("prepare", "prepare_threshold", "prepared_max"):
+                kwargs.pop(key)
             pool = AsyncConnectionPool(
                 connection_class=AsyncConnectionWithStats,
                 kwargs=kwargs,
                 min_size=min_size,
                 max_size=max_size,
+                configure=self.configure_connection,
             )
             await pool.open(wait=True, timeout=10)
             pools[self] = pool
@@ -1,11 +1,11 @@
 import dataclasses
 import logging
-from collections import deque
+from collections import OrderedDict, deque
 from contextlib import contextmanager
 from typing import Optional, Protocol, ContextManager
 
 import phonenumbers
-from psycopg import AsyncConnection, AsyncCursor, postgres
+from psycopg import AsyncConnection, AsyncCursor, AsyncServerCursor, postgres
 from psycopg.abc import Query, Params
 from psycopg.pq import Format
 from psycopg.rows import Row
@@ -17,7 +17,9 @@ from rhubarb.password import PasswordHash
 
 
 class QueryListener(Protocol):
-    def new_query(self, query: Query, params: Optional[Params], duration_ns):
+    def new_query(
+        self, query: Query, params: Optional[Params], duration_ns, prepared=False
+    ):
         pass
 
 
@@ -26,14 +28,17 @@ class TrackedQuery:
     query: Query
     params: Optional[Params]
     duration_ns: int
+    prepared: bool = False
 
 
 class QueryTracker(QueryListener):
     def __init__(self):
         self.queries: deque[TrackedQuery] = deque(maxlen=500)
 
-    def new_query(self, query: Query, params: Optional[Params], duration_ns):
-        self.queries.append(TrackedQuery(query, params, duration_ns))
+    def new_query(
+        self, query: Query, params: Optional[Params], duration_ns, prepared=False
+    ):
+        self.queries.append(TrackedQuery(query, params, duration_ns, prepared))
 
 
 class LocalQueryListeners:
@@ -48,15 +53,25 @@ class LocalQueryListeners:
     def unregister(self, listener_id: int):
         del self.listeners[listener_id]
 
-    def new_query(self, query, params, duration_ns):
+    def new_query(self, query, params, duration_ns, prepared=False):
         logging.debug(f"[QUERY] {query}")
         for listener in self.listeners.values():
-            listener.new_query(query, params, duration_ns)
+            listener.new_query(query, params, duration_ns, prepared)
 
 
 local_queries = LocalQueryListeners()
 
 
+@dataclasses.dataclass
+class PreparedStatementStats:
+    executed: int = 0
+    prepared: int = 0
+    hits: int = 0
+
+
+prepared_stats = PreparedStatementStats()
+
+
 @contextmanager
 def track_queries() -> ContextManager[QueryTracker]:
     tracker = QueryTracker()
@@ -72,8 +87,45 @@ class AsyncConnectionWithStats(AsyncConnection):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cursor_factory = AsyncCursorWithStats
+        self.server_cursor_factory = AsyncServerCursorWithStats
         self.adapters.register_dumper(phonenumbers.PhoneNumber, PhoneNumberDumper)
         self.adapters.register_dumper(PasswordHash, PasswordHashDumper)
+        self.query_counts: OrderedDict[Query, int] = OrderedDict()
+        self.prepared_queries: OrderedDict[Query, None] = OrderedDict()
+
+    def count_prepare(self, query: Query, prepare: Optional[bool]) -> bool:
+        """
+        Estimate whether `query` runs a prepared statement from psycopg's public `prepare_threshold` and
+        `prepared_max` settings, without reaching into its private prepare manager. psycopg also tells
+        statements apart by the types of their parameters, the same text run with other types is counted
+        as the same statement here.
+        """
+        prepared_stats.executed += 1
+        if prepare is False or self.prepare_threshold is None:
+            return False
+        key = query if isinstance(query, (str, bytes)) else repr(query)
+        if key in self.prepared_queries:
+            self.prepared_queries.move_to_end(key)
+            prepared_stats.hits += 1
+            return True
+        count = self.query_counts.pop(key, 0)
+        if count >= self.prepare_threshold or prepare:
+            # Prepared by this execution, the next ones use the statement.
+            prepared_stats.prepared += 1
+            self.prepared_queries[key] = None
+            if len(self.prepared_queries) > self.prepared_max:
+                self.prepared_queries.popitem(last=False)
+        else:
+            self.query_counts[key] = count + 1
+            if len(self.query_counts) > self.prepared_max:
+                self.query_counts.popitem(last=False)
+        return False
+
+    async def rollback(self) -> None:
+        # psycopg deallocates its prepared statements on rollback.
+        await super().rollback()
+        self.query_counts.clear()
+        self.prepared_queries.clear()
 
 
 class AsyncCursorWithStats(AsyncCursor):
@@ -88,6 +140,25 @@ class AsyncCursorWithStats(AsyncCursor):
         start_ns = time.perf_counter_ns()
         result = await super().execute(query, params, prepare=prepare, binary=binary)
         end_ns = time.perf_counter_ns()
+        prepared = False
+        if isinstance(self.connection, AsyncConnectionWithStats):
+            prepared = self.connection.count_prepare(query, prepare)
+        local_queries.new_query(query, params, end_ns - start_ns, prepared)
+        return result
+
+
+class AsyncServerCursorWithStats(AsyncServerCursor):
+    async def execute(
+        self,
+        query: Query,
+        params: Optional[Params] = None,
+        *,
+        binary: Optional[bool] = None,
+        **kwargs,
+    ) -> AsyncServerCursor[Row]:
+        start_ns = time.perf_counter_ns()
+        result = await super().execute(query, params, binary=binary, **kwargs)
+        end_ns = time.perf_counter_ns()
         local_queries.new_query(query, params, end_ns - start_ns)
         return result
 
@@ -101,5 +172,8 @@ class PhoneNumberDumper(StrBinaryDumper):
 
 
 class PasswordHashDumper(BytesBinaryDumper):
-    def dump(self, obj: PasswordHash):
-        return super().dump(obj.hash)
+    def dump(self, obj: PasswordHash | bytes):
+        # Also picked for plain bytes when dumping by the bytea oid, like in COPY.
+        if isinstance(obj, PasswordHash):
+            obj = obj.hash
+        return super().dump(obj)
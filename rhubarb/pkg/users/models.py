@@ -1,3 +1,4 @@
+import asyncio
 import dataclasses
 import datetime
 import secrets
@@ -21,6 +22,7 @@ from rhubarb import (
     save,
     Registry,
     table,
+    batch,
 )
 from rhubarb.config import config
 from rhubarb.functions import is_null
@@ -159,13 +161,20 @@ async def register(conn: AsyncConnection, **kwargs) -> RegistrationResult:
     email_verification = None
     phone_verification = None
 
-    if new_user.email:
-        email_verification = await set_email(conn, new_user, new_user.email)
+    async with batch(conn):
+        verifications = []
+        if new_user.email:
+            verifications.append(set_email(conn, new_user, new_user.email))
+        if new_user.phone_number:
+            verifications.append(
+                set_phone_number(conn, new_user, new_user.phone_number)
+            )
+        results = await asyncio.gather(*verifications)
 
+    if new_user.email:
+        email_verification = results.pop(0)
     if new_user.phone_number:
-        phone_verification = await set_phone_number(
-            conn, new_user, new_user.phone_number
-        )
+        phone_verification = results.pop(0)
     return RegistrationResult(
         user=new_user,
         email_verification=email_verification,
@@ -179,10 +188,14 @@ async def set_email(
     verif = EmailVerification(user_id=user.id, email=new_email)
     if mark_sent:
         verif.sent = datetime.datetime.utcnow()
-    await query(conn, EmailVerification).kw_where(user_id=user.id).kw_update(
-        canceled=datetime.datetime.utcnow()
-    ).execute()
-    return await save(conn, verif).execute()
+    async with batch(conn) as mutations:
+        mutations.add(
+            query(conn, EmailVerification)
+            .kw_where(user_id=user.id)
+            .kw_update(canceled=datetime.datetime.utcnow())
+        )
+        saved = mutations.add(save(conn, verif))
+    return await saved
 
 
 async def set_phone_number(
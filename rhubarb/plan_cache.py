@@ -0,0 +1,114 @@
+import dataclasses
+from contextlib import contextmanager
+from typing import Any, ContextManager, Hashable, Optional, Protocol
+
+from cachetools import LRUCache
+
+from rhubarb.env import int_env
+
+
+@dataclasses.dataclass(slots=True)
+class CompiledPlan:
+    sql: str
+    vars: list
+    pk_extractor: Any
+    main_extractor: Any
+    alias_count: int
+    column_mappings: dict[str, str]
+    columns: dict[str, int]
+    read_tables: frozenset[str]
+    compile_ns: int
+    # Bound values from resolvers, which run again for every request and can return other values.
+    rebind: bool = False
+
+
+@dataclasses.dataclass
+class PlanCacheStats:
+    hits: int = 0
+    misses: int = 0
+    uncacheable: int = 0
+    compile_ns: int = 0
+    saved_ns: int = 0
+
+
+class PlanCacheListener(Protocol):
+    def hit(self, plan: CompiledPlan):
+        pass
+
+    def miss(self, plan: CompiledPlan):
+        pass
+
+    def uncacheable(self):
+        pass
+
+
+class PlanCacheTracker(PlanCacheListener):
+    def __init__(self):
+        self.stats = PlanCacheStats()
+
+    def hit(self, plan: CompiledPlan):
+        self.stats.hits += 1
+        if not plan.rebind:
+            self.stats.saved_ns += plan.compile_ns
+
+    def miss(self, plan: CompiledPlan):
+        self.stats.misses += 1
+        self.stats.compile_ns += plan.compile_ns
+
+    def uncacheable(self):
+        self.stats.uncacheable += 1
+
+
+class PlanCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.plans: LRUCache = LRUCache(maxsize=max(maxsize, 1))
+        self.tracker = PlanCacheTracker()
+        self.listeners: dict[object, PlanCacheListener] = {}
+
+    @property
+    def stats(self) -> PlanCacheStats:
+        return self.tracker.stats
+
+    def _notify(self, event: str, *args):
+        getattr(self.tracker, event)(*args)
+        for listener in self.listeners.values():
+            getattr(listener, event)(*args)
+
+    def get(self, key: Hashable | None) -> Optional[CompiledPlan]:
+        if key is None or not self.maxsize:
+            return None
+        if plan := self.plans.get(key):
+            self._notify("hit", plan)
+        return plan
+
+    def put(self, key: Hashable | None, plan: CompiledPlan):
+        if key is None or not self.maxsize:
+            self._notify("uncacheable")
+            return
+        self._notify("miss", plan)
+        self.plans[key] = plan
+
+    def clear(self):
+        self.plans.clear()
+        self.tracker.stats = PlanCacheStats()
+
+    def register(self, listener_id: object, listener: PlanCacheListener):
+        self.listeners[listener_id] = listener
+
+    def unregister(self, listener_id: object):
+        del self.listeners[listener_id]
+
+
+plan_cache = PlanCache(maxsize=int_env("PLAN_CACHE_SIZE", 1024))
+
+
+@contextmanager
+def track_plan_cache() -> ContextManager[PlanCacheTracker]:
+    tracker = PlanCacheTracker()
+    tracker_id = object()
+    plan_cache.register(tracker_id, tracker)
+    try:
+        yield tracker
+    finally:
+        plan_cache.unregister(tracker_id)
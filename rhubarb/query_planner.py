@@ -0,0 +1,122 @@
+import dataclasses
+
+from graphql import GraphQLObjectType, get_named_type
+from graphql.execution import ExecutionContext as GraphQLExecutionContext
+from graphql.execution.collect_fields import collect_fields
+from graphql.language import FieldNode
+from strawberry.schema.schema_converter import GraphQLCoreConverter
+from strawberry.types import ExecutionContext
+
+from rhubarb.object_set import ColumnField, model_hydration
+
+
+def strawberry_definition(graphql_definition):
+    return graphql_definition.extensions.get(GraphQLCoreConverter.DEFINITION_BACKREF)
+
+
+def graphql_context(
+    execution_context: ExecutionContext,
+) -> GraphQLExecutionContext | None:
+    context = GraphQLExecutionContext.build(
+        execution_context.schema._schema,
+        execution_context.graphql_document,
+        root_value=execution_context.root_value,
+        context_value=execution_context.context,
+        raw_variable_values=execution_context.variables,
+        operation_name=execution_context.operation_name,
+    )
+    if isinstance(context, list):
+        return None
+    return context
+
+
+@dataclasses.dataclass(slots=True)
+class FieldPlan:
+    # Set when the value is an attribute of the hydrated parent, and can be read without the extension.
+    python_name: str | None
+    prev_key: str | None
+    cur_key: str | None
+
+
+class QueryPlanner:
+    """
+    Walks an operation once to find the path keys of every field node, and which fields are plain columns
+    that can be read straight off the model instances their parent ObjectSet hydrated. No ObjectSet is built
+    here, they depend on what the resolvers return and are built while the operation runs.
+    """
+
+    def __init__(self, context: GraphQLExecutionContext):
+        self.context = context
+        self.plan: dict[int, FieldPlan] = {}
+
+    def plan_operation(self) -> dict[int, FieldPlan]:
+        schema = self.context.schema
+        root_type = schema.get_root_type(self.context.operation.operation)
+        for response_key, field_nodes in collect_fields(
+            schema,
+            self.context.fragments,
+            self.context.variable_values,
+            root_type,
+            self.context.operation.selection_set,
+        ).items():
+            self.plan_field(root_type, field_nodes, "|", response_key)
+        return self.plan
+
+    def plan_field(
+        self,
+        parent_type: GraphQLObjectType,
+        field_nodes: list[FieldNode],
+        prev_key: str,
+        cur_key: str,
+    ):
+        field_def = parent_type.fields.get(field_nodes[0].name.value)
+        if field_def is None:
+            # Introspection fields like `__typename`.
+            return
+
+        field_type = get_named_type(field_def.type)
+        if isinstance(field_type, GraphQLObjectType):
+            for response_key, sub_nodes in self.context.collect_subfields(
+                field_type, field_nodes
+            ).items():
+                self.plan_field(
+                    field_type, sub_nodes, cur_key, f"{cur_key}|{response_key}"
+                )
+
+        field = strawberry_definition(field_def)
+        field_plan = FieldPlan(
+            field.python_name
+            if self.is_attribute(parent_type, field, field_nodes)
+            else None,
+            prev_key,
+            cur_key,
+        )
+        node_id = id(field_nodes[0])
+        planned = self.plan.setdefault(node_id, field_plan)
+        if planned != field_plan:
+            # Fragments can put the same node at several paths, which leaves the keys to be found at runtime.
+            python_name = (
+                planned.python_name
+                if planned.python_name == field_plan.python_name
+                else None
+            )
+            self.plan[node_id] = FieldPlan(python_name, None, None)
+
+    def is_attribute(self, parent_type: GraphQLObjectType, field, field_nodes) -> bool:
+        type_def = strawberry_definition(parent_type)
+        model = type_def and type_def.origin
+        if not hasattr(model, "__table__"):
+            return False
+        if not isinstance(field, ColumnField) or field.virtual:
+            return False
+        if field.permission_classes or field.extensions:
+            return False
+        if any(node.arguments for node in field_nodes):
+            return False
+        return field.name in model_hydration(model).init_fields
+
+
+def plan_operation(execution_context: ExecutionContext) -> dict[int, FieldPlan] | None:
+    if (context := graphql_context(execution_context)) is None:
+        return None
+    return QueryPlanner(context).plan_operation()
@@ -9,7 +9,10 @@ from rhubarb import RhubarbExtension, Binary
 class Schema(strawberry.Schema):
     def __init__(self, *args, **kwargs):
         extensions = copy.copy(kwargs.pop("extensions", []))
-        if RhubarbExtension not in extensions:
+        if not any(
+            isinstance(extension, type) and issubclass(extension, RhubarbExtension)
+            for extension in extensions
+        ):
             extensions.append(RhubarbExtension)
         kwargs["extensions"] = extensions
 
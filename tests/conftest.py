@@ -24,6 +24,10 @@ from rhubarb.functions import (
     avg_agg,
     concat,
     case,
+    count_related,
+    exists_related,
+    max_related,
+    sum_related,
 )
 from rhubarb.object_set import (
     ModelSelector,
@@ -41,7 +45,9 @@ from rhubarb.object_set import (
     Index,
     References,
     references, BUILTINS,
+    Desc,
 )
+from rhubarb.pagination import Connection
 from rhubarb.schema import ErrorRaisingSchema
 
 
@@ -180,6 +186,10 @@ class Author(BaseUpdatedAtModel):
     def books(self, book: "Book"):
         return self.id == book.author_id
 
+    @relation(graphql_type=list["Book"], strategy="lateral")
+    def lateral_books(self, book: "Book"):
+        return self.id == book.author_id
+
     @field(graphql_type=list["RatingModel"])
     def ratings(self):
         return self.books().select(lambda book: book.ratings())
@@ -207,10 +217,50 @@ class Book(BaseUpdatedAtModel):
     def ratings(self, rating: "RatingModel"):
         return self.id == rating.book_id
 
+    @relation(graphql_type=list["RatingModel"], strategy="lateral")
+    def lateral_ratings(self, rating: "RatingModel"):
+        return self.id == rating.book_id
+
+    @relation(graphql_type=list["RatingModel"], strategy="selectin")
+    def selectin_ratings(self, rating: "RatingModel"):
+        return self.id == rating.book_id
+
+    @relation(
+        graphql_type=list["RatingModel"],
+        order_by=lambda rating: (Desc(rating.rating), rating.id),
+        paginate=True,
+    )
+    def top_ratings(self, rating: "RatingModel"):
+        return self.id == rating.book_id
+
+    @relation(graphql_type=list["RatingModel"], paginate=True)
+    def first_ratings(self, rating: "RatingModel"):
+        return self.id == rating.book_id
+
     @relation(graphql_type="RatingsByBook")
     def ratings_by_book(self, rating: "RatingsByBook"):
         return self.id == rating.book_id
 
+    @relation(graphql_type="OrderedAuthor")
+    def ordered_author(self, author: "OrderedAuthor"):
+        return self.author_id == author.id
+
+    @virtual_column
+    def rating_count(self: ModelSelector) -> int:
+        return count_related(self.ratings)
+
+    @virtual_column
+    def has_ratings(self: ModelSelector) -> bool:
+        return exists_related(self.ratings)
+
+    @virtual_column
+    def best_rating(self: ModelSelector) -> Optional[int]:
+        return max_related(self.ratings, lambda rating: rating.rating)
+
+    @virtual_column
+    def rating_total(self: ModelSelector) -> Optional[int]:
+        return sum_related(self.ratings, lambda rating: rating.rating)
+
     @virtual_column
     def avg_rating_embedded(self) -> int:
         return self.ratings_by_book().avg_rating()
@@ -288,18 +338,71 @@ class RatingsByBook(RatingModel):
         return self.book_id
 
 
+@table(skip_registry=True)
+class OrderedAuthor(Author):
+    def __order_by__(self):
+        return self.name
+
+
+@table(skip_registry=True)
+class CheckedBook(Book):
+    @virtual_column
+    def checked_at(self: ModelSelector) -> datetime.datetime:
+        return Value(datetime.datetime.now(datetime.timezone.utc))
+
+
 @strawberry.type
 class SomeResult:
     ok: bool
     author_model: Author
 
 
+# Names of root fields with side effects, each time their resolver runs.
+root_calls: list[str] = []
+
+
 @strawberry.type
 class Query:
     @strawberry.field(graphql_type=list[Book])
     def all_books(self, info: Info) -> ObjectSet[Book, ModelSelector[Book]]:
         return query(get_conn(info), Book, info)
 
+    @strawberry.field
+    def book_connection(
+        self,
+        info: Info,
+        first: Optional[int] = None,
+        after: Optional[str] = None,
+        last: Optional[int] = None,
+        before: Optional[str] = None,
+        estimated: bool = False,
+    ) -> Connection[Book]:
+        return Connection(
+            object_set=query(get_conn(info), Book, info).order_by(
+                lambda x: x.published_on
+            ),
+            first=first,
+            after=after,
+            last=last,
+            before=before,
+            count_mode="estimated" if estimated else "exact",
+        )
+
+    @strawberry.field(graphql_type=Book)
+    def book(
+        self, info: Info, book_id: uuid.UUID
+    ) -> ObjectSet[Book, ModelSelector[Book]]:
+        return query(get_conn(info), Book, info, one=True).kw_where(id=book_id)
+
+    @strawberry.field(graphql_type=list[Book])
+    def forbidden_books(self, info: Info) -> ObjectSet[Book, ModelSelector[Book]]:
+        raise PermissionError("Not allowed to list books")
+
+    @strawberry.field
+    async def loaded_books(self, info: Info) -> list[Book]:
+        root_calls.append("loaded_books")
+        return await query(get_conn(info), Book, info).as_list()
+
     @strawberry.field
     async def book_count(self, info: Info) -> int:
         return await query(get_conn(info), Book, info).count()
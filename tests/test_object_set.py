@@ -1,9 +1,47 @@
+import asyncio
+import contextlib
+import dataclasses
+import datetime
+import functools
+import uuid
+import zoneinfo
 from collections import defaultdict
 
+import psycopg
 import pytest
-
+from strawberry.extensions import SchemaExtension
+from strawberry.schema.config import StrawberryConfig
+
+from rhubarb.core import RhubarbPhoneNumber
+from rhubarb.crud import (
+    query,
+    insert_objs,
+    update_objs,
+    upsert_objs,
+    find_or_create,
+    delete_by_pks,
+    update,
+    save,
+)
+from rhubarb.functions import use, count_related, exists_related, sum_related
+from rhubarb.errors import RhubarbException
+from rhubarb.extension import RhubarbExtension
+from rhubarb import object_set as object_set_module
+from rhubarb.object_set import model_hydration, PkIn, batch, Desc
+from rhubarb.config import config
 from rhubarb.pkg.postgres.connection_base import track_queries
-from tests.conftest import DeleteException
+from rhubarb.plan_cache import track_plan_cache, plan_cache
+from rhubarb.schema import Schema
+from tests.conftest import (
+    root_calls,
+    Query,
+    DeleteException,
+    Author,
+    Book,
+    CheckedBook,
+    RatingModel,
+    RatingsByBook,
+)
 
 
 @pytest.mark.asyncio
@@ -196,7 +234,10 @@ async def test_book_mutation(schema, postgres_connection, basic_data):
             },
         )
         assert res.errors is None
-        assert len(tracker.queries) == 2
+        assert len(tracker.queries) == 1
+        assert str(tracker.queries[0].query).startswith(
+            "WITH book_0_changed AS (UPDATE"
+        )
         assert res.data["update_titles"]
         assert res.data["update_titles"]["title"].startswith("Awesome title")
 
@@ -217,7 +258,7 @@ async def test_book_mutation_save(schema, postgres_connection, basic_data):
             },
         )
         assert res.errors is None
-        assert len(tracker.queries) == 3
+        assert len(tracker.queries) == 2
         assert res.data["update_title"]
         assert res.data["update_title"]["title"].startswith("Awesome title")
 
@@ -240,7 +281,7 @@ async def test_insert_mutation(schema, postgres_connection, basic_data):
             },
         )
         assert res.errors is None
-        assert len(tracker.queries) == 2
+        assert len(tracker.queries) == 1
         assert res.data["new_review"]
         assert res.data["new_review"]["rating"] == 11
         assert res.data["new_review"]["reviewer"]["id"] == str(reviewer.id)
@@ -264,7 +305,7 @@ async def test_nested_insert_mutation(schema, postgres_connection, basic_data):
             },
         )
         assert res.errors is None
-        assert len(tracker.queries) == 2
+        assert len(tracker.queries) == 1
         assert res.data["nested_new_review"]
         assert res.data["nested_new_review"]["ok"]
         assert res.data["nested_new_review"]["rating"]["rating"] == 11
@@ -394,3 +435,1212 @@ async def test_public_schema_error(public_schema, postgres_connection, basic_dat
             context_value={"conn": conn},
         )
         assert res.errors is not None
+
+
+@pytest.mark.asyncio
+async def test_plan_cache(schema, postgres_connection, basic_data):
+    conn = postgres_connection
+    plan_cache.clear()
+    books = basic_data["books"]
+
+    results = []
+    for book in books[:2]:
+        with track_plan_cache() as tracker:
+            res = await schema.execute(
+                "mutation UpdateTitle($book_id: UUID!, $new_title: String!) { update_titles(book_id: $book_id, new_title: $new_title) { id, title, author { name } } }",
+                context_value={"conn": conn},
+                variable_values={
+                    "book_id": str(book.id),
+                    "new_title": "Cached title",
+                },
+            )
+            assert res.errors is None
+            results.append((tracker.stats, res.data["update_titles"]))
+
+    (first_stats, first_book), (second_stats, second_book) = results
+    assert first_stats.misses == 1
+    assert first_stats.hits == 0
+    assert second_stats.misses == 0
+    assert second_stats.hits == 1
+    assert second_stats.saved_ns == first_stats.compile_ns
+    assert first_book["id"] == str(books[0].id)
+    assert second_book["id"] == str(books[1].id)
+    assert plan_cache.stats.hits == 1
+
+    # Values bound from Python are collected again when the plan is reused.
+    checked = []
+    with track_plan_cache() as tracker:
+        for _ in range(2):
+            checked.append(
+                await query(conn, CheckedBook).select(lambda b: b.checked_at).one()
+            )
+    assert tracker.stats.misses == 1
+    assert tracker.stats.hits == 1
+    assert tracker.stats.uncacheable == 0
+    assert checked[0] < checked[1]
+
+
+@pytest.mark.asyncio
+async def test_prepared_statements(postgres_connection, basic_data):
+    conn = postgres_connection
+    conn.prepare_threshold = 1
+    book = basic_data["books"][0]
+
+    with track_queries() as tracker:
+        for _ in range(3):
+            found = await query(conn, Book).kw_where(id=book.id).one()
+            assert found.title == book.title
+        found = await query(conn, Book).kw_where(id=book.id).prepared(False).one()
+        assert found.title == book.title
+
+    assert [q.prepared for q in tracker.queries] == [False, False, True, False]
+    assert len({q.query for q in tracker.queries}) == 1
+
+    mutation = update(conn, Book, lambda b: None, lambda b: b.id == book.id)
+    assert mutation.prepared(False).prepare_statement is False
+    assert mutation.prepare_statement is None
+
+
+@pytest.mark.asyncio
+async def test_sync_hydrator(postgres_connection, basic_data):
+    conn = postgres_connection
+
+    async def shout(title):
+        return title.upper()
+
+    books = query(conn, Book)
+    await books.load_cache()
+    _fn, is_async = books.cache_main_extractor.hydrator()
+    assert not is_async
+
+    @dataclasses.dataclass
+    class Titles:
+        title: str
+        lower: str
+        upper: str
+
+    titles = query(conn, Book).select(
+        lambda book: Titles(
+            title=book.title,
+            lower=use(str.lower, book.title),
+            upper=use(shout, book.title),
+        )
+    )
+    await titles.load_cache()
+    _fn, is_async = titles.cache_main_extractor.hydrator()
+    assert is_async
+    for row in await titles.as_list():
+        assert row.lower == row.title.lower()
+        assert row.upper == row.title.upper()
+
+    # Sync functions returning awaitables switch the tree to async once they're seen.
+    wrapped = query(conn, Book).select(
+        lambda book: Titles(
+            title=book.title,
+            lower=use(functools.partial(shout), book.title),
+            upper=use(lambda title: shout(title), book.title),
+        )
+    )
+    for row in await wrapped.as_list():
+        assert row.lower == row.title.upper()
+        assert row.upper == row.title.upper()
+    _fn, is_async = wrapped.cache_main_extractor.hydrator()
+    assert is_async
+
+
+@pytest.mark.asyncio
+async def test_positional_rows(postgres_connection, basic_data):
+    conn = postgres_connection
+
+    @dataclasses.dataclass
+    class BookAuthor:
+        title: str
+        author_name: str
+
+    books = query(conn, Book).select(
+        lambda book: BookAuthor(title=book.title, author_name=book.author().name)
+    )
+    await books.load_cache()
+    assert books.positional_rows
+    assert all(isinstance(row, tuple) for _pk, row in books.row_cache)
+    rows = await books.as_list()
+    assert len(rows) == 4
+    assert all(row.title and row.author_name for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_model_hydration(postgres_connection, basic_data):
+    conn = postgres_connection
+
+    @dataclasses.dataclass
+    class Checked:
+        title: str
+
+        def __post_init__(self):
+            self.title = self.title.strip()
+
+    assert model_hydration(Book).trusted
+    assert not model_hydration(Checked).trusted
+
+    book = basic_data["books"][0]
+    found = await query(conn, Book).kw_where(id=book.id).one()
+    assert isinstance(found, Book)
+    assert found.id == book.id
+    assert found.title == book.title
+    assert found.author_id == book.author_id
+
+
+@pytest.mark.asyncio
+async def test_stream(postgres_connection, basic_data):
+    conn = postgres_connection
+
+    @dataclasses.dataclass
+    class BookAuthor:
+        id: uuid.UUID
+        author_name: str
+
+    books = query(conn, Book).select(
+        lambda book: BookAuthor(id=book.id, author_name=book.author().name)
+    )
+    with track_queries() as tracker:
+        streamed = [book async for book in books.stream(batch_size=3)]
+    assert len(tracker.queries) == 1
+    assert books.row_cache is None
+    assert sorted(streamed, key=lambda b: b.id) == sorted(
+        await books.as_list(), key=lambda b: b.id
+    )
+
+    @dataclasses.dataclass
+    class AvgRating:
+        book_id: uuid.UUID
+        avg_rating: int
+
+    ratings = query(conn, RatingsByBook).select(
+        lambda r: AvgRating(book_id=r.book_id, avg_rating=r.avg_rating)
+    )
+    streamed = [rating async for rating in ratings.stream(batch_size=1)]
+    assert len(streamed) == 4
+    assert streamed == await ratings.as_list()
+
+    # The joined ratings of a book are merged even though nothing orders them by book.
+    book_ratings = query(conn, Book).select(lambda book: book.ratings())
+    with track_queries() as tracker:
+        streamed = [ratings async for ratings in book_ratings.stream(batch_size=1)]
+    assert str(tracker.queries[0].query).endswith('ORDER BY book_0."id"')
+    assert sorted(len(ratings) for ratings in streamed) == sorted(
+        len(ratings) for ratings in await book_ratings.as_list()
+    )
+
+    # Closing an abandoned stream closes its server side cursor.
+    async def open_cursors():
+        cur = await conn.execute("SELECT COUNT(*) FROM pg_cursors")
+        return (await cur.fetchone())[0]
+
+    async with contextlib.aclosing(query(conn, Book).stream(batch_size=1)) as rows:
+        async for _ in rows:
+            assert await open_cursors() == 1
+            break
+    assert await open_cursors() == 0
+
+
+@pytest.mark.asyncio
+async def test_copy_insert(postgres_connection, basic_data):
+    conn = postgres_connection
+    author = basic_data["authors"][0]
+
+    def new_books(prefix):
+        return [
+            Book(
+                title=f"{prefix} {i}",
+                author_id=author.id,
+                published_on=datetime.date(2020, 1, 1 + i),
+                internal_bin_info=bytes(range(i)),
+                meta_info={"i": i, "author": author.id} if i % 2 else Book.meta_info,
+                contact_phone=RhubarbPhoneNumber.from_string("+18884156789"),
+            )
+            for i in range(10)
+        ]
+
+    with track_queries() as tracker:
+        assert (
+            await insert_objs(conn, Book, new_books("Copied"), method="copy").execute()
+            is None
+        )
+    assert not any("INSERT" in str(q.query) for q in tracker.queries)
+
+    inserted = await insert_objs(
+        conn, Book, new_books("Returned"), method="copy", returning=True
+    ).execute()
+    # Rows with and without meta_info are copied separately, but come back in the input's order.
+    assert [b.title for b in inserted] == [f"Returned {i}" for i in range(10)]
+    assert all(b.id and b.created for b in inserted)
+
+    copied = await query(conn, Book).where(lambda b: b.author_id == author.id).as_list()
+    by_title = {b.title: b for b in copied}
+    for prefix in ("Copied", "Returned"):
+        for i in range(10):
+            book = by_title[f"{prefix} {i}"]
+            assert book.internal_bin_info == bytes(range(i))
+            assert book.meta_info == (
+                {"i": i, "author": str(author.id)} if i % 2 else None
+            )
+            assert str(book.contact_phone) == "+18884156789"
+
+    # Naive datetimes are in the session's timezone, like with INSERT.
+    await conn.execute("SET LOCAL TIME ZONE 'America/New_York'")
+    naive = datetime.datetime(2024, 1, 1, 12)
+    for method in ("insert", "copy"):
+        await insert_objs(
+            conn,
+            Book,
+            [
+                Book(
+                    title=f"Naive {method}",
+                    author_id=author.id,
+                    published_on=datetime.date(2024, 1, 1),
+                    created=naive,
+                )
+            ],
+            method=method,
+        ).execute()
+    naive_books = [
+        b
+        for b in await query(conn, Book).kw_where(author_id=author.id).as_list()
+        if b.title.startswith("Naive")
+    ]
+    assert len(naive_books) == 2
+    assert {b.created for b in naive_books} == {
+        naive.replace(tzinfo=zoneinfo.ZoneInfo("America/New_York"))
+    }
+
+
+@pytest.mark.asyncio
+async def test_unnest_insert(postgres_connection, basic_data):
+    conn = postgres_connection
+    author = basic_data["authors"][0]
+    books = [
+        Book(
+            title=f"Unnest {i}",
+            author_id=author.id,
+            published_on=datetime.date(2020, 1, 1 + i),
+            meta_info={"i": i} if i % 2 else Book.meta_info,
+        )
+        for i in range(10)
+    ]
+
+    with track_queries() as tracker:
+        inserted = await insert_objs(
+            conn,
+            Book,
+            books,
+            method="unnest",
+            chunk_size=3,
+            exclude_columns={"created", "updated"},
+            returning=True,
+        ).execute()
+    assert [b.title for b in inserted] == [b.title for b in books]
+    assert all(b.id and b.created and b.updated for b in inserted)
+    assert {b.title: b.meta_info for b in inserted} == {
+        f"Unnest {i}": {"i": i} if i % 2 else None for i in range(10)
+    }
+    # 5 rows with meta_info and 5 without, each group sent in chunks of 3
+    assert len(tracker.queries) == 4
+    assert len({str(q.query) for q in tracker.queries}) == 2
+    assert all("UNNEST" in str(q.query) for q in tracker.queries)
+
+    orphans = [
+        Book(
+            title=f"Orphan {i}",
+            author_id=author.id if i < 2 else uuid.uuid4(),
+            published_on=datetime.date(2020, 1, 1),
+        )
+        for i in range(3)
+    ]
+    with track_queries() as tracker:
+        await insert_objs(conn, Book, orphans[:2]).execute()
+    assert len(tracker.queries) == 1
+    # The chunks run in one transaction, the first one is rolled back with the failing one.
+    with pytest.raises(psycopg.errors.ForeignKeyViolation):
+        await insert_objs(conn, Book, orphans, chunk_size=2).execute()
+    assert await query(conn, Book).where(lambda b: b.title == "Orphan 0").count() == 1
+
+
+@pytest.mark.asyncio
+async def test_update_objs(postgres_connection, basic_data):
+    conn = postgres_connection
+    books = await query(conn, Book).as_list()
+    for book in books:
+        book.title = f"{book.title} (2nd edition)"
+        book.comments = "Revised"
+
+    with track_queries() as tracker:
+        updated = await update_objs(
+            conn, Book, books, columns=["title"], returning=True
+        ).execute()
+    assert len(tracker.queries) == 1
+    assert "UNNEST" in str(tracker.queries[0].query)
+    by_id = {book.id: book for book in updated}
+    for book in books:
+        assert by_id[book.id].title == book.title
+        assert by_id[book.id].comments != "Revised"
+        assert by_id[book.id].updated > book.updated
+
+    await update_objs(conn, Book, books).execute()
+    for book in await query(conn, Book).as_list():
+        assert book.comments == "Revised"
+
+    for bad_columns in (
+        [],
+        ["missing"],
+        ["rating_count"],
+        ["id"],
+        ["title", "missing"],
+    ):
+        with pytest.raises(RhubarbException):
+            update_objs(conn, Book, books, columns=bad_columns)
+
+
+@pytest.mark.asyncio
+async def test_upsert(postgres_connection, basic_data):
+    conn = postgres_connection
+    books = await query(conn, Book).as_list()
+    for book in books:
+        book.title = f"{book.title} (upserted)"
+    new_book = Book(
+        id=uuid.uuid4(),
+        title="Upserted Book",
+        author_id=books[0].author_id,
+        published_on=datetime.date(2024, 1, 1),
+    )
+
+    with track_queries() as tracker:
+        upserted = await upsert_objs(
+            conn, Book, books + [new_book], update_columns=["title"], returning=True
+        ).execute()
+    assert len(tracker.queries) == 1
+    assert "ON CONFLICT (id) DO UPDATE" in str(tracker.queries[0].query)
+    assert len(upserted) == 5
+    assert {book.title for book in await query(conn, Book).as_list()} == {
+        book.title for book in books + [new_book]
+    }
+
+    new_book.title = "Not Updated"
+    ignored = await upsert_objs(
+        conn, Book, [new_book], update_columns=False, method="unnest", returning=True
+    ).execute()
+    assert ignored == []
+    stored = await query(conn, Book).where(lambda b: b.id == new_book.id).one()
+    assert stored.title == "Upserted Book"
+
+    with pytest.raises(RhubarbException):
+        insert_objs(conn, Book, [new_book]).on_conflict(
+            "rating_positive", do_nothing=True
+        )
+
+    with track_queries() as tracker:
+        found = await find_or_create(conn, new_book, id=new_book.id)
+        assert found.title == "Upserted Book"
+        created = await find_or_create(
+            conn,
+            Book(
+                title="Found or Created",
+                author_id=new_book.author_id,
+                published_on=datetime.date(2024, 1, 2),
+            ),
+            title="Found or Created",
+        )
+        assert created.id
+        again = await find_or_create(conn, created, title="Found or Created")
+        assert again.id == created.id
+    assert len(tracker.queries) == 3
+    assert (
+        await query(conn, Book).where(lambda b: b.title == "Found or Created").count()
+        == 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_pk_arrays(postgres_connection, basic_data):
+    conn = postgres_connection
+    books = await query(conn, Book).as_list()
+
+    with track_queries() as tracker:
+        for n in (1, 3):
+            pks = [b.id for b in books[:n]]
+            found = await query(conn, Book).for_pks(pks).as_list()
+            assert {b.id for b in found} == {b.id for b in books[:n]}
+    assert "= ANY(" in str(tracker.queries[0].query)
+    assert tracker.queries[0].query == tracker.queries[1].query
+
+    found = (
+        await query(conn, Book)
+        .where(lambda b: PkIn((b.id, b.author_id), [(books[0].id, books[0].author_id)]))
+        .as_list()
+    )
+    assert [b.id for b in found] == [books[0].id]
+
+    new_books = await insert_objs(
+        conn,
+        Book,
+        [
+            Book(
+                title=f"Temp {i}",
+                author_id=books[0].author_id,
+                published_on=datetime.date(2024, 1, 1),
+            )
+            for i in range(3)
+        ],
+        returning=True,
+    ).execute()
+    deleted = await delete_by_pks(
+        conn, Book, [b.id for b in new_books[:2]], returning=True
+    ).execute()
+    assert {b.id for b in deleted} == {b.id for b in new_books[:2]}
+    assert await query(conn, Book).count() == len(books) + 1
+
+
+@pytest.mark.asyncio
+async def test_mutation_cte(schema, postgres_connection, basic_data, monkeypatch):
+    conn = postgres_connection
+
+    def set_fn(book):
+        book.comments = "Changed"
+
+    mutation = update(conn, Book, set_fn, lambda book: book.public == False)
+    with track_queries() as tracker:
+        changed = await mutation.as_object_set(None)
+        books = await changed.as_list()
+        assert await changed.count() == len(books) == 3
+    assert len(tracker.queries) == 2
+    assert str(tracker.queries[0].query).startswith("WITH book_0_changed AS (UPDATE")
+    assert "WITH" not in str(tracker.queries[1].query)
+    assert all(book.comments == "Changed" for book in books)
+
+    new_books = [
+        Book(
+            title=f"CTE {i}",
+            author_id=books[0].author_id,
+            published_on=books[0].published_on,
+        )
+        for i in range(3)
+    ]
+    mutation = insert_objs(conn, Book, new_books, chunk_size=2)
+    with track_queries() as tracker:
+        inserted = await (await mutation.as_object_set(None)).as_list()
+    assert len(inserted) == 3
+    assert "WITH" not in str(tracker.queries[-1].query)
+    # The CTE doesn't change the mutation's own RETURNING clause.
+    assert mutation.returning is None
+
+    # A correlated subquery counting the inserted table has to see the new row.
+    book = basic_data["books"][0]
+    rating_count = await query(conn, RatingModel).kw_where(book_id=book.id).count()
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "mutation Review($book_id: UUID!, $reviewer_id: UUID!) { new_review(book_id: $book_id, reviewer_id: $reviewer_id, rating: 3) { id, book { rating_count } } }",
+            context_value={"conn": conn},
+            variable_values={
+                "book_id": str(book.id),
+                "reviewer_id": str(basic_data["reviewers"][0].id),
+            },
+        )
+        assert res.errors is None
+    assert res.data["new_review"]["book"]["rating_count"] == rating_count + 1
+    assert not str(tracker.queries[-1].query).startswith("WITH")
+
+    # Deleted rows are read from what RETURNING gave back, whatever the selection reads.
+    for cte, book in zip((True, False), basic_data["books"]):
+        monkeypatch.setattr(object_set_module, "MUTATION_CTE", cte)
+        ratings = await query(conn, RatingModel).kw_where(book_id=book.id).as_list()
+        assert ratings
+        mutation = query(conn, RatingModel).kw_where(book_id=book.id).delete()
+        deleted = await mutation.as_object_set(None)
+        assert sorted(r.id for r in await deleted.as_list()) == sorted(
+            r.id for r in ratings
+        )
+        assert await deleted.count() == len(ratings)
+        counts = await deleted.select(lambda r: r.book().rating_count()).as_list()
+        assert counts == [0] * len(ratings)
+
+
+@pytest.mark.asyncio
+async def test_lateral_relations(schema, postgres_connection, basic_data):
+    conn = postgres_connection
+
+    res = await schema.execute(
+        "query { all_books { id, ratings { id, rating } } }",
+        context_value={"conn": conn},
+    )
+    assert res.errors is None
+    joined = {book["id"]: book["ratings"] for book in res.data["all_books"]}
+    books_by_author = defaultdict(set)
+    author_ids = {}
+    for book in await query(conn, Book).as_list():
+        books_by_author[book.author_id].add(str(book.id))
+        author_ids[str(book.id)] = book.author_id
+
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "query { all_books { id, lateral_ratings { id, rating, reviewer { name } }, author { lateral_books { id, created, lateral_ratings { rating } } } } }",
+            context_value={"conn": conn},
+        )
+        assert res.errors is None
+    assert len(tracker.queries) == 1
+    assert "LEFT JOIN LATERAL" in str(tracker.queries[0].query)
+    for book in res.data["all_books"]:
+        ratings = book["lateral_ratings"]
+        assert sorted(r["id"] for r in ratings) == sorted(
+            r["id"] for r in joined[book["id"]]
+        )
+        assert all(rating["reviewer"]["name"] for rating in ratings)
+        lateral_books = book["author"]["lateral_books"]
+        assert {b["id"] for b in lateral_books} == books_by_author[
+            author_ids[book["id"]]
+        ]
+        for lateral_book in lateral_books:
+            assert datetime.datetime.fromisoformat(lateral_book["created"])
+            assert len(lateral_book["lateral_ratings"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_selectin_relations(schema, postgres_connection, basic_data):
+    conn = postgres_connection
+
+    res = await schema.execute(
+        "query { all_books { id, ratings { id, rating } } }",
+        context_value={"conn": conn},
+    )
+    assert res.errors is None
+    joined = {book["id"]: book["ratings"] for book in res.data["all_books"]}
+
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "query { all_books { id, selectin_ratings { id, rating, reviewer { name } } } }",
+            context_value={"conn": conn},
+        )
+        assert res.errors is None
+    assert len(tracker.queries) == 2
+    assert "= ANY(" in str(tracker.queries[1].query)
+    assert "testing_book" not in str(tracker.queries[1].query)
+    for book in res.data["all_books"]:
+        ratings = book["selectin_ratings"]
+        assert sorted(r["id"] for r in ratings) == sorted(
+            r["id"] for r in joined[book["id"]]
+        )
+        assert all(rating["reviewer"]["name"] for rating in ratings)
+
+    books = query(conn, Book)
+    joined = await books.select(lambda book: book.ratings()).as_list()
+    with track_queries() as tracker:
+        selectin = (
+            await books.load_relations(ratings="selectin")
+            .select(lambda book: book.ratings())
+            .as_list()
+        )
+    assert len(tracker.queries) == 2
+    # The strategy only applies to the ObjectSet load_relations returned.
+    assert books.relation_strategies == {}
+    with track_queries() as tracker:
+        await books.select(lambda book: book.ratings()).as_list()
+    assert len(tracker.queries) == 1
+    assert sorted(
+        sorted(rating.id for rating in ratings) for ratings in selectin
+    ) == sorted(sorted(rating.id for rating in ratings) for ratings in joined)
+
+
+@pytest.mark.asyncio
+async def test_paginated_relations(schema, postgres_connection, basic_data):
+    conn = postgres_connection
+
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "query { all_books { id, top: top_ratings(first: 1) { id, rating }, all: top_ratings { rating } } }",
+            context_value={"conn": conn},
+        )
+        assert res.errors is None
+    # Each alias of the relation is loaded against the books with its own lateral subquery.
+    assert len(tracker.queries) == 3
+    relation_queries = [str(q.query) for q in list(tracker.queries)[1:]]
+    assert all("LEFT JOIN LATERAL" in q for q in relation_queries)
+    assert sum("LIMIT" in q for q in relation_queries) == 1
+    for book in res.data["all_books"]:
+        ratings = [r["rating"] for r in book["all"]]
+        assert len(ratings) == 2
+        assert ratings == sorted(ratings, reverse=True)
+        assert [r["rating"] for r in book["top"]] == ratings[:1]
+
+    # Without an order, the limited rows are the first ones by primary key.
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "query { all_books { first_ratings(first: 1) { id }, ratings { id } } }",
+            context_value={"conn": conn},
+        )
+        assert res.errors is None
+    assert any("ORDER BY" in str(q.query) for q in tracker.queries)
+    for book in res.data["all_books"]:
+        first_id = min(r["id"] for r in book["ratings"])
+        assert [r["id"] for r in book["first_ratings"]] == [first_id]
+
+
+@pytest.mark.asyncio
+async def test_related_aggregates(schema, postgres_connection, basic_data):
+    conn = postgres_connection
+
+    plan_cache.clear()
+    statements = []
+    for _ in range(2):
+        with track_queries() as tracker, track_plan_cache() as plans:
+            res = await schema.execute(
+                "query { all_books { id, rating_count, has_ratings, best_rating, rating_total, ratings { rating } } }",
+                context_value={"conn": conn},
+            )
+            assert res.errors is None
+        statements.append(str(tracker.queries[0].query))
+    # The subqueries are written the same way for every request, so the plan is reused.
+    assert statements[0] == statements[1]
+    assert plans.stats.hits >= 1
+    assert "(SELECT COUNT(*)" in statements[0]
+    assert "EXISTS (SELECT" in statements[0]
+    for book in res.data["all_books"]:
+        ratings = [r["rating"] for r in book["ratings"]]
+        assert book["rating_count"] == len(ratings)
+        assert book["has_ratings"] == bool(ratings)
+        assert book["best_rating"] == max(ratings)
+        assert book["rating_total"] == sum(ratings)
+        assert isinstance(book["rating_total"], int)
+
+    new_book = await save(
+        conn,
+        Book(
+            title="Unrated",
+            author_id=basic_data["authors"][0].id,
+            published_on=datetime.date(2024, 1, 1),
+        ),
+    ).execute()
+    unrated = (
+        await query(conn, Book)
+        .where(lambda b: exists_related(b.ratings) == False)
+        .as_list()
+    )
+    assert [b.id for b in unrated] == [new_book.id]
+    most_rated = (
+        await query(conn, Book)
+        .order_by(lambda b: (Desc(count_related(b.ratings)), b.id))
+        .as_list()
+    )
+    assert most_rated[-1].id == new_book.id
+
+    # Sums aren't cast back to the column's type, they can exceed its range.
+    book = most_rated[0]
+    await query(conn, RatingModel).kw_where(book_id=book.id).kw_update(
+        rating=2**31 - 1
+    ).execute()
+    rating_count = await query(conn, RatingModel).kw_where(book_id=book.id).count()
+    total = (
+        await query(conn, Book)
+        .kw_where(id=book.id)
+        .select(lambda b: sum_related(b.ratings, lambda rating: rating.rating))
+        .one()
+    )
+    assert rating_count > 1
+    assert total == (2**31 - 1) * rating_count
+
+
+@pytest.mark.asyncio
+async def test_compile_operation(schema, postgres_connection, basic_data, monkeypatch):
+    conn = postgres_connection
+    operation = """
+        query {
+            books: all_books {
+                __typename, id, title, published_on, author_name,
+                author { name, lateral_books { id } },
+                ratings { rating, reviewer { name } }
+            }
+        }
+    """
+
+    res = await schema.execute(operation, context_value={"conn": conn})
+    assert res.errors is None
+    resolved = sorted(res.data["books"], key=lambda book: book["id"])
+
+    monkeypatch.setattr(RhubarbExtension, "compile_operations", True)
+    with track_queries() as tracker:
+        res = await schema.execute(operation, context_value={"conn": conn})
+        assert res.errors is None
+    assert len(tracker.queries) == 1
+    assert "json_build_object" in str(tracker.queries[0].query)
+    compiled = sorted(res.data["books"], key=lambda book: book["id"])
+    assert len(compiled) == len(resolved)
+    for compiled_book, resolved_book in zip(compiled, resolved):
+        assert list(compiled_book) == list(resolved_book)
+        for key in ("__typename", "id", "title", "published_on", "author_name"):
+            assert compiled_book[key] == resolved_book[key]
+        assert compiled_book["author"]["name"] == resolved_book["author"]["name"]
+        assert sorted(
+            b["id"] for b in compiled_book["author"]["lateral_books"]
+        ) == sorted(b["id"] for b in resolved_book["author"]["lateral_books"])
+        assert sorted(
+            (r["rating"], r["reviewer"]["name"]) for r in compiled_book["ratings"]
+        ) == sorted(
+            (r["rating"], r["reviewer"]["name"]) for r in resolved_book["ratings"]
+        )
+
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "query { all_books { id, title_and_author } }",
+            context_value={"conn": conn},
+        )
+        assert res.errors is None
+    assert "json_build_object" not in str(tracker.queries[0].query)
+    assert all(" by " in book["title_and_author"] for book in res.data["all_books"])
+
+
+@pytest.mark.asyncio
+async def test_compile_operation_fallback(postgres_connection, basic_data, monkeypatch):
+    conn = postgres_connection
+    monkeypatch.setattr(RhubarbExtension, "compile_operations", True)
+    # Errors are returned instead of raised.
+    schema = Schema(query=Query, config=StrawberryConfig(auto_camel_case=False))
+
+    # Errors of root resolvers are reported like in a normal execution.
+    res = await schema.execute(
+        "query { forbidden_books { id } }", context_value={"conn": conn}
+    )
+    assert res.data is None
+    assert res.errors[0].message == "Not allowed to list books"
+    assert res.errors[0].path == ["forbidden_books"]
+
+    # A resolver is only called once when the operation can't be compiled after all.
+    root_calls.clear()
+    res = await schema.execute(
+        "query { loaded_books { id }, all_books { id } }", context_value={"conn": conn}
+    )
+    assert res.errors is None
+    assert len(res.data["loaded_books"]) == len(res.data["all_books"]) == 4
+    assert root_calls == ["loaded_books"]
+
+    # Selections that need Python are found before any resolver runs.
+    root_calls.clear()
+    res = await schema.execute(
+        "query { loaded_books { id }, all_books { id, title_and_author } }",
+        context_value={"conn": conn},
+    )
+    assert res.errors is None
+    assert root_calls == ["loaded_books"]
+
+    # A missing non-null root is an error.
+    book = basic_data["books"][0]
+    operation = "query Book($book_id: UUID!) { book(book_id: $book_id) { id, title } }"
+    res = await schema.execute(
+        operation,
+        context_value={"conn": conn},
+        variable_values={"book_id": str(book.id)},
+    )
+    assert res.errors is None
+    assert res.data["book"] == {"id": str(book.id), "title": book.title}
+    res = await schema.execute(
+        operation,
+        context_value={"conn": conn},
+        variable_values={"book_id": str(uuid.uuid4())},
+    )
+    assert res.data is None
+    assert "non-nullable" in res.errors[0].message
+
+    # Values graphql-core wouldn't complete are reported by the normal execution.
+    async with conn.cursor() as cur:
+        await cur.execute(
+            f'UPDATE "{RatingModel.__table__}" SET rating = %s WHERE book_id = %s',
+            [2**31 - 1, book.id],
+        )
+        # Rolled back with the test's transaction.
+        await cur.execute(
+            f'ALTER TABLE "{RatingModel.__table__}" ALTER COLUMN reviewer_id DROP NOT NULL'
+        )
+        await cur.execute(
+            f'UPDATE "{RatingModel.__table__}" SET reviewer_id = NULL WHERE book_id = %s',
+            [book.id],
+        )
+    res = await schema.execute(
+        "query { all_books { id, rating_total } }", context_value={"conn": conn}
+    )
+    assert "32-bit" in res.errors[0].message
+    res = await schema.execute(
+        "query { all_ratings { id, reviewer { name } } }", context_value={"conn": conn}
+    )
+    assert "non-nullable" in res.errors[0].message
+
+    # Other extensions' resolve hooks would be skipped for compiled fields.
+    class ResolveHook(SchemaExtension):
+        def resolve(self, _next, root, info, *args, **kwargs):
+            return _next(root, info, *args, **kwargs)
+
+    schema = Schema(
+        query=Query,
+        config=StrawberryConfig(auto_camel_case=False),
+        extensions=[RhubarbExtension, ResolveHook],
+    )
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "query { all_books { id } }", context_value={"conn": conn}
+        )
+        assert res.errors is None
+    assert "json_build_object" not in str(tracker.queries[0].query)
+
+
+@pytest.mark.asyncio
+async def test_query_plan(schema, postgres_connection, basic_data, monkeypatch):
+    conn = postgres_connection
+
+    resolved = []
+    resolve_object_set = RhubarbExtension.resolve_object_set
+
+    def track_resolve(self, plan, _next, root, info, *args, **kwargs):
+        resolved.append(info.field_name)
+        return resolve_object_set(self, plan, _next, root, info, *args, **kwargs)
+
+    monkeypatch.setattr(RhubarbExtension, "resolve_object_set", track_resolve)
+    context = {"conn": conn}
+    res = await schema.execute(
+        "query { all_books { id, title, author { name }, ratings { rating } } }",
+        context_value=context,
+    )
+    assert res.errors is None
+    # Only the root and the relations of each book leave the synchronous path.
+    assert sorted(set(resolved)) == ["all_books", "author", "ratings"]
+    # Columns are read off the hydrated books without an ObjectSet of their own.
+    assert set(context["object_sets"]) == {
+        "all_books",
+        "all_books|author",
+        "all_books|ratings",
+    }
+    books = {book["id"]: book for book in res.data["all_books"]}
+    assert all(book["title"] and book["author"]["name"] for book in books.values())
+
+    res = await schema.execute(
+        """
+        fragment BookFields on Book { id, title, author { name } }
+        query { first: all_books { ...BookFields }, second: all_books { ...BookFields } }
+        """,
+        context_value={"conn": conn},
+    )
+    assert res.errors is None
+    for key in ("first", "second"):
+        for book in res.data[key]:
+            assert book["title"] == books[book["id"]]["title"]
+            assert book["author"]["name"] == books[book["id"]]["author"]["name"]
+
+
+@pytest.mark.asyncio
+async def test_parallel_root_fields(
+    schema, postgres_connection, basic_data, monkeypatch
+):
+    conn = postgres_connection
+    operation = (
+        "query { all_books { id, title }, all_ratings { id, rating }, book_count }"
+    )
+
+    res = await schema.execute(operation, context_value={"conn": conn})
+    assert res.errors is None
+    sequential = res.data
+
+    pool = await config().postgres.get_pool()
+    for mode in ("pipeline", "pool"):
+        monkeypatch.setattr(RhubarbExtension, "parallel_root_fields", mode)
+        requests = pool.get_stats().get("requests_num", 0)
+        with track_queries() as tracker:
+            res = await schema.execute(operation, context_value={"conn": conn})
+            assert res.errors is None
+        assert len(tracker.queries) == 3
+        # Pooled connections can't see the test's transaction, so `pool` pipelines on its connection.
+        assert pool.get_stats().get("requests_num", 0) == requests
+        assert sorted(res.data["all_books"], key=lambda b: b["id"]) == sorted(
+            sequential["all_books"], key=lambda b: b["id"]
+        )
+        assert sorted(res.data["all_ratings"], key=lambda r: r["id"]) == sorted(
+            sequential["all_ratings"], key=lambda r: r["id"]
+        )
+        assert res.data["book_count"] == sequential["book_count"]
+
+
+@pytest.mark.asyncio
+async def test_batch(postgres_connection, basic_data):
+    conn = postgres_connection
+    books = await query(conn, Book).order_by(lambda b: b.id).as_list()
+
+    def set_fn(book):
+        book.comments = "Batched"
+
+    new_book = Book(
+        title="Batched",
+        author_id=books[0].author_id,
+        published_on=books[0].published_on,
+    )
+    with track_queries() as tracker:
+        async with batch(conn) as mutations:
+            updated, inserted = await asyncio.gather(
+                update(
+                    conn, Book, set_fn, lambda b: b.id == books[0].id, returning=True
+                ).execute(),
+                save(conn, new_book).execute(),
+            )
+            async with batch(conn) as nested:
+                assert nested is mutations
+                deleted = nested.add(
+                    delete_by_pks(conn, Book, [inserted.id], returning=True)
+                )
+        assert (await deleted)[0].id == inserted.id
+    assert len(tracker.queries) == 3
+    assert [b.comments for b in updated] == ["Batched"]
+    assert inserted.title == "Batched"
+    assert await query(conn, Book).count() == len(books)
+
+    with pytest.raises(RhubarbException):
+        async with batch(conn) as mutations:
+            mutations.add(insert_objs(conn, Book, [new_book], method="copy"))
+
+    # A queued mutation that is never awaited still fails the block.
+    orphan = dataclasses.replace(new_book, author_id=uuid.uuid4())
+    async with conn.transaction(force_rollback=True):
+        with pytest.raises(psycopg.errors.ForeignKeyViolation):
+            async with batch(conn) as mutations:
+                mutations.add(save(conn, orphan))
+
+    # Errors that were handled aren't raised again.
+    async with conn.transaction(force_rollback=True):
+        async with batch(conn):
+            with pytest.raises(psycopg.errors.ForeignKeyViolation):
+                await save(conn, orphan).execute()
+    async with conn.transaction(force_rollback=True):
+        async with batch(conn) as mutations:
+            queued = mutations.add(save(conn, orphan))
+            await asyncio.wait([queued])
+            assert isinstance(queued.exception(), psycopg.errors.ForeignKeyViolation)
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination(postgres_connection, basic_data):
+    conn = postgres_connection
+
+    def set_fn(book):
+        book.comments = "Keyset"
+        book.internal_bin_info = b"\x00\xff"
+
+    # NULL comments sort after the rest, and bytes and dates round trip through the cursor.
+    await update(conn, Book, set_fn, lambda b: b.public == False).execute()
+    for order_by in (
+        lambda b: (b.published_on, b.title),
+        lambda b: (Desc(b.published_on), b.title),
+        lambda b: (b.comments, Desc(b.internal_bin_info), b.published_on),
+        lambda b: (Desc(b.comments), b.internal_bin_info),
+    ):
+        # Cursors break ties on the pk, so the first page has to as well.
+        books = query(conn, Book).order_by(lambda b: (*order_by(b), b.id))
+        expected = await books.as_list()
+        pages, cursor = [], None
+        with track_queries() as tracker:
+            while True:
+                page = books if cursor is None else books.after(cursor)
+                found = await page.limit(2).as_list()
+                if not found:
+                    break
+                pages.extend(found)
+                cursor = books.cursor(found[-1])
+        assert [b.id for b in pages] == [b.id for b in expected]
+        assert "OFFSET" not in str(tracker.queries[-1].query)
+
+        before = await books.before(books.cursor(expected[2])).as_list()
+        assert [b.id for b in before] == [b.id for b in expected[:2]]
+        # The rows right before the cursor, in the same order.
+        before = await books.before(books.cursor(expected[-1])).limit(2).as_list()
+        assert [b.id for b in before] == [b.id for b in expected[-3:-1]]
+
+    with pytest.raises(RhubarbException):
+        query(conn, Book).after("not a cursor")
+
+
+@pytest.mark.asyncio
+async def test_connection(schema, postgres_connection, basic_data):
+    conn = postgres_connection
+    books = await query(conn, Book).order_by(lambda x: (x.published_on, x.id)).as_list()
+    operation = """
+        query ($first: Int, $after: String, $last: Int, $before: String) {
+            book_connection(first: $first, after: $after, last: $last, before: $before) {
+                edges { cursor, node { id, title, author { name } } }
+                page_info { has_next_page, has_previous_page, start_cursor, end_cursor }
+            }
+        }
+    """
+
+    with track_queries() as tracker:
+        res = await schema.execute(
+            operation, variable_values={"first": 2}, context_value={"conn": conn}
+        )
+        assert res.errors is None
+    assert len(tracker.queries) == 1
+    page = res.data["book_connection"]
+    assert [e["node"]["id"] for e in page["edges"]] == [str(b.id) for b in books[:2]]
+    assert page["edges"][0]["node"]["author"]["name"]
+    assert page["page_info"]["has_next_page"]
+    assert not page["page_info"]["has_previous_page"]
+
+    res = await schema.execute(
+        operation,
+        variable_values={"first": 2, "after": page["page_info"]["end_cursor"]},
+        context_value={"conn": conn},
+    )
+    assert res.errors is None
+    next_page = res.data["book_connection"]
+    assert [e["node"]["id"] for e in next_page["edges"]] == [
+        str(b.id) for b in books[2:4]
+    ]
+    assert next_page["page_info"]["has_previous_page"]
+
+    res = await schema.execute(
+        operation,
+        variable_values={"last": 1, "before": next_page["page_info"]["start_cursor"]},
+        context_value={"conn": conn},
+    )
+    assert res.errors is None
+    previous = res.data["book_connection"]
+    assert [e["node"]["id"] for e in previous["edges"]] == [str(books[1].id)]
+    assert previous["page_info"]["has_previous_page"]
+    assert previous["page_info"]["has_next_page"]
+
+    for estimated in (False, True):
+        with track_queries() as tracker:
+            res = await schema.execute(
+                "query ($estimated: Boolean!) { book_connection(estimated: $estimated) { total_count } }",
+                variable_values={"estimated": estimated},
+                context_value={"conn": conn},
+            )
+            assert res.errors is None
+        queries = [str(q.query) for q in tracker.queries]
+        if estimated:
+            # Before the table is analyzed reltuples is unknown, and the EXPLAIN estimate is used.
+            assert all("COUNT(*)" not in q for q in queries)
+            assert isinstance(res.data["book_connection"]["total_count"], int)
+        else:
+            assert len(queries) == 1
+            assert res.data["book_connection"]["total_count"] == len(books)
+
+
+@pytest.mark.asyncio
+async def test_join_pruning(postgres_connection, basic_data):
+    conn = postgres_connection
+
+    books = query(conn, Book)
+    with track_queries() as tracker:
+        author_names = books.select(lambda b: b.author().name)
+        titles = author_names.select(lambda _: author_names.model_selector.title)
+        assert len(await titles.as_list()) == 4
+        assert await author_names.count() == 4
+
+        by_author = books.join(
+            Author, lambda b, a: b.author_id == a.id, None, reference_id="first"
+        ).where(lambda a: a.name != "Nobody")
+        names = (
+            by_author.select(lambda _: by_author.model_selector)
+            .join(Author, lambda b, a: b.author_id == a.id, None, reference_id="second")
+            .select(lambda a: a.name)
+        )
+        assert len(await names.as_list()) == 4
+
+    queries = [str(q.query) for q in tracker.queries]
+    assert "JOIN" not in queries[0]
+    assert "JOIN" not in queries[1]
+    assert queries[2].count("LEFT JOIN") == 1
+
+
+@pytest.mark.asyncio
+async def test_semi_joins(postgres_connection, basic_data):
+    conn = postgres_connection
+
+    books = await query(conn, Book).as_list()
+    ratings = await query(conn, RatingModel).as_list()
+    rated = {r.book_id for r in ratings if r.rating > 3}
+    with track_queries() as tracker:
+        filtered = (
+            await query(conn, Book)
+            .where(lambda b: (b.ratings().rating > 3) & (b.title != "Nothing"))
+            .as_list()
+        )
+    assert sorted(b.id for b in filtered) == sorted(rated)
+    sql = str(list(tracker.queries)[0].query)
+    assert "EXISTS (SELECT 1 FROM" in sql
+    assert "JOIN" not in sql
+
+    # Parents without ratings can match through the other branch of an OR, so it stays a join.
+    unrated = await save(
+        conn,
+        Book(
+            title="Unrated",
+            author_id=basic_data["authors"][0].id,
+            published_on=datetime.date(2024, 1, 1),
+        ),
+    ).execute()
+    with track_queries() as tracker:
+        either = (
+            await query(conn, Book)
+            .where(lambda b: (b.ratings().rating > 3) | (b.title == "Unrated"))
+            .as_list()
+        )
+    assert {b.id for b in either} == rated | {unrated.id}
+    assert "EXISTS" not in str(list(tracker.queries)[0].query)
+
+    # Lateral relations can't be filtered on, which `hasattr` can tell.
+    assert not hasattr(query(conn, Book).model_selector.lateral_ratings(), "rating")
+
+    author = basic_data["authors"][0]
+    books = await query(conn, Book).as_list()
+    with track_queries() as tracker:
+        names = (
+            await query(conn, Book)
+            .join(
+                Author,
+                lambda b, a: (b.author_id == a.id) & (a.id == author.id),
+                None,
+                join_type="INNER",
+            )
+            .select(lambda a: a.name)
+            .as_list()
+        )
+    assert names == [author.name] * sum(b.author_id == author.id for b in books)
+    assert "INNER JOIN" in str(list(tracker.queries)[0].query)
+
+
+@pytest.mark.asyncio
+async def test_pushed_down_joins(schema, postgres_connection, basic_data):
+    conn = postgres_connection
+
+    with track_queries() as tracker:
+        res = await schema.execute(
+            "query { all_books { id, ratings_by_book { avg_rating } }, agg { book_id, avg_rating } }",
+            context_value={"conn": conn},
+        )
+        assert res.errors is None
+    sql = str(list(tracker.queries)[0].query)
+    # The grouped subquery only aggregates the ratings of each book.
+    assert "LEFT JOIN LATERAL (" in sql
+    assert 'WHERE (book_0."id" = ' in sql
+    averages = {row["book_id"]: row["avg_rating"] for row in res.data["agg"]}
+    for book in res.data["all_books"]:
+        assert book["ratings_by_book"]["avg_rating"] == averages[book["id"]]
+
+    @dataclasses.dataclass
+    class AuthorNames:
+        name: str
+        ordered_name: str
+
+    # Models that are only ordered are joined as they are.
+    with track_queries() as tracker:
+        names = (
+            await query(conn, Book)
+            .select(
+                lambda b: AuthorNames(
+                    name=b.author().name, ordered_name=b.ordered_author().name
+                )
+            )
+            .as_list()
+        )
+    assert "LATERAL" not in str(list(tracker.queries)[0].query)
+    assert names and all(n.name == n.ordered_name for n in names)